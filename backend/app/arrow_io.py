@@ -0,0 +1,152 @@
+"""
+Parquet / Arrow IPC input and output.
+
+Loaders read .parquet and Arrow IPC (.arrow/.feather/.ipc, file or stream
+format) inputs through record_batches(): Parquet is read one row group
+at a time, IPC one record batch at a time, so memory stays bounded by the
+batch size as with CSV. The export endpoint encodes row chunks with
+ExportWriter, which hands back the bytes written so far after every
+batch so a response can stream them.
+
+pyarrow is optional: without it these inputs and the export endpoint are
+unavailable (require_pyarrow raises), everything else works. It is
+imported on first use, so processes that never touch Arrow data do not
+pay for it at startup.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence, Tuple
+
+# Set by _import_pyarrow().
+pa = ipc = pq = None
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+IPC_SUFFIXES = (".arrow", ".feather", ".ipc")
+ARROW_SUFFIXES = PARQUET_SUFFIXES + IPC_SUFFIXES
+
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrow"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def _import_pyarrow() -> bool:
+    global pa, ipc, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:  # pragma: no cover - optional dependency
+            return False
+        ipc, pq, pa = pyarrow.ipc, pyarrow.parquet, pyarrow
+    return True
+
+
+def available() -> bool:
+    return _import_pyarrow()
+
+
+def require_pyarrow() -> None:
+    if not _import_pyarrow():
+        raise RuntimeError("Parquet/Arrow support needs the optional pyarrow package (pip install pyarrow)")
+
+
+def is_arrow_input(path) -> bool:
+    return str(path).lower().endswith(ARROW_SUFFIXES)
+
+
+@contextmanager
+def record_batches(path, batch_size: int) -> Iterator[Tuple[List[str], Iterator]]:
+    """
+    Column names of a Parquet or Arrow IPC file plus an iterator over its
+    record batches (at most batch_size rows each for Parquet; IPC batches
+    are yielded as written).
+    """
+    require_pyarrow()
+    if str(path).lower().endswith(PARQUET_SUFFIXES):
+        pf = pq.ParquetFile(path)
+        try:
+            yield pf.schema_arrow.names, pf.iter_batches(batch_size=batch_size)
+        finally:
+            pf.close()
+        return
+
+    with pa.memory_map(str(path), "r") as source:
+        try:
+            reader = ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            # Not the random-access file format: read it as an IPC stream.
+            source.seek(0)
+            reader = ipc.open_stream(source)
+            batches = iter(reader)
+        yield reader.schema.names, batches
+
+
+class _ChunkSink:
+    """
+    Write-only file object that collects bytes until take() is called.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+class ExportWriter:
+    """
+    Encode rows (tuples aligned with `columns`) as an Arrow IPC stream or
+    a Parquet file. write() encodes one record batch (one Parquet row
+    group) and returns the bytes produced so far; finish() returns the
+    remaining bytes (the IPC end-of-stream marker or the Parquet footer).
+    """
+
+    def __init__(self, fmt: str, columns: Sequence[Tuple[str, str]]):
+        require_pyarrow()
+        types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64()}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self._sink = _ChunkSink()
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self._sink, self.schema)
+        elif fmt == "arrow":
+            self._writer = ipc.new_stream(self._sink, self.schema)
+        else:
+            raise ValueError(f"Unknown export format: {fmt!r}")
+
+    def write(self, rows: Sequence[tuple]) -> bytes:
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self.schema)
+        ]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.take()
+
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+from .db import nocase
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for endpoint results.
+
+    Keys should include the database data_version so a reload makes old
+    entries unreachable; they then age out through LRU eviction or TTL.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+def normalize_params(params: dict) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Canonical, hashable form of query parameters. String filters are
+    matched with SQLite's NOCASE collation by the endpoints, so fold case
+    here the same way (ASCII only: "É" and "é" stay distinct keys).
+    """
+    out = []
+    for k in sorted(params):
+        v = params[k]
+        if isinstance(v, str):
+            v = nocase(v.strip())
+        out.append((k, v))
+    return tuple(out)
+
+
+def make_etag(key: Hashable) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+    return f'"{digest}"'
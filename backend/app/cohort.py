@@ -0,0 +1,156 @@
+"""
+Cohort filters shared by every endpoint that selects samples.
+
+A CohortFilter names the samples to analyse along any of the metadata
+dimensions. Each dimension is optional (None means "any") and accepts a
+single value or a tuple of values. cohort_cte() renders the filter as one
+parameterized CTE over samples/subjects/projects/treatment_courses:
+
+- condition, treatment and sample_type are declared COLLATE NOCASE, so
+  they are compared with `= ... COLLATE NOCASE` and stay indexable;
+- sex and response have a fixed domain and are normalized in Python
+  ('M'/'F', 'yes'/'no') so plain comparisons hit their indexes;
+- project names are matched case-insensitively (the table is tiny).
+
+SQL text depends only on the filter's shape (which dimensions are set and
+how many values each has), so it is built once per shape and cached;
+values are always bound as parameters.
+"""
+
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+Values = Union[str, Tuple[str, ...], None]
+
+# Dimension -> (column, how values are compared)
+TEXT_DIMENSIONS = {
+    "project": ("proj.name", "nocase"),
+    "condition": ("subj.condition", "nocase"),
+    "sex": ("subj.sex", "upper"),
+    "treatment": ("tc.treatment", "nocase"),
+    "response": ("tc.response", "lower"),
+    "sample_type": ("s.sample_type", "nocase"),
+}
+
+COHORT_COLUMNS = """
+        s.id AS sample_id,
+        s.sample_code AS sample,
+        s.subject_id AS subject_id,
+        s.treatment_course_id AS course_id,
+        s.time_from_treatment_start AS time,
+        s.sample_type AS sample_type,
+        subj.subject_code AS subject,
+        subj.condition AS condition,
+        subj.age AS age,
+        subj.sex AS sex,
+        proj.name AS project,
+        tc.treatment AS treatment,
+        tc.response AS response"""
+
+
+def _as_tuple(value) -> Optional[tuple]:
+    if value is None:
+        return None
+    if isinstance(value, (str, int)):
+        return (value,)
+    return tuple(value)
+
+
+@dataclass(frozen=True)
+class CohortFilter:
+    project: Values = None
+    condition: Values = None
+    sex: Values = None
+    age_min: Optional[int] = None
+    age_max: Optional[int] = None
+    treatment: Values = None
+    response: Values = None
+    sample_type: Values = None
+    timepoints: Union[int, Tuple[int, ...], None] = None
+
+    def values(self, name: str) -> Optional[tuple]:
+        """
+        Normalized values for a text dimension or timepoints, or None.
+        """
+        raw = _as_tuple(getattr(self, name))
+        if raw is None:
+            return None
+        if name == "timepoints":
+            return tuple(int(v) for v in raw)
+        mode = TEXT_DIMENSIONS[name][1]
+        out = tuple(str(v).strip() for v in raw)
+        if mode == "upper":
+            out = tuple(v.upper() for v in out)
+        elif mode == "lower":
+            out = tuple(v.lower() for v in out)
+        return out
+
+    def shape(self) -> tuple:
+        """
+        Which dimensions are set, and with how many values.
+        """
+        out = []
+        for f in fields(self):
+            if f.name in ("age_min", "age_max"):
+                if getattr(self, f.name) is not None:
+                    out.append((f.name, 1))
+            else:
+                values = self.values(f.name)
+                if values is not None:
+                    out.append((f.name, len(values)))
+        return tuple(out)
+
+    def params(self) -> dict:
+        """
+        Bind parameters matching the SQL for this filter's shape.
+        """
+        out = {}
+        for name, n in self.shape():
+            if name in ("age_min", "age_max"):
+                out[f"cohort_{name}"] = int(getattr(self, name))
+                continue
+            for i, v in enumerate(self.values(name)):
+                out[f"cohort_{name}_{i}"] = v
+        return out
+
+
+def _predicate(name: str, n: int) -> str:
+    if name == "age_min":
+        return "subj.age >= :cohort_age_min"
+    if name == "age_max":
+        return "subj.age <= :cohort_age_max"
+
+    if name == "timepoints":
+        column, collate = "s.time_from_treatment_start", ""
+    else:
+        column, mode = TEXT_DIMENSIONS[name]
+        collate = " COLLATE NOCASE" if mode == "nocase" else ""
+
+    placeholders = [f":cohort_{name}_{i}" for i in range(n)]
+    if n == 0:
+        return "0"
+    if n == 1:
+        return f"{column} = {placeholders[0]}{collate}"
+    return f"{column}{collate} IN ({', '.join(placeholders)})"
+
+
+@lru_cache(maxsize=128)
+def _cohort_sql(shape: tuple) -> str:
+    where = "\n        AND ".join(_predicate(name, n) for name, n in shape) or "1"
+    return f"""
+    SELECT{COHORT_COLUMNS}
+    FROM samples s
+    JOIN subjects subj ON subj.id = s.subject_id
+    JOIN projects proj ON proj.id = subj.project_id
+    JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+    WHERE
+        {where}"""
+
+
+def cohort_cte(cohort: CohortFilter, name: str = "cohort") -> Tuple[str, dict]:
+    """
+    `WITH <name> AS (...)` selecting COHORT_COLUMNS for the cohort's
+    samples, plus its bind parameters. Callers append their own SELECT.
+    """
+    return f"WITH {name} AS ({_cohort_sql(cohort.shape())}\n    )", cohort.params()
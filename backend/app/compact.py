@@ -0,0 +1,238 @@
+"""
+Migrate a standard database to the compact storage layout.
+
+The compact layout (db.init_schema(storage="compact")) stores
+condition / treatment / sample_type / sex as integer codes into small
+dictionaries behind views with the original table names, and keeps
+cell_counts / sample_frequencies in WITHOUT ROWID tables. IDs, rows and
+data_version are preserved, so the API, the columnar snapshot and later
+incremental loads work on the result unchanged. Derived tables that an
+older source database lacks (sample_frequencies, cohort_cube) are built
+from its rows, and values that differ only in case share one dictionary
+entry (the first spelling), as NOCASE columns do.
+
+The copy is written to a temporary file next to the destination and
+moved into place once complete; stop the API (or point it elsewhere)
+while migrating a database in place.
+
+    python -m app.compact --db data/app.db
+    python -m app.compact --db data/app.db --out data/app-compact.db
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from .cube import refresh_cohort_cube
+from .db import COMPACT_TABLES, get_connection, init_indexes, init_schema, nocase, storage_mode
+from .load_db import refresh_sample_frequencies
+from .snapshot import snapshot_path, write_snapshot
+
+# Dictionary table -> (source table, source column), in first-seen id order.
+_DICTIONARIES = {
+    "dict_condition": ("subjects", "condition"),
+    "dict_sex": ("subjects", "sex"),
+    "dict_treatment": ("treatment_courses", "treatment"),
+    "dict_sample_type": ("samples", "sample_type"),
+}
+
+# Tables copied column for column, before and after the coded tables
+# (foreign keys are enforced during the copy).
+_PARENT_TABLES = ["projects", "populations"]
+_CHILD_TABLES = [
+    "cell_counts",
+    "sample_frequencies",
+    "sample_hashes",
+    "ingested_files",
+    "db_meta",
+    "cohort_cube",
+]
+
+
+def _checkpoint(db_path: str) -> None:
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def _copy_tables(conn: sqlite3.Connection, tables: list) -> list:
+    """
+    Copy the tables the source has; returns the ones it lacks.
+    """
+    old_tables = {r[0] for r in conn.execute("SELECT name FROM old.sqlite_master WHERE type = 'table'")}
+    missing = []
+    for table in tables:
+        if table not in old_tables:
+            missing.append(table)
+            continue
+        columns = ", ".join(r[1] for r in conn.execute(f"PRAGMA main.table_info({table})"))
+        conn.execute(f"INSERT INTO {table}({columns}) SELECT {columns} FROM old.{table} ORDER BY 1, 2")
+    return missing
+
+
+def _check_courses(conn: sqlite3.Connection) -> None:
+    # Databases from before treatment was NOCASE may hold one course per
+    # spelling; they would collide on the coded UNIQUE(subject, treatment).
+    row = conn.execute(
+        """
+        SELECT subject_id, GROUP_CONCAT(treatment, ', ')
+        FROM old.treatment_courses
+        GROUP BY subject_id, nocase(treatment)
+        HAVING COUNT(*) > 1
+        LIMIT 1
+        """
+    ).fetchone()
+    if row is not None:
+        raise ValueError(
+            f"subject {row[0]} has treatment courses differing only in case ({row[1]}); "
+            "merge them before migrating"
+        )
+
+
+def _copy(conn: sqlite3.Connection) -> None:
+    # ASCII-only case folding, the same as the NOCASE dictionary columns.
+    conn.create_function("nocase", 1, nocase, deterministic=True)
+    _check_courses(conn)
+
+    _copy_tables(conn, _PARENT_TABLES)
+    for table, (source, column) in _DICTIONARIES.items():
+        conn.execute(
+            f"""
+            INSERT INTO {table}(value)
+            SELECT value FROM (
+                -- With a single MIN(), the bare column comes from that row:
+                -- the first spelling of each value, as the triggers keep.
+                SELECT {column} AS value, MIN(id) AS first_id
+                FROM old.{source}
+                WHERE {column} IS NOT NULL
+                GROUP BY nocase({column})
+            )
+            ORDER BY first_id
+            """
+        )
+
+    conn.execute(
+        """
+        INSERT INTO subjects_data(id, subject_code, project_id, condition_code, age, sex_code)
+        SELECT s.id, s.subject_code, s.project_id, c.code, s.age, x.code
+        FROM old.subjects s
+        JOIN dict_condition c ON c.value = s.condition
+        LEFT JOIN dict_sex x ON x.value = s.sex
+        ORDER BY s.id
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO treatment_courses_data(id, subject_id, treatment_code, response)
+        SELECT tc.id, tc.subject_id, t.code, tc.response
+        FROM old.treatment_courses tc
+        JOIN dict_treatment t ON t.value = tc.treatment
+        ORDER BY tc.id
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO samples_data(
+            id, sample_code, subject_id, treatment_course_id, sample_type_code, time_from_treatment_start
+        )
+        SELECT s.id, s.sample_code, s.subject_id, s.treatment_course_id, st.code, s.time_from_treatment_start
+        FROM old.samples s
+        JOIN dict_sample_type st ON st.value = s.sample_type
+        ORDER BY s.id
+        """
+    )
+
+    missing = _copy_tables(conn, _CHILD_TABLES)
+    if "sample_frequencies" in missing:
+        refresh_sample_frequencies(conn)
+    if "cohort_cube" in missing:
+        refresh_cohort_cube(conn)
+
+    # Keep AUTOINCREMENT positions (ids burned by INSERT OR IGNORE included).
+    conn.execute("DELETE FROM sqlite_sequence")
+    for name, seq in conn.execute("SELECT name, seq FROM old.sqlite_sequence").fetchall():
+        conn.execute(
+            "INSERT INTO sqlite_sequence(name, seq) VALUES (?, ?)", (COMPACT_TABLES.get(name, name), seq)
+        )
+
+
+def migrate_to_compact(db_path: str, out_path: Optional[str] = None, snapshot: bool = True) -> Path:
+    """
+    Copy a standard-layout database into the compact layout at out_path
+    (default: replace db_path). Returns the destination path. A snapshot
+    is written next to a new destination unless snapshot=False; in place,
+    the existing snapshot stays valid (same data and data_version).
+    """
+    src = Path(db_path)
+    dst = Path(out_path) if out_path else src
+    if not src.exists():
+        raise FileNotFoundError(f"No such database: {src}")
+
+    conn = get_connection(str(src))
+    try:
+        mode = storage_mode(conn)
+    finally:
+        conn.close()
+    if mode != "standard":
+        raise ValueError(f"{src} is not a standard-layout database (found: {mode})")
+
+    # Fold the WAL into the main file so the attached copy sees every row.
+    _checkpoint(str(src))
+
+    tmp = dst.with_name(f"{dst.name}.compact-tmp-{os.getpid()}")
+    for path in (tmp, Path(f"{tmp}-wal"), Path(f"{tmp}-shm")):
+        path.unlink(missing_ok=True)
+
+    conn = get_connection(str(tmp))
+    try:
+        init_schema(conn, create_indexes=False, storage="compact")
+        conn.execute("ATTACH DATABASE ? AS old", (str(src),))
+        _copy(conn)
+        init_indexes(conn)
+        conn.commit()
+        conn.execute("DETACH DATABASE old")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except BaseException:
+        conn.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    conn.close()
+
+    if dst.exists():
+        _checkpoint(str(dst))
+    os.replace(tmp, dst)
+    for suffix in ("-wal", "-shm"):
+        Path(f"{tmp}{suffix}").unlink(missing_ok=True)
+
+    if snapshot and dst != src:
+        conn = get_connection(str(dst))
+        try:
+            write_snapshot(conn, snapshot_path(str(dst)))
+        finally:
+            conn.close()
+    return dst
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a cell-count database to the compact storage layout.")
+    parser.add_argument("--db", required=True, help="Standard-layout SQLite db to convert")
+    parser.add_argument("--out", help="Write the compact copy here instead of replacing --db")
+    parser.add_argument("--no-snapshot", action="store_true", help="Do not write a snapshot next to --out")
+    args = parser.parse_args()
+
+    before = Path(args.db).stat().st_size
+    started = time.perf_counter()
+    dst = migrate_to_compact(args.db, args.out, snapshot=not args.no_snapshot)
+    elapsed = time.perf_counter() - started
+    after = dst.stat().st_size
+    print(f"Migrated {args.db} -> {dst} in {elapsed:.2f}s")
+    print(f"{before:,} -> {after:,} bytes ({before / max(after, 1):.2f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Response compression.
+
+CompressionMiddleware negotiates Brotli (when the optional `brotli` package
+is installed and the client accepts `br`) and otherwise defers to
+Starlette's GZipMiddleware. Bodies smaller than minimum_size are sent as-is,
+and responses that already carry a Content-Encoding are passed through.
+Streaming responses (ndjson/csv) are compressed chunk by chunk.
+"""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+def _accepts(headers: Headers, encoding: str) -> bool:
+    accepted = headers.get("accept-encoding", "")
+    return any(part.split(";")[0].strip() == encoding for part in accepted.split(","))
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and brotli is not None and _accepts(Headers(scope=scope), "br"):
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+            await responder(scope, receive, send)
+            return
+        await self.gzip(scope, receive, send)
+
+
+class BrotliResponder:
+    """
+    Same message handling as Starlette's GZipResponder, with a Brotli
+    stream compressor.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressor = brotli.Compressor(quality=quality)
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_brotli)
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        out = self.compressor.process(body)
+        return out + (self.compressor.flush() if more_body else self.compressor.finish())
+
+    async def send_with_brotli(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk decides the headers.
+            self.initial_message = message
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if not self.started:
+            self.started = True
+            if len(body) < self.minimum_size and not more_body:
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = "br"
+            headers.add_vary_header("Accept-Encoding")
+            body = self._compress(body, more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send(self.initial_message)
+        else:
+            body = self._compress(body, more_body)
+
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -0,0 +1,168 @@
+"""
+Off-event-loop execution for the async API handlers.
+
+- DB reads run on a dedicated thread pool sized to the connection pool
+  (main.run_db checks out one pooled connection per call).
+- CPU-heavy statistics run on a process pool (run_cpu), so SciPy work
+  neither holds the GIL against request handling nor occupies DB threads.
+  STATS_PROCESSES=0 runs them on the DB threads instead.
+- EndpointLimit.slot() caps concurrent requests per endpoint class; excess
+  requests wait on the event loop without tying up any thread.
+"""
+
+import asyncio
+import functools
+import multiprocessing as mp
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterator, Optional, TypeVar
+
+from .metrics import TASK_LATENCY
+
+T = TypeVar("T")
+
+# Threads for DB reads; defaults to one per pooled connection.
+DB_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_POOL_SIZE", "4")))
+# Processes for statistics; 0 runs them on the DB threads.
+CPU_WORKERS = int(os.getenv("STATS_PROCESSES", str(min(2, os.cpu_count() or 1))))
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        with _executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(DB_WORKERS, thread_name_prefix="db")
+    return _db_executor
+
+
+def cpu_executor() -> Executor:
+    """
+    Process pool for statistics, or the DB thread pool when CPU_WORKERS
+    is 0. Workers are spawned (not forked) so they never inherit the
+    parent's SQLite handles or threads.
+    """
+    global _cpu_executor
+    if CPU_WORKERS <= 0:
+        return db_executor()
+    if _cpu_executor is None:
+        with _executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = ProcessPoolExecutor(CPU_WORKERS, mp_context=mp.get_context("spawn"))
+    return _cpu_executor
+
+
+def shutdown() -> None:
+    global _db_executor, _cpu_executor
+    with _executor_lock:
+        for executor in (_cpu_executor, _db_executor):
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+        _db_executor = _cpu_executor = None
+
+
+async def run_in(executor: Executor, fn: Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a picklable, module-level function on the statistics pool. A pool
+    broken by a crashed worker is replaced and the call retried once.
+    The awaited time is recorded per function in TASK_LATENCY.
+    """
+    global _cpu_executor
+    started = time.perf_counter()
+    executor = cpu_executor()
+    try:
+        return await run_in(executor, fn, *args, **kwargs)
+    except BrokenProcessPool:
+        with _executor_lock:
+            if _cpu_executor is executor:
+                _cpu_executor = None
+        executor.shutdown(wait=False)
+        return await run_in(cpu_executor(), fn, *args, **kwargs)
+    finally:
+        TASK_LATENCY.observe(time.perf_counter() - started, "cpu", fn.__name__)
+
+
+async def iterate_in(executor: Executor, iterator: Iterator[T]):
+    """
+    Drive a blocking iterator from an async generator, one item per
+    executor call. The iterator is closed on the executor as well, so
+    resources it holds (e.g. a pooled connection) are released even when
+    the client disconnects mid-stream.
+    """
+    done = object()
+    try:
+        while True:
+            item = await run_in(executor, next, iterator, done)
+            if item is done:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_in(executor, close)
+
+
+class EndpointLimit:
+    """
+    Cap on concurrently running requests of one endpoint class.
+
+    The underlying asyncio.Semaphore is created on first use in the
+    running loop (and recreated if the loop changes, e.g. under
+    TestClient), since semaphores are bound to a single event loop.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = 0
+        self._waiting = 0
+        self._total = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._sem
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the `limit` slots for the duration of the block.
+        """
+        sem = self._semaphore()
+        self._waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        self._total += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "running": self._running,
+            "waiting": self._waiting,
+            "total": self._total,
+        }
@@ -0,0 +1,205 @@
+"""
+Pre-aggregated cohort cube.
+
+cohort_cube holds sample and distinct-subject counts for every
+combination of CUBE_DIMENSIONS present in the data. Full loads rebuild
+it and incremental loads recompute only the cells that gained samples,
+so a summary over those dimensions becomes an indexed scan of a few cube
+rows plus a small rollup, instead of a join over
+samples/subjects/projects/treatment_courses.
+
+Sample counts roll up exactly along any dimension. Subject counts do not
+always: a subject has one project, condition and sex, and at most one
+response per treatment, but it can contribute samples at several
+treatments, sample types and timepoints. Summing n_subjects is therefore
+exact only when each of SUBJECT_VARYING is fixed to a single value or
+kept in the grouping. Otherwise cube_rollup reports n_subjects as None.
+"""
+
+import sqlite3
+from typing import Iterable, Optional, Sequence
+
+from .cohort import CohortFilter
+
+# Dimension -> (cube column, source expression)
+CUBE_COLUMNS = {
+    "condition": ("condition", "subj.condition"),
+    "treatment": ("treatment", "tc.treatment"),
+    "sample_type": ("sample_type", "s.sample_type"),
+    "timepoint": ("time", "s.time_from_treatment_start"),
+    "project": ("project", "proj.name"),
+    "response": ("response", "tc.response"),
+    "sex": ("sex", "subj.sex"),
+}
+CUBE_DIMENSIONS = tuple(CUBE_COLUMNS)
+
+SUBJECT_VARYING = ("treatment", "sample_type", "timepoint")
+
+# Cube dimension -> CohortFilter field
+_FILTER_FIELDS = {dim: dim for dim in CUBE_DIMENSIONS}
+_FILTER_FIELDS["timepoint"] = "timepoints"
+
+# Compared case-insensitively, like cohort_cte().
+_NOCASE = {"condition", "treatment", "sample_type", "project"}
+
+
+# Cube columns that may be NULL.
+_NULLABLE = {"response", "sex"}
+
+# Cube keys of the samples being refreshed; same collations as cohort_cube.
+_KEYS_TABLE = """
+CREATE TEMP TABLE cube_keys (
+    condition TEXT COLLATE NOCASE,
+    treatment TEXT COLLATE NOCASE,
+    sample_type TEXT COLLATE NOCASE,
+    time INTEGER,
+    project TEXT,
+    response TEXT,
+    sex TEXT
+)
+"""
+
+_SAMPLE_JOINS = """
+    JOIN subjects subj ON subj.id = s.subject_id
+    JOIN projects proj ON proj.id = subj.project_id
+    JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+"""
+
+
+def _not_null(column: str, expr: str) -> str:
+    return f"ifnull({expr}, '')" if column in _NULLABLE else expr
+
+
+def refresh_cohort_cube(conn: sqlite3.Connection, sample_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Rebuild cohort_cube from the sample tables, either entirely or only
+    the cells holding the given sample ids (incremental loads: samples are
+    only ever added, so only the cells of new samples change). Grouping
+    follows the source collations, so NOCASE spellings share one cube row.
+    """
+    columns = ", ".join(col for col, _ in CUBE_COLUMNS.values())
+    exprs = ", ".join(expr for _, expr in CUBE_COLUMNS.values())
+    insert_sql = f"""
+        INSERT INTO cohort_cube({columns}, n_samples, n_subjects)
+        SELECT {exprs}, COUNT(*), COUNT(DISTINCT s.subject_id)
+        FROM samples s
+        {_SAMPLE_JOINS}
+        {{where}}
+        GROUP BY {exprs}
+    """
+    if sample_ids is None:
+        conn.execute("DELETE FROM cohort_cube")
+        conn.execute(insert_sql.format(where=""))
+        return
+
+    ids = sorted(set(sample_ids))
+    if not ids:
+        return
+    conn.execute("DROP TABLE IF EXISTS temp.cube_samples")
+    conn.execute("DROP TABLE IF EXISTS temp.cube_keys")
+    conn.execute("CREATE TEMP TABLE cube_samples (id INTEGER PRIMARY KEY)")
+    conn.execute(_KEYS_TABLE)
+    try:
+        conn.executemany("INSERT INTO temp.cube_samples(id) VALUES (?)", ((i,) for i in ids))
+        conn.execute(
+            f"""
+            INSERT INTO temp.cube_keys
+            SELECT DISTINCT {exprs}
+            FROM temp.cube_samples c
+            JOIN samples s ON s.id = c.id
+            {_SAMPLE_JOINS}
+            """
+        )
+        # IS, not =: response and sex may be NULL.
+        conn.execute(
+            f"""
+            DELETE FROM cohort_cube WHERE EXISTS (
+                SELECT 1 FROM temp.cube_keys k
+                WHERE {" AND ".join(f"cohort_cube.{col} IS k.{col}" for col, _ in CUBE_COLUMNS.values())}
+            )
+            """
+        )
+        # One pass over the samples of the affected sample_type/time
+        # slices (idx_samples_type_time), keeping rows whose full key was
+        # touched. NULL response/sex are mapped to '' so IN can match them.
+        source_keys = ", ".join(_not_null(col, expr) for col, expr in CUBE_COLUMNS.values())
+        touched_keys = ", ".join(_not_null(col, col) for col, _ in CUBE_COLUMNS.values())
+        conn.execute(
+            insert_sql.format(
+                where=f"""
+                WHERE (s.sample_type, s.time_from_treatment_start) IN (SELECT sample_type, time FROM temp.cube_keys)
+                  AND ({source_keys}) IN (SELECT {touched_keys} FROM temp.cube_keys)
+                """
+            )
+        )
+    finally:
+        conn.execute("DROP TABLE temp.cube_samples")
+        conn.execute("DROP TABLE temp.cube_keys")
+
+
+def cube_available(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cohort_cube'").fetchone()
+    return row is not None
+
+
+def cube_covers(cohort: CohortFilter) -> bool:
+    """
+    Whether the cube can answer this filter (age is not a cube dimension).
+    """
+    return cohort.age_min is None and cohort.age_max is None
+
+
+def subjects_exact(cohort: CohortFilter, group_by: Sequence[str]) -> bool:
+    for dim in SUBJECT_VARYING:
+        values = cohort.values(_FILTER_FIELDS[dim])
+        if dim not in group_by and (values is None or len(values) != 1):
+            return False
+    return True
+
+
+def cube_rollup(
+    conn: sqlite3.Connection, cohort: CohortFilter, group_by: Sequence[str] = CUBE_DIMENSIONS
+) -> list[dict]:
+    """
+    Sample and subject counts for the cohort, grouped by `group_by` (cube
+    dimension names) and ordered by them. n_subjects is None where it
+    cannot be rolled up exactly (see subjects_exact).
+    """
+    if not cube_covers(cohort):
+        raise ValueError("cohort_cube cannot filter on age")
+    group_by = list(group_by)
+    unknown = set(group_by) - set(CUBE_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown cube dimensions: {sorted(unknown)}")
+
+    where, params = [], []
+    for dim in CUBE_DIMENSIONS:
+        values = cohort.values(_FILTER_FIELDS[dim])
+        if values is None:
+            continue
+        column = CUBE_COLUMNS[dim][0]
+        collate = " COLLATE NOCASE" if dim in _NOCASE else ""
+        if not values:
+            where.append("0")
+        else:
+            where.append(f"{column}{collate} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+    columns = [f"{CUBE_COLUMNS[dim][0]} AS {dim}" for dim in group_by]
+    keys = ", ".join(CUBE_COLUMNS[dim][0] for dim in group_by)
+    sql = f"""
+        SELECT {', '.join(columns + ['SUM(n_samples) AS n_samples', 'SUM(n_subjects) AS n_subjects'])}
+        FROM cohort_cube
+        WHERE {' AND '.join(where) or '1'}
+        {f'GROUP BY {keys} ORDER BY {keys}' if keys else ''}
+    """
+    exact = subjects_exact(cohort, group_by)
+    out = []
+    for r in conn.execute(sql, params):
+        if r["n_samples"] is None:
+            # Ungrouped aggregate over no rows.
+            continue
+        row = dict(r)
+        row["n_subjects"] = int(row["n_subjects"]) if exact else None
+        out.append(row)
+    return out
@@ -1,5 +1,21 @@
+import queue
 import sqlite3
+import string
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional
+
+
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def nocase(value: str) -> str:
+    """
+    Fold case the way SQLite's NOCASE collation does (ASCII letters only).
+    """
+    return value.translate(_NOCASE)
 
 
 def get_connection(db_path: str) -> sqlite3.Connection:
@@ -18,72 +34,552 @@ def get_connection(db_path: str) -> sqlite3.Connection:
     return conn
 
 
-def init_schema(conn: sqlite3.Connection) -> None:
+def file_identity(path: str) -> Optional[tuple[int, int]]:
     """
-    Create database schema for cell count analytics.
-    Safe to call multiple times.
+    (st_dev, st_ino) of the file at path, or None when it is missing. A
+    database rebuilt at the same path (load_db --replace) gets a new one.
     """
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE IF NOT EXISTS subjects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subject_code TEXT NOT NULL,
-            project_id INTEGER NOT NULL,
-            condition TEXT NOT NULL,
-            age INTEGER,
-            sex TEXT CHECK (sex IN ('M','F')),
-
-            UNIQUE(subject_code, project_id),
-            FOREIGN KEY (project_id) REFERENCES projects(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS treatment_courses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subject_id INTEGER NOT NULL,
-            treatment TEXT NOT NULL,
-            response TEXT CHECK (response IN ('yes','no')),
-
-            UNIQUE(subject_id, treatment),
-            FOREIGN KEY (subject_id) REFERENCES subjects(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS samples (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sample_code TEXT NOT NULL UNIQUE,
-            subject_id INTEGER NOT NULL,
-            treatment_course_id INTEGER NOT NULL,
-            sample_type TEXT NOT NULL,
-            time_from_treatment_start INTEGER NOT NULL,
-
-            FOREIGN KEY (subject_id) REFERENCES subjects(id),
-            FOREIGN KEY (treatment_course_id) REFERENCES treatment_courses(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS populations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE
-        );
-
-        CREATE TABLE IF NOT EXISTS cell_counts (
-            sample_id INTEGER NOT NULL,
-            population_id INTEGER NOT NULL,
-            count INTEGER NOT NULL CHECK (count >= 0),
-
-            PRIMARY KEY (sample_id, population_id),
-            FOREIGN KEY (sample_id) REFERENCES samples(id) ON DELETE CASCADE,
-            FOREIGN KEY (population_id) REFERENCES populations(id)
-        );
+    try:
+        st = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def open_readonly_connection(
+    db_path: str,
+    mmap_size: int = 256 * 1024 * 1024,
+    cache_size_kib: int = 64 * 1024,
+    factory: type = sqlite3.Connection,
+    immutable: bool = False,
+) -> sqlite3.Connection:
+    """
+    Open a read-only SQLite connection tuned for API reads.
+
+    The connection may be handed between threads (the pool guarantees
+    one user at a time), so check_same_thread is disabled. factory is
+    passed to sqlite3.connect (e.g. app.profiling.ProfilingConnection).
+
+    immutable=True promises SQLite the file never changes while open (a
+    published release, see app.releases): no locks, no WAL/change checks.
+    """
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=factory)
+    conn.row_factory = sqlite3.Row
+
+    conn.execute("PRAGMA query_only = ON;")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)};")
+    # Negative cache_size is in KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size = {-int(cache_size_kib)};")
+
+    return conn
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of read-only connections, opened once and reused
+    across requests. Tracks checkout and wait metrics.
+
+    A pool that is dropped rather than closed (main.get_pool swapping in
+    a new release) closes its connections when the last request holding
+    one of them releases it and the pool is garbage collected.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        timeout: float = 30.0,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kib: int = 64 * 1024,
+        factory: type = sqlite3.Connection,
+        immutable: bool = False,
+    ):
+        self.db_path = db_path
+        # The file the connections below are opened on (see file_identity).
+        self.file_id = file_identity(db_path)
+        self.size = size
+        self.timeout = timeout
+        self.immutable = immutable
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all = []
+        for _ in range(size):
+            conn = open_readonly_connection(
+                db_path, mmap_size=mmap_size, cache_size_kib=cache_size_kib, factory=factory, immutable=immutable
+            )
+            self._all.append(conn)
+            self._idle.put(conn)
+
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._in_use = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        started = time.perf_counter()
+        waited = False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            waited = True
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No database connection available after {self.timeout}s") from None
+
+        wait = time.perf_counter() - started
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            if waited:
+                self._waits += 1
+                self._wait_seconds += wait
+                self._max_wait_seconds = max(self._max_wait_seconds, wait)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_seconds_total": round(self._wait_seconds, 6),
+                "max_wait_seconds": round(self._max_wait_seconds, 6),
+            }
+
+    def close(self) -> None:
+        for conn in self._all:
+            conn.close()
+        self._all = []
+
+
+# Tables shared by both storage layouts.
+_COMMON_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS populations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- Key/value metadata; data_version is bumped by every load so API
+-- caches can tell when results are stale.
+CREATE TABLE IF NOT EXISTS db_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+-- Ingest manifest: files already loaded and a content hash per sample
+-- so incremental loads can skip unchanged rows.
+CREATE TABLE IF NOT EXISTS ingested_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL UNIQUE,
+    n_rows INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS sample_hashes (
+    sample_id INTEGER PRIMARY KEY,
+    row_hash TEXT NOT NULL,
+
+    FOREIGN KEY (sample_id) REFERENCES samples{suffix}(id) ON DELETE CASCADE
+);
+
+-- Sample / distinct-subject counts per metadata combination,
+-- rebuilt by the loaders after every write (see app.cube).
+CREATE TABLE IF NOT EXISTS cohort_cube (
+    condition TEXT NOT NULL COLLATE NOCASE,
+    treatment TEXT NOT NULL COLLATE NOCASE,
+    sample_type TEXT NOT NULL COLLATE NOCASE,
+    time INTEGER NOT NULL,
+    project TEXT NOT NULL,
+    response TEXT,
+    sex TEXT,
+    n_samples INTEGER NOT NULL,
+    n_subjects INTEGER NOT NULL
+);
+"""
+
+_STANDARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_code TEXT NOT NULL,
+    project_id INTEGER NOT NULL,
+    condition TEXT NOT NULL COLLATE NOCASE,
+    age INTEGER,
+    sex TEXT CHECK (sex IN ('M','F')),
+
+    UNIQUE(subject_code, project_id),
+    FOREIGN KEY (project_id) REFERENCES projects(id)
+);
+
+CREATE TABLE IF NOT EXISTS treatment_courses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_id INTEGER NOT NULL,
+    treatment TEXT NOT NULL COLLATE NOCASE,
+    response TEXT CHECK (response IN ('yes','no')),
+
+    UNIQUE(subject_id, treatment),
+    FOREIGN KEY (subject_id) REFERENCES subjects(id)
+);
+
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sample_code TEXT NOT NULL UNIQUE,
+    subject_id INTEGER NOT NULL,
+    treatment_course_id INTEGER NOT NULL,
+    sample_type TEXT NOT NULL COLLATE NOCASE,
+    time_from_treatment_start INTEGER NOT NULL,
+
+    FOREIGN KEY (subject_id) REFERENCES subjects(id),
+    FOREIGN KEY (treatment_course_id) REFERENCES treatment_courses(id)
+);
+
+CREATE TABLE IF NOT EXISTS cell_counts (
+    sample_id INTEGER NOT NULL,
+    population_id INTEGER NOT NULL,
+    count INTEGER NOT NULL CHECK (count >= 0),
+
+    PRIMARY KEY (sample_id, population_id),
+    FOREIGN KEY (sample_id) REFERENCES samples(id) ON DELETE CASCADE,
+    FOREIGN KEY (population_id) REFERENCES populations(id)
+);
+
+-- Per-sample totals and relative frequencies, materialized by the
+-- loader so API reads avoid re-aggregating cell_counts.
+CREATE TABLE IF NOT EXISTS sample_frequencies (
+    sample_id INTEGER NOT NULL,
+    population_id INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    percentage REAL,
+
+    PRIMARY KEY (sample_id, population_id),
+    FOREIGN KEY (sample_id) REFERENCES samples(id) ON DELETE CASCADE,
+    FOREIGN KEY (population_id) REFERENCES populations(id)
+);
+"""
+
+# Compact layout: the low-cardinality text columns are stored as codes into
+# small dictionaries, and subjects / treatment_courses / samples are views
+# over the coded *_data tables, so every query and loader works unchanged.
+# INSTEAD OF triggers code values on insert and update (incremental loads
+# apply metadata edits) and delete the backing rows; a dictionary keeps the first
+# spelling of each NOCASE-equal value (as the columnar snapshot does). The
+# fact tables are WITHOUT ROWID: the primary key b-tree is the table.
+_COMPACT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dict_condition (
+    code INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE COLLATE NOCASE
+);
+
+CREATE TABLE IF NOT EXISTS dict_treatment (
+    code INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE COLLATE NOCASE
+);
 
+CREATE TABLE IF NOT EXISTS dict_sample_type (
+    code INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE COLLATE NOCASE
+);
+
+CREATE TABLE IF NOT EXISTS dict_sex (
+    code INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE CHECK (value IN ('M','F'))
+);
+
+CREATE TABLE IF NOT EXISTS subjects_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_code TEXT NOT NULL,
+    project_id INTEGER NOT NULL,
+    condition_code INTEGER NOT NULL,
+    age INTEGER,
+    sex_code INTEGER,
+
+    UNIQUE(subject_code, project_id),
+    FOREIGN KEY (project_id) REFERENCES projects(id),
+    FOREIGN KEY (condition_code) REFERENCES dict_condition(code),
+    FOREIGN KEY (sex_code) REFERENCES dict_sex(code)
+);
+
+CREATE TABLE IF NOT EXISTS treatment_courses_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_id INTEGER NOT NULL,
+    treatment_code INTEGER NOT NULL,
+    response TEXT CHECK (response IN ('yes','no')),
+
+    UNIQUE(subject_id, treatment_code),
+    FOREIGN KEY (subject_id) REFERENCES subjects_data(id),
+    FOREIGN KEY (treatment_code) REFERENCES dict_treatment(code)
+);
+
+CREATE TABLE IF NOT EXISTS samples_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sample_code TEXT NOT NULL UNIQUE,
+    subject_id INTEGER NOT NULL,
+    treatment_course_id INTEGER NOT NULL,
+    sample_type_code INTEGER NOT NULL,
+    time_from_treatment_start INTEGER NOT NULL,
+
+    FOREIGN KEY (subject_id) REFERENCES subjects_data(id),
+    FOREIGN KEY (treatment_course_id) REFERENCES treatment_courses_data(id),
+    FOREIGN KEY (sample_type_code) REFERENCES dict_sample_type(code)
+);
+
+CREATE TABLE IF NOT EXISTS cell_counts (
+    sample_id INTEGER NOT NULL,
+    population_id INTEGER NOT NULL,
+    count INTEGER NOT NULL CHECK (count >= 0),
+
+    PRIMARY KEY (sample_id, population_id),
+    FOREIGN KEY (sample_id) REFERENCES samples_data(id) ON DELETE CASCADE,
+    FOREIGN KEY (population_id) REFERENCES populations(id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sample_frequencies (
+    sample_id INTEGER NOT NULL,
+    population_id INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    percentage REAL,
+
+    PRIMARY KEY (sample_id, population_id),
+    FOREIGN KEY (sample_id) REFERENCES samples_data(id) ON DELETE CASCADE,
+    FOREIGN KEY (population_id) REFERENCES populations(id)
+) WITHOUT ROWID;
+
+CREATE VIEW IF NOT EXISTS subjects AS
+SELECT d.id AS id, d.subject_code AS subject_code, d.project_id AS project_id,
+       c.value AS condition, d.age AS age, x.value AS sex
+FROM subjects_data d
+JOIN dict_condition c ON c.code = d.condition_code
+LEFT JOIN dict_sex x ON x.code = d.sex_code;
+
+CREATE VIEW IF NOT EXISTS treatment_courses AS
+SELECT d.id AS id, d.subject_id AS subject_id, t.value AS treatment, d.response AS response
+FROM treatment_courses_data d
+JOIN dict_treatment t ON t.code = d.treatment_code;
+
+CREATE VIEW IF NOT EXISTS samples AS
+SELECT d.id AS id, d.sample_code AS sample_code, d.subject_id AS subject_id,
+       d.treatment_course_id AS treatment_course_id, st.value AS sample_type,
+       d.time_from_treatment_start AS time_from_treatment_start
+FROM samples_data d
+JOIN dict_sample_type st ON st.code = d.sample_type_code;
+
+-- Dictionary inserts avoid conflicts altogether (rather than OR IGNORE),
+-- because the outer statement's conflict policy overrides the trigger's.
+CREATE TRIGGER IF NOT EXISTS subjects_insert INSTEAD OF INSERT ON subjects
+BEGIN
+    INSERT INTO dict_condition(value)
+    SELECT NEW.condition WHERE NOT EXISTS (SELECT 1 FROM dict_condition WHERE value = NEW.condition);
+    INSERT INTO dict_sex(value)
+    SELECT NEW.sex WHERE NEW.sex IS NOT NULL AND NOT EXISTS (SELECT 1 FROM dict_sex WHERE value = NEW.sex);
+    INSERT INTO subjects_data(id, subject_code, project_id, condition_code, age, sex_code)
+    VALUES (
+        NEW.id, NEW.subject_code, NEW.project_id,
+        (SELECT code FROM dict_condition WHERE value = NEW.condition),
+        NEW.age,
+        (SELECT code FROM dict_sex WHERE value = NEW.sex)
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS treatment_courses_insert INSTEAD OF INSERT ON treatment_courses
+BEGIN
+    INSERT INTO dict_treatment(value)
+    SELECT NEW.treatment WHERE NOT EXISTS (SELECT 1 FROM dict_treatment WHERE value = NEW.treatment);
+    INSERT INTO treatment_courses_data(id, subject_id, treatment_code, response)
+    VALUES (
+        NEW.id, NEW.subject_id,
+        (SELECT code FROM dict_treatment WHERE value = NEW.treatment),
+        NEW.response
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS samples_insert INSTEAD OF INSERT ON samples
+BEGIN
+    INSERT INTO dict_sample_type(value)
+    SELECT NEW.sample_type WHERE NOT EXISTS (SELECT 1 FROM dict_sample_type WHERE value = NEW.sample_type);
+    INSERT INTO samples_data(
+        id, sample_code, subject_id, treatment_course_id, sample_type_code, time_from_treatment_start
+    )
+    VALUES (
+        NEW.id, NEW.sample_code, NEW.subject_id, NEW.treatment_course_id,
+        (SELECT code FROM dict_sample_type WHERE value = NEW.sample_type),
+        NEW.time_from_treatment_start
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS subjects_update INSTEAD OF UPDATE ON subjects
+BEGIN
+    INSERT INTO dict_condition(value)
+    SELECT NEW.condition WHERE NOT EXISTS (SELECT 1 FROM dict_condition WHERE value = NEW.condition);
+    INSERT INTO dict_sex(value)
+    SELECT NEW.sex WHERE NEW.sex IS NOT NULL AND NOT EXISTS (SELECT 1 FROM dict_sex WHERE value = NEW.sex);
+    UPDATE subjects_data SET
+        subject_code = NEW.subject_code,
+        project_id = NEW.project_id,
+        condition_code = (SELECT code FROM dict_condition WHERE value = NEW.condition),
+        age = NEW.age,
+        sex_code = (SELECT code FROM dict_sex WHERE value = NEW.sex)
+    WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS treatment_courses_update INSTEAD OF UPDATE ON treatment_courses
+BEGIN
+    INSERT INTO dict_treatment(value)
+    SELECT NEW.treatment WHERE NOT EXISTS (SELECT 1 FROM dict_treatment WHERE value = NEW.treatment);
+    UPDATE treatment_courses_data SET
+        subject_id = NEW.subject_id,
+        treatment_code = (SELECT code FROM dict_treatment WHERE value = NEW.treatment),
+        response = NEW.response
+    WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS samples_update INSTEAD OF UPDATE ON samples
+BEGIN
+    INSERT INTO dict_sample_type(value)
+    SELECT NEW.sample_type WHERE NOT EXISTS (SELECT 1 FROM dict_sample_type WHERE value = NEW.sample_type);
+    UPDATE samples_data SET
+        sample_code = NEW.sample_code,
+        subject_id = NEW.subject_id,
+        treatment_course_id = NEW.treatment_course_id,
+        sample_type_code = (SELECT code FROM dict_sample_type WHERE value = NEW.sample_type),
+        time_from_treatment_start = NEW.time_from_treatment_start
+    WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS subjects_delete INSTEAD OF DELETE ON subjects
+BEGIN
+    DELETE FROM subjects_data WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS treatment_courses_delete INSTEAD OF DELETE ON treatment_courses
+BEGIN
+    DELETE FROM treatment_courses_data WHERE id = OLD.id;
+END;
+"""
+
+STORAGE_MODES = ("standard", "compact")
+
+# Views in the compact layout -> the tables that hold their rows.
+COMPACT_TABLES = {
+    "subjects": "subjects_data",
+    "treatment_courses": "treatment_courses_data",
+    "samples": "samples_data",
+}
+
+_INDEXES = {
+    "standard": """
         CREATE INDEX IF NOT EXISTS idx_subjects_condition ON subjects(condition);
         CREATE INDEX IF NOT EXISTS idx_subjects_sex ON subjects(sex);
         CREATE INDEX IF NOT EXISTS idx_courses_treatment ON treatment_courses(treatment);
         CREATE INDEX IF NOT EXISTS idx_courses_response ON treatment_courses(response);
         CREATE INDEX IF NOT EXISTS idx_samples_type_time ON samples(sample_type, time_from_treatment_start);
+        """,
+    "compact": """
+        CREATE INDEX IF NOT EXISTS idx_subjects_condition ON subjects_data(condition_code);
+        CREATE INDEX IF NOT EXISTS idx_subjects_sex ON subjects_data(sex_code);
+        CREATE INDEX IF NOT EXISTS idx_courses_treatment ON treatment_courses_data(treatment_code);
+        CREATE INDEX IF NOT EXISTS idx_courses_response ON treatment_courses_data(response);
+        CREATE INDEX IF NOT EXISTS idx_samples_type_time ON samples_data(sample_type_code, time_from_treatment_start);
+        """,
+}
+
+
+def storage_mode(conn: sqlite3.Connection) -> str | None:
+    """
+    "standard" or "compact" for an initialized database, else None.
+    """
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'samples'").fetchone()
+    if row is None:
+        return None
+    return "compact" if row[0] == "view" else "standard"
+
+
+def init_schema(conn: sqlite3.Connection, create_indexes: bool = True, storage: str | None = None) -> None:
+    """
+    Create database schema for cell count analytics.
+    Safe to call multiple times.
+
+    storage picks the layout of a new database ("standard" by default, or
+    "compact"); an existing database keeps its own, and asking for the
+    other one raises (see app.compact.migrate_to_compact).
+
+    Pass create_indexes=False to defer secondary indexes (see init_indexes).
+    """
+    existing = storage_mode(conn)
+    if storage is not None and storage not in STORAGE_MODES:
+        raise ValueError(f"storage must be one of {STORAGE_MODES}")
+    if existing is not None and storage is not None and storage != existing:
+        raise ValueError(f"Database uses {existing} storage, not {storage}")
+    storage = existing or storage or "standard"
+
+    if storage == "compact":
+        conn.executescript(_COMMON_SCHEMA.format(suffix="_data") + _COMPACT_SCHEMA)
+    else:
+        conn.executescript(_COMMON_SCHEMA.format(suffix="") + _STANDARD_SCHEMA)
+    if create_indexes:
+        init_indexes(conn)
+    conn.commit()
+
+
+def init_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Create secondary indexes used by the analytics queries.
+    Bulk loads call this once after all rows are written.
+    """
+    conn.executescript(
+        _INDEXES[storage_mode(conn) or "standard"]
+        + "CREATE INDEX IF NOT EXISTS idx_cohort_cube_slice ON cohort_cube(treatment, sample_type, time, condition);"
+    )
+
+
+def get_data_version(conn: sqlite3.Connection) -> int:
+    """
+    Current data version stamp (0 for databases that predate db_meta).
+    """
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def bump_data_version(conn: sqlite3.Connection) -> None:
+    """
+    Advance the data version stamp. A database without one starts from the
+    current time in microseconds rather than 1, so a rebuilt database
+    (load_db --replace) never reuses the stamps of the one it replaced, and
+    with them its result-cache keys and ETags.
+    """
+    conn.execute(
         """
+        INSERT INTO db_meta(key, value) VALUES ('data_version', ?)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+        """,
+        (time.time_ns() // 1000,),
     )
-    conn.commit()
\ No newline at end of file
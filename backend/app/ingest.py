@@ -0,0 +1,255 @@
+"""
+Parallel ingest pipeline for sharded exports.
+
+Input files (a directory, a glob, or explicit paths; .csv, .csv.gz, or
+with pyarrow installed .parquet and Arrow IPC .arrow/.feather/.ipc) are
+parsed and validated in a process pool, one file per task. Workers stream
+parsed batches through a bounded queue to a single SQLite writer in the
+parent process, so memory stays flat regardless of input size and parsing
+scales with the number of files/cores.
+
+Rows are written in arrival order. Within a file that matches the
+sequential loader; across files, the first file to deliver a subject or
+sample defines its surrogate ID.
+
+Each file's population columns are resolved on its own (configured or
+discovered, see load_db.resolve_populations), so shards of different
+panels can be ingested together.
+"""
+
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import queue
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+from .arrow_io import ARROW_SUFFIXES
+from .cube import refresh_cohort_cube
+from .db import bump_data_version, get_connection, init_indexes, init_schema
+from .load_db import (
+    DEFAULT_BATCH_SIZE,
+    BulkWriter,
+    IncrementalWriter,
+    LoadStats,
+    _derived_tables_empty,
+    _file_sha256,
+    _iter_batches,
+    _open_input,
+    _record_ingested_file,
+    load_population_config,
+    refresh_sample_frequencies,
+)
+from .snapshot import snapshot_path, update_snapshot, write_snapshot
+
+INPUT_SUFFIXES = (".csv", ".csv.gz") + ARROW_SUFFIXES
+
+# Parsed batches buffered between the parser processes and the writer.
+DEFAULT_QUEUE_SIZE = 8
+
+_queue: Optional[mp.Queue] = None
+
+
+def expand_inputs(specs: Iterable[str]) -> List[Path]:
+    """
+    Resolve directories, glob patterns and file paths into a sorted,
+    de-duplicated list of input files (see INPUT_SUFFIXES).
+    """
+    specs = list(specs)
+    found = []
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            candidates = [p for p in path.iterdir() if p.is_file()]
+        elif glob.has_magic(spec):
+            candidates = [Path(p) for p in glob.glob(spec, recursive=True)]
+        elif path.is_file():
+            candidates = [path]
+        else:
+            raise FileNotFoundError(f"No such input: {spec}")
+        found.extend(p for p in candidates if p.name.endswith(INPUT_SUFFIXES))
+
+    paths = sorted({p.resolve() for p in found})
+    if not paths:
+        raise FileNotFoundError(f"No {'/'.join(INPUT_SUFFIXES)} inputs in: {specs}")
+    return paths
+
+
+def _init_worker(q: mp.Queue) -> None:
+    global _queue
+    _queue = q
+
+
+def _parse_file(
+    path: str, batch_size: int, skip_hashes: Optional[frozenset], populations: Optional[Sequence[str]] = None
+) -> None:
+    """
+    Worker task: parse and validate one file, pushing batches onto the
+    shared queue. Blocks when the writer falls behind. With skip_hashes
+    (incremental loads) the file is hashed first and skipped if already
+    ingested.
+    """
+    try:
+        file_hash = None
+        if skip_hashes is not None:
+            file_hash = _file_sha256(path)
+            if file_hash in skip_hashes:
+                _queue.put(("skipped", path))
+                return
+
+        n_rows = 0
+        with _open_input(path, populations, batch_size) as (reader, columns):
+            for batch in _iter_batches(reader, batch_size, columns):
+                _queue.put(("batch", path, batch, columns))
+                n_rows += len(batch)
+
+        _queue.put(("done", path, file_hash, n_rows))
+    except Exception as exc:
+        _queue.put(("error", path, f"{type(exc).__name__}: {exc}"))
+
+
+def ingest(
+    inputs: Iterable[str],
+    db_path: str,
+    replace_db: bool = False,
+    incremental: bool = False,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    snapshot: bool = True,
+    populations: Optional[Sequence[str]] = None,
+    storage: Optional[str] = None,
+) -> LoadStats:
+    """
+    Load every input file into db_path using a pool of parser processes
+    and a single writer. Uses the bulk writer by default, or the
+    change-detecting writer when incremental=True. The columnar snapshot
+    is rewritten after the commit (incremental: only the rows of added or
+    changed samples) unless snapshot=False. `populations`
+    fixes the population columns; by default each file's numeric
+    non-metadata columns are used. storage="compact" picks the compact
+    layout for a new database (see db.init_schema).
+    """
+    paths = expand_inputs(inputs)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+
+    db_file = Path(db_path)
+    if replace_db and db_file.exists():
+        db_file.unlink()
+
+    stats = LoadStats()
+    conn = get_connection(db_path)
+    ctx = mp.get_context()
+    q = ctx.Queue(maxsize=queue_size)
+    pool = ctx.Pool(workers, initializer=_init_worker, initargs=(q,))
+    try:
+        init_schema(conn, create_indexes=incremental, storage=storage)
+
+        skip_hashes = None
+        if incremental:
+            skip_hashes = frozenset(r["sha256"] for r in conn.execute("SELECT sha256 FROM ingested_files"))
+            writer = IncrementalWriter(conn, stats)
+            freq_empty, cube_empty = _derived_tables_empty(conn)
+        else:
+            writer = BulkWriter(conn)
+
+        results = [pool.apply_async(_parse_file, (str(p), batch_size, skip_hashes, populations)) for p in paths]
+        pool.close()
+
+        remaining = len(paths)
+        while remaining:
+            try:
+                msg = q.get(timeout=1.0)
+            except queue.Empty:
+                # A worker that died without reporting would otherwise hang us.
+                for r in results:
+                    if r.ready() and not r.successful():
+                        r.get()
+                continue
+
+            kind = msg[0]
+            if kind == "batch":
+                writer.write(msg[2], msg[3])
+                stats.rows += len(msg[2])
+            elif kind == "done":
+                _, path, file_hash, n_rows = msg
+                if file_hash is not None:
+                    _record_ingested_file(conn, path, file_hash, n_rows)
+                remaining -= 1
+            elif kind == "skipped":
+                remaining -= 1
+            else:
+                raise ValueError(f"Failed to parse {msg[1]}: {msg[2]}")
+
+        pool.join()
+        if incremental:
+            refresh_sample_frequencies(conn, None if freq_empty else writer.touched)
+            refresh_cohort_cube(conn, None if cube_empty or writer.relabelled else writer.added)
+        else:
+            refresh_sample_frequencies(conn)
+            refresh_cohort_cube(conn)
+            init_indexes(conn)
+        bump_data_version(conn)
+        conn.commit()
+
+        if snapshot and incremental:
+            update_snapshot(conn, snapshot_path(db_path), writer.touched | writer.added | writer.relabelled)
+        elif snapshot:
+            write_snapshot(conn, snapshot_path(db_path))
+
+    except BaseException:
+        pool.terminate()
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+        q.close()
+
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load many cell-count CSV / CSV.gz files into SQLite with parallel parsing."
+    )
+    parser.add_argument("inputs", nargs="+", help="CSV/Parquet/Arrow files, directories or glob patterns")
+    parser.add_argument("--db", required=True, help="Path to SQLite db file (e.g., backend/data/app.db)")
+    parser.add_argument("--replace", action="store_true", help="Delete existing DB file and rebuild")
+    parser.add_argument("--incremental", action="store_true", help="Only write new or changed samples")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per parsed batch")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Max batches buffered for the writer")
+    parser.add_argument("--no-snapshot", action="store_true", help="Do not write the columnar snapshot next to the DB")
+    parser.add_argument(
+        "--populations-config",
+        help="JSON list of population columns (default: every numeric non-metadata column)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Create the DB with the compact storage layout (dictionary codes, WITHOUT ROWID fact tables)",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = ingest(
+        args.inputs,
+        args.db,
+        replace_db=args.replace,
+        incremental=args.incremental,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        snapshot=not args.no_snapshot,
+        populations=load_population_config(args.populations_config) if args.populations_config else None,
+        storage="compact" if args.compact else None,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {len(expand_inputs(args.inputs))} file(s) -> {args.db}")
+    print(f"{stats.rows} rows in {elapsed:.2f}s ({stats.rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,66 @@
 import argparse
 import csv
+import gzip
+import hashlib
+import itertools
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
 
-from .db import get_connection, init_schema
+from .arrow_io import is_arrow_input, record_batches
+from .cube import refresh_cohort_cube
+from .db import COMPACT_TABLES, bump_data_version, get_connection, init_indexes, init_schema, nocase
+from .snapshot import snapshot_path, update_snapshot, write_snapshot
 
+# The original five-population panel. Inputs are not limited to it: population
+# columns come from a config file or are discovered (see resolve_populations).
 POPULATION_COLUMNS = ["b_cell", "cd8_t_cell", "cd4_t_cell", "nk_cell", "monocyte"]
 
+METADATA_COLUMNS = [
+    "project", "subject", "condition", "age", "sex",
+    "treatment", "response", "sample", "sample_type",
+    "time_from_treatment_start",
+]
+
+DEFAULT_BATCH_SIZE = 50_000
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lookups.
+MAX_SQL_PARAMS = 900
+
+# Leading rows inspected to decide which non-metadata columns are numeric.
+POPULATION_SNIFF_ROWS = 100
+
+
+class ParsedRow(NamedTuple):
+    """One validated CSV row (one sample with its population counts)."""
+    project: str
+    subject: str
+    condition: str
+    age: Optional[int]
+    sex: str
+    treatment: str
+    response: Optional[str]
+    sample: str
+    sample_type: str
+    time_from_treatment_start: int
+    # Aligned with the file's population columns; None where a cell is blank.
+    counts: Tuple[Optional[int], ...]
+
+
+@dataclass
+class LoadStats:
+    """Counters reported by load_csv_to_db."""
+    rows: int = 0
+    new_samples: int = 0
+    changed_samples: int = 0
+    unchanged_samples: int = 0
+    updated_counts: int = 0
+    skipped_file: bool = False
+
 
 def _get_or_create_project(conn, name: str) -> int:
     conn.execute("INSERT OR IGNORE INTO projects(name) VALUES (?)", (name,))
@@ -14,165 +68,960 @@ def _get_or_create_project(conn, name: str) -> int:
     return int(row["id"])
 
 
-def _get_or_create_population(conn, name: str) -> int:
-    conn.execute("INSERT OR IGNORE INTO populations(name) VALUES (?)", (name,))
-    row = conn.execute("SELECT id FROM populations WHERE name = ?", (name,)).fetchone()
-    return int(row["id"])
+class PopulationRegistry:
+    """
+    Population name -> id, registering unseen names in bulk (one
+    executemany plus one chunked lookup per new column set).
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids: Dict[str, int] = {}
+        self._by_columns: Dict[Tuple[str, ...], List[int]] = {}
+
+    def column_ids(self, populations: Sequence[str]) -> List[int]:
+        key = tuple(populations)
+        found = self._by_columns.get(key)
+        if found is None:
+            new = [p for p in dict.fromkeys(key) if p not in self.ids]
+            if new:
+                self.conn.executemany("INSERT OR IGNORE INTO populations(name) VALUES (?)", [(p,) for p in new])
+                for chunk in _chunks(new):
+                    marks = ",".join("?" * len(chunk))
+                    for r in self.conn.execute(f"SELECT id, name FROM populations WHERE name IN ({marks})", chunk):
+                        self.ids[r["name"]] = int(r["id"])
+            found = self._by_columns[key] = [self.ids[p] for p in key]
+        return found
+
+
+def load_population_config(path: str) -> List[str]:
+    """
+    Population columns from a JSON config: a list of column names, or an
+    object with a "populations" list.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    populations = config.get("populations") if isinstance(config, dict) else config
+    if not isinstance(populations, list) or not all(isinstance(p, str) and p.strip() for p in populations):
+        raise ValueError(f"{path}: expected a list of population column names")
+    return [p.strip() for p in populations]
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def resolve_populations(
+    fieldnames: Optional[Sequence[str]],
+    sample_rows: Sequence[Dict[str, str]],
+    configured: Optional[Sequence[str]] = None,
+) -> List[str]:
+    """
+    Population columns for one input file, in header order.
+
+    With a configured list, exactly those columns (all must be present).
+    Otherwise every non-metadata column whose non-blank values in
+    sample_rows are all numeric; a column that is blank throughout is kept
+    (a population not measured in those rows).
+    """
+    fieldnames = list(fieldnames or [])
+    required = {*METADATA_COLUMNS, *(configured or [])}
+    missing = required - set(fieldnames)
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {sorted(missing)}")
+    if configured is not None:
+        return list(configured)
+
+    populations = []
+    for col in fieldnames:
+        if col in METADATA_COLUMNS or not col.strip():
+            continue
+        # Typed (Parquet/Arrow) inputs carry numbers and None, not strings.
+        values = (str(v).strip() for v in (r.get(col) for r in sample_rows) if v is not None)
+        if all(_is_number(v) for v in values if v):
+            populations.append(col)
+    if not populations:
+        raise ValueError("CSV has no numeric population columns")
+    return populations
+
+
+def _open_reader(f, configured: Optional[Sequence[str]] = None) -> Tuple[Iterator[Dict[str, str]], List[str]]:
+    """
+    DictReader over f plus the file's population columns; the rows used
+    for column discovery are replayed.
+    """
+    reader = csv.DictReader(f)
+    head = list(itertools.islice(reader, POPULATION_SNIFF_ROWS))
+    populations = resolve_populations(reader.fieldnames, head, configured)
+    return itertools.chain(head, reader), populations
+
+
+def _parse_count(value) -> Optional[int]:
+    if value is None or isinstance(value, float) and value != value:
+        # Null, or NaN in a float column: not measured.
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    return int(float(value))
+
+
+def _parse_row(r: Dict[str, str], populations: Sequence[str]) -> ParsedRow:
+    """
+    Normalize and validate a single CSV row.
+    """
+    project_name = r["project"].strip()
+    subject_code = r["subject"].strip()
+    condition = r["condition"].strip()
+    sex = r["sex"].strip().upper()
+    sample_code = r["sample"].strip()
+
+    treatment = r["treatment"].strip()
+    response = r["response"].strip().lower()
+    if sex not in ("M", "F"):
+        raise ValueError(f"Unexpected sex value: {sex!r} (sample={sample_code})")
+    if response in ("responder", "responders", "r"):
+        response = "yes"
+    if response in ("non-responder", "non_responder", "nonresponder", "nr"):
+        response = "no"
+    # Allow missing response (store NULL). Only enforce if non-empty.
+    if response == "":
+        response = None
+    elif response not in ("yes", "no"):
+        raise ValueError(f"Unexpected response value: {response!r} (sample={sample_code})")
+
+    sample_type = r["sample_type"].strip()
+    time0 = int(r["time_from_treatment_start"])
+
+    age = None
+    if str(r.get("age", "")).strip() != "":
+        age = int(float(r["age"]))
+
+    counts = tuple(_parse_count(r[pop]) for pop in populations)
+
+    return ParsedRow(
+        project_name, subject_code, condition, age, sex,
+        treatment, response, sample_code, sample_type, time0, counts,
+    )
+
+
+def _open_text(path: str):
+    """
+    Open a CSV input for reading; .gz files are decompressed on the fly.
+    """
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", newline="")
+    return open(path, newline="")
+
+
+# Metadata parsed by _parse_row with str methods; age and
+# time_from_treatment_start are converted with int() and may stay numeric.
+_TEXT_COLUMNS = [c for c in METADATA_COLUMNS if c not in ("age", "time_from_treatment_start")]
+
+
+def _arrow_rows(names: Sequence[str], batches: Iterable) -> Iterator[Dict]:
+    """
+    Rows of Arrow record batches as dicts shaped like DictReader rows:
+    text metadata as str ("" for null), a null age as "", counts as-is.
+    """
+    for batch in batches:
+        columns = batch.to_pydict()
+        for name in _TEXT_COLUMNS:
+            columns[name] = ["" if v is None else str(v) for v in columns[name]]
+        columns["age"] = ["" if v is None else v for v in columns["age"]]
+        values = [columns[name] for name in names]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+
+@contextmanager
+def _open_input(
+    path: str, configured: Optional[Sequence[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[Tuple[Iterator[Dict], List[str]]]:
+    """
+    Row iterator plus population columns for a CSV (plain or .gz),
+    Parquet or Arrow IPC input. Parquet is read one row group at a time
+    in batches of batch_size rows; needs pyarrow for non-CSV inputs.
+    """
+    if not is_arrow_input(path):
+        with _open_text(path) as f:
+            yield _open_reader(f, configured)
+        return
+
+    with record_batches(path, batch_size) as (names, batches):
+        # Check required columns before touching any batch.
+        resolve_populations(names, [], configured or [])
+        rows = _arrow_rows(names, batches)
+        head = list(itertools.islice(rows, POPULATION_SNIFF_ROWS))
+        populations = resolve_populations(names, head, configured)
+        yield itertools.chain(head, rows), populations
+
+
+def _row_hash(row: ParsedRow, populations: Sequence[str]) -> str:
+    payload = tuple(row)
+    # Hashes of default-panel rows predate configurable populations; keep
+    # them stable so existing databases don't see every sample as changed.
+    if list(populations) != POPULATION_COLUMNS:
+        payload = (payload, tuple(populations))
+    return hashlib.blake2b(repr(payload).encode(), digest_size=16).hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _chunks(seq: List, size: int = MAX_SQL_PARAMS) -> Iterator[List]:
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def refresh_sample_frequencies(conn, sample_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Rebuild sample_frequencies from cell_counts, either for every sample
+    or only for the given sample ids (incremental loads).
+    """
+    insert_sql = """
+        INSERT INTO sample_frequencies(sample_id, population_id, total_count, count, percentage)
+        SELECT
+            sample_id,
+            population_id,
+            total_count,
+            count,
+            100.0 * count / total_count
+        FROM (
+            SELECT
+                cc.sample_id,
+                cc.population_id,
+                cc.count,
+                SUM(cc.count) OVER (PARTITION BY cc.sample_id) AS total_count
+            FROM cell_counts cc
+            {where}
+        )
+    """
+    if sample_ids is None:
+        conn.execute("DELETE FROM sample_frequencies")
+        conn.execute(insert_sql.format(where=""))
+        return
+
+    for chunk in _chunks(sorted(set(sample_ids))):
+        marks = ",".join("?" * len(chunk))
+        conn.execute(f"DELETE FROM sample_frequencies WHERE sample_id IN ({marks})", chunk)
+        conn.execute(insert_sql.format(where=f"WHERE cc.sample_id IN ({marks})"), chunk)
+
+
+def _derived_tables_empty(conn) -> Tuple[bool, bool]:
+    """
+    Whether sample_frequencies and cohort_cube are empty although samples
+    exist, as in a database loaded before those tables were added (where
+    init_schema has just created them). Incremental loads then rebuild
+    them in full rather than only for the delta.
+    """
+    if conn.execute("SELECT 1 FROM samples LIMIT 1").fetchone() is None:
+        return False, False
+    return (
+        conn.execute("SELECT 1 FROM sample_frequencies LIMIT 1").fetchone() is None,
+        conn.execute("SELECT 1 FROM cohort_cube LIMIT 1").fetchone() is None,
+    )
+
+
+def _metadata_key(project, subject, condition, age, sex, treatment, response, sample_type, time) -> tuple:
+    """
+    A sample's metadata as compared by incremental loads; dictionary values
+    compare like the NOCASE columns that store them.
+    """
+    return (project, subject, nocase(condition), age, sex, nocase(treatment), response, nocase(sample_type), time)
+
+
+def _iter_batches(
+    reader: Iterable[Dict[str, str]], batch_size: int, populations: Sequence[str]
+) -> Iterator[List[ParsedRow]]:
+    batch: List[ParsedRow] = []
+    for r in reader:
+        batch.append(_parse_row(r, populations))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load_rows(conn, reader: Iterable[Dict[str, str]], populations: Sequence[str]) -> int:
+    """
+    Row-by-row loader: one lookup/insert round trip per new entity.
+    """
+    # Pre-create population dimension table
+    pop_ids = PopulationRegistry(conn).column_ids(populations)
+
+    # Caches to reduce DB lookups
+    project_cache: Dict[str, int] = {}
+    subject_cache: Dict[Tuple[str, int], int] = {}
+    course_cache: Dict[Tuple[int, str], int] = {}
+    sample_cache: Dict[str, int] = {}
+
+    n_rows = 0
+    for r in reader:
+        row = _parse_row(r, populations)
+        n_rows += 1
+
+        # projects
+        if row.project not in project_cache:
+            project_cache[row.project] = _get_or_create_project(conn, row.project)
+        project_id = project_cache[row.project]
+
+        # subjects (unique per project)
+        subj_key = (row.subject, project_id)
+        if subj_key not in subject_cache:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO subjects(subject_code, project_id, condition, age, sex)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (row.subject, project_id, row.condition, row.age, row.sex),
+            )
+            found = conn.execute(
+                "SELECT id FROM subjects WHERE subject_code = ? AND project_id = ?",
+                (row.subject, project_id),
+            ).fetchone()
+            subject_cache[subj_key] = int(found["id"])
+        subject_id = subject_cache[subj_key]
+
+        # treatment course (unique per subject + treatment)
+        course_key = (subject_id, row.treatment)
+        if course_key not in course_cache:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO treatment_courses(subject_id, treatment, response)
+                VALUES (?, ?, ?)
+                """,
+                (subject_id, row.treatment, row.response),
+            )
+            found = conn.execute(
+                "SELECT id FROM treatment_courses WHERE subject_id = ? AND treatment = ?",
+                (subject_id, row.treatment),
+            ).fetchone()
+            course_cache[course_key] = int(found["id"])
+        course_id = course_cache[course_key]
+
+        # samples
+        if row.sample not in sample_cache:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO samples(sample_code, subject_id, treatment_course_id, sample_type, time_from_treatment_start)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (row.sample, subject_id, course_id, row.sample_type, row.time_from_treatment_start),
+            )
+            found = conn.execute(
+                "SELECT id FROM samples WHERE sample_code = ?",
+                (row.sample,),
+            ).fetchone()
+            sample_cache[row.sample] = int(found["id"])
+        sample_id = sample_cache[row.sample]
+
+        # counts (long format); blank cells are not stored
+        for pop_id, cnt in zip(pop_ids, row.counts):
+            if cnt is None:
+                continue
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO cell_counts(sample_id, population_id, count)
+                VALUES (?, ?, ?)
+                """,
+                (sample_id, pop_id, cnt),
+            )
+
+        # row hashes, so a later incremental load can skip unchanged samples
+        conn.execute(
+            "INSERT OR REPLACE INTO sample_hashes(sample_id, row_hash) VALUES (?, ?)",
+            (sample_id, _row_hash(row, populations)),
+        )
+
+    return n_rows
+
+
+def _next_id(conn, table: str) -> int:
+    """
+    Next AUTOINCREMENT id for a table, matching what SQLite would assign.
+    Compact databases keep the sequence under the backing *_data table.
+    """
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name IN (?, ?)", (table, COMPACT_TABLES.get(table, table))
+    ).fetchone()
+    return (int(row["seq"]) if row else 0) + 1
+
+
+class BulkWriter:
+    """
+    Set-based writer: surrogate IDs are assigned in memory and each table
+    is written with one executemany per batch.
+
+    Produces the same rows and IDs as the row-by-row loader: dimension rows
+    keep their first occurrence (INSERT OR IGNORE), counts keep the last one.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+        self.populations = PopulationRegistry(conn)
+
+        self.projects: Dict[str, int] = {
+            r["name"]: int(r["id"]) for r in conn.execute("SELECT id, name FROM projects")
+        }
+        self.subjects: Dict[Tuple[str, int], int] = {
+            (r["subject_code"], int(r["project_id"])): int(r["id"])
+            for r in conn.execute("SELECT id, subject_code, project_id FROM subjects")
+        }
+        self.courses: Dict[Tuple[int, str], int] = {
+            (int(r["subject_id"]), nocase(r["treatment"])): int(r["id"])
+            for r in conn.execute("SELECT id, subject_id, treatment FROM treatment_courses")
+        }
+        self.samples: Dict[str, int] = {
+            r["sample_code"]: int(r["id"]) for r in conn.execute("SELECT id, sample_code FROM samples")
+        }
+
+        self.next_project_id = _next_id(conn, "projects")
+        self.next_subject_id = _next_id(conn, "subjects")
+        self.next_course_id = _next_id(conn, "treatment_courses")
+        self.next_sample_id = _next_id(conn, "samples")
+
+    def write(self, rows: List[ParsedRow], populations: Sequence[str]) -> None:
+        pop_ids = self.populations.column_ids(populations)
+        new_projects = []
+        new_subjects = []
+        new_courses = []
+        new_samples = []
+        counts = []
+        hashes = []
+
+        for row in rows:
+            project_id = self.projects.get(row.project)
+            if project_id is None:
+                project_id = self.projects[row.project] = self.next_project_id
+                self.next_project_id += 1
+                new_projects.append((project_id, row.project))
+
+            subj_key = (row.subject, project_id)
+            subject_id = self.subjects.get(subj_key)
+            if subject_id is None:
+                subject_id = self.subjects[subj_key] = self.next_subject_id
+                self.next_subject_id += 1
+                new_subjects.append((subject_id, row.subject, project_id, row.condition, row.age, row.sex))
+
+            # treatment_courses.treatment is COLLATE NOCASE.
+            course_key = (subject_id, nocase(row.treatment))
+            course_id = self.courses.get(course_key)
+            if course_id is None:
+                course_id = self.courses[course_key] = self.next_course_id
+                self.next_course_id += 1
+                new_courses.append((course_id, subject_id, row.treatment, row.response))
+
+            sample_id = self.samples.get(row.sample)
+            if sample_id is None:
+                sample_id = self.samples[row.sample] = self.next_sample_id
+                self.next_sample_id += 1
+                new_samples.append(
+                    (sample_id, row.sample, subject_id, course_id, row.sample_type, row.time_from_treatment_start)
+                )
+
+            counts.extend(
+                (sample_id, pop_id, cnt) for pop_id, cnt in zip(pop_ids, row.counts) if cnt is not None
+            )
+            hashes.append((sample_id, _row_hash(row, populations)))
+
+        conn = self.conn
+        conn.executemany("INSERT INTO projects(id, name) VALUES (?, ?)", new_projects)
+        conn.executemany(
+            """
+            INSERT INTO subjects(id, subject_code, project_id, condition, age, sex)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            new_subjects,
+        )
+        conn.executemany(
+            """
+            INSERT INTO treatment_courses(id, subject_id, treatment, response)
+            VALUES (?, ?, ?, ?)
+            """,
+            new_courses,
+        )
+        conn.executemany(
+            """
+            INSERT INTO samples(id, sample_code, subject_id, treatment_course_id, sample_type, time_from_treatment_start)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            new_samples,
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO cell_counts(sample_id, population_id, count) VALUES (?, ?, ?)",
+            counts,
+        )
+        conn.executemany("INSERT OR REPLACE INTO sample_hashes(sample_id, row_hash) VALUES (?, ?)", hashes)
+
+
+def _load_bulk(conn, reader: Iterable[Dict[str, str]], batch_size: int, populations: Sequence[str]) -> int:
+    writer = BulkWriter(conn)
+    n_rows = 0
+    for batch in _iter_batches(reader, batch_size, populations):
+        writer.write(batch, populations)
+        n_rows += len(batch)
+    return n_rows
+
+
+class IncrementalWriter:
+    """
+    Change-detecting writer for append-mostly loads.
+
+    Only the samples present in an incoming batch are looked up, so the cost
+    of a load is proportional to the delta rather than to the database size.
+    New samples are inserted, samples whose row hash changed get only their
+    differing cell_counts rows rewritten, and unchanged samples are skipped.
+    A changed sample whose metadata differs is moved to its new subject and
+    treatment course, whose fields are updated to the incoming values.
+    """
+
+    def __init__(self, conn, stats: LoadStats):
+        self.conn = conn
+        self.stats = stats
+
+        self.populations = PopulationRegistry(conn)
 
+        self.projects: Dict[str, int] = {}
+        self.subjects: Dict[Tuple[str, int], int] = {}
+        self.courses: Dict[Tuple[int, str], int] = {}
 
-def load_csv_to_db(csv_path: str, db_path: str, replace_db: bool = False) -> None:
+        # Samples whose cell_counts were written; their derived rows need a refresh.
+        self.touched: Set[int] = set()
+        # Samples inserted by this load; only their cohort_cube cells change.
+        self.added: Set[int] = set()
+        # Samples whose metadata (or their subject's / course's) was updated.
+        self.relabelled: Set[int] = set()
+
+    def _subject_id(self, row: ParsedRow) -> int:
+        if row.project not in self.projects:
+            self.projects[row.project] = _get_or_create_project(self.conn, row.project)
+        project_id = self.projects[row.project]
+
+        subj_key = (row.subject, project_id)
+        if subj_key not in self.subjects:
+            self.conn.execute(
+                """
+                INSERT OR IGNORE INTO subjects(subject_code, project_id, condition, age, sex)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (row.subject, project_id, row.condition, row.age, row.sex),
+            )
+            found = self.conn.execute(
+                "SELECT id FROM subjects WHERE subject_code = ? AND project_id = ?",
+                (row.subject, project_id),
+            ).fetchone()
+            self.subjects[subj_key] = int(found["id"])
+        return self.subjects[subj_key]
+
+    def _course_id(self, row: ParsedRow, subject_id: int) -> int:
+        course_key = (subject_id, row.treatment)
+        if course_key not in self.courses:
+            self.conn.execute(
+                """
+                INSERT OR IGNORE INTO treatment_courses(subject_id, treatment, response)
+                VALUES (?, ?, ?)
+                """,
+                (subject_id, row.treatment, row.response),
+            )
+            found = self.conn.execute(
+                "SELECT id FROM treatment_courses WHERE subject_id = ? AND treatment = ?",
+                (subject_id, row.treatment),
+            ).fetchone()
+            self.courses[course_key] = int(found["id"])
+        return self.courses[course_key]
+
+    def _insert_sample(self, row: ParsedRow) -> int:
+        subject_id = self._subject_id(row)
+        course_id = self._course_id(row, subject_id)
+        self.conn.execute(
+            """
+            INSERT INTO samples(sample_code, subject_id, treatment_course_id, sample_type, time_from_treatment_start)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (row.sample, subject_id, course_id, row.sample_type, row.time_from_treatment_start),
+        )
+        # Not cursor.lastrowid: compact databases insert through a view trigger.
+        found = self.conn.execute("SELECT id FROM samples WHERE sample_code = ?", (row.sample,)).fetchone()
+        return int(found["id"])
+
+    def _stored_metadata(self, sample_ids: List[int]) -> Dict[int, sqlite3.Row]:
+        out = {}
+        for chunk in _chunks(sample_ids):
+            marks = ",".join("?" * len(chunk))
+            for r in self.conn.execute(
+                f"""
+                SELECT
+                    s.id, p.name AS project, sub.subject_code AS subject, sub.condition, sub.age, sub.sex,
+                    tc.treatment, tc.response, s.sample_type, s.time_from_treatment_start,
+                    s.subject_id, s.treatment_course_id
+                FROM samples s
+                JOIN subjects sub ON sub.id = s.subject_id
+                JOIN projects p ON p.id = sub.project_id
+                JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+                WHERE s.id IN ({marks})
+                """,
+                chunk,
+            ):
+                out[int(r["id"])] = r
+        return out
+
+    def _relabel(self, changed: Dict[int, ParsedRow]) -> Set[int]:
+        """
+        Apply metadata edits of changed samples; returns the ids of the
+        samples whose stored metadata differed.
+        """
+        conn = self.conn
+        stored = self._stored_metadata(list(changed))
+        relabelled = set()
+        subject_ids: Set[int] = set()
+        course_ids: Set[int] = set()
+        for sample_id, row in changed.items():
+            old = stored[sample_id]
+            new_key = _metadata_key(
+                row.project, row.subject, row.condition, row.age, row.sex,
+                row.treatment, row.response, row.sample_type, row.time_from_treatment_start,
+            )
+            if new_key == _metadata_key(*tuple(old)[1:10]):
+                continue
+            subject_id = self._subject_id(row)
+            conn.execute(
+                "UPDATE subjects SET condition = ?, age = ?, sex = ? WHERE id = ?",
+                (row.condition, row.age, row.sex, subject_id),
+            )
+            course_id = self._course_id(row, subject_id)
+            conn.execute("UPDATE treatment_courses SET response = ? WHERE id = ?", (row.response, course_id))
+            conn.execute(
+                """
+                UPDATE samples
+                SET subject_id = ?, treatment_course_id = ?, sample_type = ?, time_from_treatment_start = ?
+                WHERE id = ?
+                """,
+                (subject_id, course_id, row.sample_type, row.time_from_treatment_start, sample_id),
+            )
+            relabelled.add(sample_id)
+            subject_ids.update((subject_id, int(old["subject_id"])))
+            course_ids.update((course_id, int(old["treatment_course_id"])))
+
+        # Drop the subjects and courses the moved samples left behind; every
+        # sample of an updated subject or course sees the new values.
+        for chunk in _chunks(sorted(course_ids)):
+            marks = ",".join("?" * len(chunk))
+            conn.execute(
+                f"""
+                DELETE FROM treatment_courses
+                WHERE id IN ({marks})
+                  AND NOT EXISTS (SELECT 1 FROM samples s WHERE s.treatment_course_id = treatment_courses.id)
+                """,
+                chunk,
+            )
+            self.relabelled.update(
+                int(r["id"])
+                for r in conn.execute(f"SELECT id FROM samples WHERE treatment_course_id IN ({marks})", chunk)
+            )
+        for chunk in _chunks(sorted(subject_ids)):
+            marks = ",".join("?" * len(chunk))
+            conn.execute(
+                f"""
+                DELETE FROM subjects
+                WHERE id IN ({marks})
+                  AND NOT EXISTS (SELECT 1 FROM samples s WHERE s.subject_id = subjects.id)
+                  AND NOT EXISTS (SELECT 1 FROM treatment_courses tc WHERE tc.subject_id = subjects.id)
+                """,
+                chunk,
+            )
+            self.relabelled.update(
+                int(r["id"]) for r in conn.execute(f"SELECT id FROM samples WHERE subject_id IN ({marks})", chunk)
+            )
+        # Deleted rows must not be handed out again by the id caches.
+        for key in [k for k, v in self.subjects.items() if v in subject_ids]:
+            del self.subjects[key]
+        for key in [k for k, v in self.courses.items() if v in course_ids]:
+            del self.courses[key]
+        return relabelled
+
+    def write(self, rows: List[ParsedRow], populations: Sequence[str]) -> None:
+        conn = self.conn
+        pop_ids = self.populations.column_ids(populations)
+
+        # Repeated samples within a batch: metadata from the first row,
+        # counts from the last one (same as the full loaders).
+        pending: Dict[str, ParsedRow] = {}
+        for row in rows:
+            prev = pending.get(row.sample)
+            pending[row.sample] = row if prev is None else prev._replace(counts=row.counts)
+
+        existing: Dict[str, Tuple[int, Optional[str]]] = {}
+        for chunk in _chunks(list(pending)):
+            marks = ",".join("?" * len(chunk))
+            for r in conn.execute(
+                f"""
+                SELECT s.id, s.sample_code, h.row_hash
+                FROM samples s
+                LEFT JOIN sample_hashes h ON h.sample_id = s.id
+                WHERE s.sample_code IN ({marks})
+                """,
+                chunk,
+            ):
+                existing[r["sample_code"]] = (int(r["id"]), r["row_hash"])
+
+        writes = []
+        deletes = []
+        hashes = []
+        changed: Dict[int, ParsedRow] = {}
+        # Samples without a recorded hash (loaded before hashes were kept):
+        # only counted as changed if their cell counts actually differ.
+        unhashed: Set[int] = set()
+        for code, row in pending.items():
+            row_hash = _row_hash(row, populations)
+            found = existing.get(code)
+            if found is None:
+                sample_id = self._insert_sample(row)
+                self.added.add(sample_id)
+                writes.extend(
+                    (sample_id, pop_id, cnt) for pop_id, cnt in zip(pop_ids, row.counts) if cnt is not None
+                )
+                self.stats.new_samples += 1
+            elif found[1] == row_hash:
+                self.stats.unchanged_samples += 1
+                continue
+            else:
+                sample_id = found[0]
+                changed[sample_id] = row
+                if found[1] is None:
+                    unhashed.add(sample_id)
+                else:
+                    self.stats.changed_samples += 1
+            hashes.append((sample_id, row_hash))
+
+        relabelled = self._relabel(changed)
+
+        # Rewrite only the cell_counts rows that actually differ.
+        current: Dict[Tuple[int, int], int] = {}
+        for chunk in _chunks(list(changed)):
+            marks = ",".join("?" * len(chunk))
+            for r in conn.execute(
+                f"SELECT sample_id, population_id, count FROM cell_counts WHERE sample_id IN ({marks})",
+                chunk,
+            ):
+                current[(int(r["sample_id"]), int(r["population_id"]))] = int(r["count"])
+
+        for sample_id, row in changed.items():
+            differs = False
+            for pop_id, cnt in zip(pop_ids, row.counts):
+                old = current.get((sample_id, pop_id))
+                if old == cnt:
+                    continue
+                if cnt is None:
+                    deletes.append((sample_id, pop_id))
+                else:
+                    writes.append((sample_id, pop_id, cnt))
+                self.stats.updated_counts += 1
+                differs = True
+            if sample_id in unhashed:
+                if differs or sample_id in relabelled:
+                    self.stats.changed_samples += 1
+                else:
+                    self.stats.unchanged_samples += 1
+
+        self.touched.update(w[0] for w in writes)
+        self.touched.update(d[0] for d in deletes)
+
+        conn.executemany("DELETE FROM cell_counts WHERE sample_id = ? AND population_id = ?", deletes)
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO cell_counts(sample_id, population_id, count) VALUES (?, ?, ?)",
+            writes,
+        )
+        conn.executemany("INSERT OR REPLACE INTO sample_hashes(sample_id, row_hash) VALUES (?, ?)", hashes)
+
+
+def _load_incremental(
+    conn, reader: Iterable[Dict[str, str]], batch_size: int, populations: Sequence[str], stats: LoadStats
+) -> Tuple[int, Set[int]]:
+    """
+    Returns the number of rows read and the ids of the samples added or
+    changed, whose snapshot rows need updating.
     """
-    Initialize SQLite schema and load all rows from the input CSV.
+    freq_empty, cube_empty = _derived_tables_empty(conn)
+    writer = IncrementalWriter(conn, stats)
+    n_rows = 0
+    for batch in _iter_batches(reader, batch_size, populations):
+        writer.write(batch, populations)
+        n_rows += len(batch)
+    refresh_sample_frequencies(conn, None if freq_empty else writer.touched)
+    # Relabelled samples also leave their old cube cells: rebuild it all.
+    refresh_cohort_cube(conn, None if cube_empty or writer.relabelled else writer.added)
+    return n_rows, writer.touched | writer.added | writer.relabelled
+
+
+def _file_already_ingested(conn, file_hash: str) -> bool:
+    row = conn.execute("SELECT 1 FROM ingested_files WHERE sha256 = ?", (file_hash,)).fetchone()
+    return row is not None
+
+
+def _record_ingested_file(conn, path: str, file_hash: str, n_rows: int) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO ingested_files(path, sha256, n_rows) VALUES (?, ?, ?)",
+        (str(path), file_hash, n_rows),
+    )
+
+
+def load_csv_to_db(
+    csv_path: str,
+    db_path: str,
+    replace_db: bool = False,
+    bulk: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    incremental: bool = False,
+    snapshot: bool = True,
+    populations: Optional[Sequence[str]] = None,
+    storage: Optional[str] = None,
+) -> LoadStats:
+    """
+    Initialize SQLite schema and load all rows from the input file: a CSV
+    (plain or gzip-compressed), or a Parquet / Arrow IPC file (.parquet,
+    .arrow, .feather, .ipc; needs pyarrow), read batch by batch.
 
     Expected columns:
       project, subject, condition, age, sex, treatment, response,
       sample, sample_type, time_from_treatment_start,
-      plus population columns: b_cell, cd8_t_cell, cd4_t_cell, nk_cell, monocyte
+      plus one count column per population.
+
+    Population columns are `populations` when given (e.g. from
+    load_population_config), otherwise every numeric non-metadata column
+    (see resolve_populations). New populations are registered in bulk;
+    blank count cells mean "not measured" and are not stored.
+
+    bulk=True parses the CSV in batches of batch_size rows, writes each
+    table with executemany and creates secondary indexes after the load.
+
+    incremental=True skips files already recorded in ingested_files and,
+    per sample, skips rows whose content hash is unchanged; only new
+    samples and differing cell_counts rows are written. Every mode
+    records the per-sample hashes; only incremental loads hash the file
+    and record it in ingested_files.
+
+    snapshot=True also (re)writes the columnar snapshot next to the DB
+    (see app.snapshot) once the load is committed; incremental loads only
+    update the rows of the samples they added or changed.
+
+    storage="compact" creates a new database with the dictionary-coded,
+    WITHOUT ROWID layout (see db.init_schema); existing databases keep
+    their layout.
     """
+    if bulk and incremental:
+        raise ValueError("bulk and incremental loads are mutually exclusive")
+
     db_file = Path(db_path)
     if replace_db and db_file.exists():
         db_file.unlink()
 
+    stats = LoadStats()
+    # Samples whose snapshot rows changed; None rewrites the whole snapshot.
+    snapshot_ids: Optional[Set[int]] = None
     conn = get_connection(db_path)
     try:
-        init_schema(conn)
-
-        # Pre-create population dimension table
-        pop_name_to_id: Dict[str, int] = {p: _get_or_create_population(conn, p) for p in POPULATION_COLUMNS}
-
-        # Caches to reduce DB lookups
-        project_cache: Dict[str, int] = {}
-        subject_cache: Dict[Tuple[str, int], int] = {}
-        course_cache: Dict[Tuple[int, str], int] = {}
-        sample_cache: Dict[str, int] = {}
-
-        with open(csv_path, newline="") as f:
-            reader = csv.DictReader(f)
-
-            required_cols = {
-                "project", "subject", "condition", "age", "sex",
-                "treatment", "response", "sample", "sample_type",
-                "time_from_treatment_start", *POPULATION_COLUMNS
-            }
-            missing = required_cols - set(reader.fieldnames or [])
-            if missing:
-                raise ValueError(f"CSV is missing required columns: {sorted(missing)}")
-
-
-            for r in reader:
-                project_name = r["project"].strip()
-                subject_code = r["subject"].strip()
-                condition = r["condition"].strip()
-                sex = r["sex"].strip().upper()                
-
-                treatment = r["treatment"].strip()
-                response = r["response"].strip().lower()
-                if sex not in ("M", "F"):
-                    raise ValueError(f"Unexpected sex value: {sex!r} (sample={sample_code})")
-                if response in ("responder", "responders", "r"):
-                    response = "yes"
-                if response in ("non-responder", "non_responder", "nonresponder", "nr"):
-                    response = "no"
-                # Allow missing response (store NULL). Only enforce if non-empty.
-                if response == "":
-                    response = None
-                elif response not in ("yes", "no"):
-                    raise ValueError(f"Unexpected response value: {response!r} (sample={sample_code})")
-
-
-                sample_code = r["sample"].strip()
-                sample_type = r["sample_type"].strip()
-                time0 = int(r["time_from_treatment_start"])
-
-                age = None
-                if str(r.get("age", "")).strip() != "":
-                    age = int(float(r["age"]))
-
-                # projects
-                if project_name not in project_cache:
-                    project_cache[project_name] = _get_or_create_project(conn, project_name)
-                project_id = project_cache[project_name]
-
-                # subjects (unique per project)
-                subj_key = (subject_code, project_id)
-                if subj_key not in subject_cache:
-                    conn.execute(
-                        """
-                        INSERT OR IGNORE INTO subjects(subject_code, project_id, condition, age, sex)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (subject_code, project_id, condition, age, sex),
-                    )
-                    row = conn.execute(
-                        "SELECT id FROM subjects WHERE subject_code = ? AND project_id = ?",
-                        (subject_code, project_id),
-                    ).fetchone()
-                    subject_cache[subj_key] = int(row["id"])
-                subject_id = subject_cache[subj_key]
-
-                # treatment course (unique per subject + treatment)
-                course_key = (subject_id, treatment)
-                if course_key not in course_cache:
-                    conn.execute(
-                        """
-                        INSERT OR IGNORE INTO treatment_courses(subject_id, treatment, response)
-                        VALUES (?, ?, ?)
-                        """,
-                        (subject_id, treatment, response),
-                    )
-                    row = conn.execute(
-                        "SELECT id FROM treatment_courses WHERE subject_id = ? AND treatment = ?",
-                        (subject_id, treatment),
-                    ).fetchone()
-                    course_cache[course_key] = int(row["id"])
-                course_id = course_cache[course_key]
-
-                # samples
-                if sample_code not in sample_cache:
-                    conn.execute(
-                        """
-                        INSERT OR IGNORE INTO samples(sample_code, subject_id, treatment_course_id, sample_type, time_from_treatment_start)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (sample_code, subject_id, course_id, sample_type, time0),
-                    )
-                    row = conn.execute(
-                        "SELECT id FROM samples WHERE sample_code = ?",
-                        (sample_code,),
-                    ).fetchone()
-                    sample_cache[sample_code] = int(row["id"])
-                sample_id = sample_cache[sample_code]
-
-                # counts (long format)
-                for pop in POPULATION_COLUMNS:
-                    cnt = int(float(r[pop]))
-                    conn.execute(
-                        """
-                        INSERT OR REPLACE INTO cell_counts(sample_id, population_id, count)
-                        VALUES (?, ?, ?)
-                        """,
-                        (sample_id, pop_name_to_id[pop], cnt),
-                    )
+        init_schema(conn, create_indexes=not bulk, storage=storage)
+
+        # The file manifest is only consulted by incremental loads.
+        file_hash = _file_sha256(csv_path) if incremental else None
+        if file_hash is not None and _file_already_ingested(conn, file_hash):
+            stats.skipped_file = True
+            return stats
+
+        with _open_input(csv_path, populations, batch_size) as (reader, columns):
 
+            if bulk:
+                stats.rows = _load_bulk(conn, reader, batch_size, columns)
+                refresh_sample_frequencies(conn)
+                refresh_cohort_cube(conn)
+                init_indexes(conn)
+            elif incremental:
+                stats.rows, snapshot_ids = _load_incremental(conn, reader, batch_size, columns, stats)
+            else:
+                stats.rows = _load_rows(conn, reader, columns)
+                refresh_sample_frequencies(conn)
+                refresh_cohort_cube(conn)
+
+            if file_hash is not None:
+                _record_ingested_file(conn, csv_path, file_hash, stats.rows)
+            bump_data_version(conn)
             conn.commit()
 
+        if snapshot and snapshot_ids is not None:
+            update_snapshot(conn, snapshot_path(db_path), snapshot_ids)
+        elif snapshot:
+            write_snapshot(conn, snapshot_path(db_path))
+
     except Exception:
         conn.rollback()
         raise
     finally:
         conn.close()
 
+    return stats
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Initialize schema and load cell-count CSV into SQLite.")
-    parser.add_argument("--csv", required=True, help="Path to cell-count.csv")
+    parser.add_argument("--csv", required=True, help="Path to cell-count.csv (or a .parquet/.arrow file)")
     parser.add_argument("--db", required=True, help="Path to SQLite db file (e.g., backend/data/app.db)")
     parser.add_argument("--replace", action="store_true", help="Delete existing DB file and rebuild")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--bulk", action="store_true", help="Batched executemany load with deferred index creation")
+    mode.add_argument("--incremental", action="store_true", help="Only write new or changed samples")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per batch in --bulk/--incremental mode")
+    parser.add_argument("--no-snapshot", action="store_true", help="Do not write the columnar snapshot next to the DB")
+    parser.add_argument(
+        "--populations-config",
+        help="JSON list of population columns (default: every numeric non-metadata column)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Create the DB with the compact storage layout (dictionary codes, WITHOUT ROWID fact tables)",
+    )
     args = parser.parse_args()
 
-    load_csv_to_db(csv_path=args.csv, db_path=args.db, replace_db=args.replace)
+    started = time.perf_counter()
+    stats = load_csv_to_db(
+        csv_path=args.csv,
+        db_path=args.db,
+        replace_db=args.replace,
+        bulk=args.bulk,
+        batch_size=args.batch_size,
+        incremental=args.incremental,
+        snapshot=not args.no_snapshot,
+        populations=load_population_config(args.populations_config) if args.populations_config else None,
+        storage="compact" if args.compact else None,
+    )
+    elapsed = time.perf_counter() - started
+
+    if stats.skipped_file:
+        print(f"Skipped {args.csv}: already ingested into {args.db}")
+        return
+
     print(f"Loaded {args.csv} -> {args.db}")
+    print(f"{stats.rows} rows in {elapsed:.2f}s ({stats.rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    if args.incremental:
+        print(
+            f"samples: {stats.new_samples} new, {stats.changed_samples} changed, "
+            f"{stats.unchanged_samples} unchanged; {stats.updated_counts} cell counts updated"
+        )
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,14 +1,315 @@
+import asyncio
+import base64
+import csv
+import io
+import json
 import os
-from fastapi import FastAPI
+import itertools
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, suppress
+from typing import Literal
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+import numpy as np
 import sqlite3
 from pathlib import Path
-from collections import defaultdict
-from statistics import median
-from scipy.stats import mannwhitneyu
 
-app = FastAPI(title="Cell Counts Dashboard API", version="1.0.0")
-DB_PATH = str(Path(__file__).resolve().parents[1] / "data" / "app.db")
+from . import arrow_io
+from .cache import ResultCache, make_etag, normalize_params
+from .concurrency import CPU_WORKERS, DB_WORKERS, EndpointLimit, db_executor, iterate_in, run_cpu, run_in
+from .concurrency import shutdown as shutdown_executors
+from .cohort import CohortFilter, Values, cohort_cte
+from .compression import CompressionMiddleware
+from .cube import CUBE_DIMENSIONS, cube_available, cube_rollup
+from .db import ConnectionPool, file_identity, get_data_version, nocase
+from .metrics import TASK_LATENCY, TimingMiddleware, render_prometheus
+from .profiling import ProfilingConnection
+from .responses import FastJSONResponse, RowFormat, shape_rows
+from .snapshot import Snapshot, load_snapshot, snapshot_path
+from .stats import (
+    ResampleMethod,
+    ResponseMatrix,
+    attach_global_qvalues,
+    boxplot_summary,
+    compare_responders,
+    compare_responders_many,
+    pivot_percentages,
+    resample_chunk,
+    resample_plan,
+    summarize_resamples,
+)
+from .warmup import DEFAULT_WARMUP_URLS, WarmupState, preload_paths, run_warmup
+
+# The database to serve. Point it at a published release
+# (data/releases/current/app.db, see app.releases) to follow new releases.
+DB_PATH = os.path.abspath(os.getenv("DB_PATH", str(Path(__file__).resolve().parents[1] / "data" / "app.db")))
+
+# Read-only connection pool, opened once per process.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", str(64 * 1024)))
+# SQL_PROFILE=1 opens pooled connections with app.profiling.ProfilingConnection
+# (per-statement timings on /metrics, slow-query logging).
+SQL_PROFILE = os.getenv("SQL_PROFILE", "0") == "1"
+# DB_IMMUTABLE=1 opens the DB with immutable=1 (no locking or change checks);
+# only for files that are never written in place, i.e. published releases.
+DB_IMMUTABLE = os.getenv("DB_IMMUTABLE", "0") == "1"
+# Seconds between checks of where DB_PATH resolves; when it points at a new
+# file (the release symlink moved, or the database was rebuilt with
+# --replace) the pool is reopened there. 0 disables.
+DB_RELOAD_INTERVAL = float(os.getenv("DB_RELOAD_INTERVAL", "2"))
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+_pool_checked_at = 0.0
+
+# Memory-mapped columnar snapshot written by the loader (app.snapshot);
+# used only while its data_version matches the DB. USE_SNAPSHOT=0 forces SQL.
+USE_SNAPSHOT = os.getenv("USE_SNAPSHOT", "1") != "0"
+
+# A loader commits before it writes the snapshot; while the snapshot on disk
+# is older than the DB it is re-read at most once per this many seconds.
+SNAPSHOT_RETRY_INTERVAL = float(os.getenv("SNAPSHOT_RETRY_INTERVAL", "1"))
+
+_snapshot: Snapshot | None = None
+_snapshot_version: int | None = None
+_snapshot_retry_at = 0.0
+_snapshot_db_path: str | None = None
+_snapshot_lock = threading.Lock()
+
+# Pre-aggregated cohort counts (app.cube) answer part4 summaries when the DB
+# has them; USE_CUBE=0 forces the join over the sample tables.
+USE_CUBE = os.getenv("USE_CUBE", "1") != "0"
+
+# Caps on concurrently running requests per endpoint class; excess requests
+# wait on the event loop. Health endpoints are never limited.
+LIMITS = {
+    "light": EndpointLimit("light", int(os.getenv("LIGHT_CONCURRENCY", "16"))),
+    "query": EndpointLimit("query", int(os.getenv("QUERY_CONCURRENCY", "2"))),
+    "stats": EndpointLimit("stats", int(os.getenv("STATS_CONCURRENCY", "2"))),
+}
+
+# Background warmup after startup (app.warmup): WARMUP=0 disables it,
+# WARMUP_PRELOAD=0 skips reading the DB/snapshot files into the page cache,
+# and WARMUP_URLS (comma-separated paths) replaces the default-cohort requests.
+WARMUP = os.getenv("WARMUP", "1") != "0"
+WARMUP_PRELOAD = os.getenv("WARMUP_PRELOAD", "1") != "0"
+WARMUP_URLS = [
+    u.strip() for u in os.getenv("WARMUP_URLS", ",".join(DEFAULT_WARMUP_URLS)).split(",") if u.strip()
+]
+
+warmup_state = WarmupState()
+
+# Results of the analytics endpoints, keyed by normalized params + data_version.
+result_cache = ResultCache(
+    maxsize=int(os.getenv("RESULT_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "300")),
+)
+
+
+def _pool_stale(pool: ConnectionPool, path: str) -> bool:
+    """
+    Whether path (DB_PATH resolved) is another file than the one pool has
+    open: a new release, or a database rebuilt in place. While a rebuild
+    has removed the file, the pool is kept.
+    """
+    file_id = file_identity(path)
+    if file_id is None:
+        return False
+    return path != os.path.realpath(pool.db_path) or file_id != pool.file_id
+
+
+def _db_moved(pool: ConnectionPool) -> bool:
+    """
+    Whether DB_PATH now resolves to a different file than pool's, checked
+    at most once per DB_RELOAD_INTERVAL.
+    """
+    global _pool_checked_at
+    if DB_RELOAD_INTERVAL <= 0:
+        return False
+    now = time.monotonic()
+    if now - _pool_checked_at < DB_RELOAD_INTERVAL:
+        return False
+    _pool_checked_at = now
+    return _pool_stale(pool, os.path.realpath(DB_PATH))
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide pool, opening it on first use.
+
+    When DB_PATH starts resolving to another file (a new release was
+    published, or load_db --replace rebuilt the database), a pool on the
+    new file replaces it. The old pool is
+    dropped, not closed: requests holding its connections finish on the
+    old release, and its connections close once nothing references it.
+    The snapshot is dropped along with it and re-read from the new file.
+    """
+    global _pool, _snapshot, _snapshot_version, _snapshot_db_path
+    pool = _pool
+    if pool is None or _db_moved(pool):
+        with _pool_lock:
+            path = os.path.realpath(DB_PATH)
+            if _pool is None or _pool_stale(_pool, path):
+                replacing = _pool is not None
+                _pool = ConnectionPool(
+                    path,
+                    size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    mmap_size=DB_MMAP_SIZE,
+                    cache_size_kib=DB_CACHE_SIZE_KIB,
+                    factory=ProfilingConnection if SQL_PROFILE else sqlite3.Connection,
+                    immutable=DB_IMMUTABLE,
+                )
+                with _snapshot_lock:
+                    _snapshot, _snapshot_version, _snapshot_db_path = None, None, path
+                if replacing:
+                    # Every key carries the old release's data_version; free them.
+                    result_cache.clear()
+            pool = _pool
+    return pool
+
+
+def get_snapshot(conn: sqlite3.Connection) -> Snapshot | None:
+    """
+    Return the snapshot matching the DB's current data_version, or None
+    when it is disabled, missing or stale. The directory next to the
+    pool's database file is re-read when the data_version changes, and
+    then every SNAPSHOT_RETRY_INTERVAL seconds until it matches.
+    """
+    global _snapshot, _snapshot_version, _snapshot_retry_at
+    if not USE_SNAPSHOT:
+        return None
+    version = get_data_version(conn)
+    snap = _snapshot
+    if snap is not None and snap.data_version == version:
+        return snap
+    if _snapshot_version == version and time.monotonic() < _snapshot_retry_at:
+        return None
+    get_pool()  # sets _snapshot_db_path
+    with _snapshot_lock:
+        if not (_snapshot_version == version and time.monotonic() < _snapshot_retry_at):
+            _snapshot = load_snapshot(_snapshot_db_path)
+            _snapshot_version = version
+            _snapshot_retry_at = time.monotonic() + SNAPSHOT_RETRY_INTERVAL
+        snap = _snapshot
+    if snap is None or snap.data_version != version:
+        return None
+    return snap
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Run fn(conn, *args, **kwargs) on the DB executor with a pooled
+    connection checked out for the duration of the call. The awaited time
+    is recorded per function in TASK_LATENCY.
+    """
+    def call():
+        with get_pool().connection() as conn:
+            return fn(conn, *args, **kwargs)
+
+    started = time.perf_counter()
+    try:
+        return await run_in(db_executor(), call)
+    finally:
+        TASK_LATENCY.observe(time.perf_counter() - started, "db", fn.__name__)
+
+
+_NOT_MODIFIED = object()
+
+
+async def cached_result(
+    request: Request,
+    name: str,
+    params: dict,
+    load,
+    compute=None,
+    format: RowFormat = "json",
+    finalize=None,
+) -> Response:
+    """
+    Serve an endpoint result from result_cache, computing it on a miss.
+
+    load(conn) runs on the DB executor in the same connection checkout as
+    the data_version lookup; compute(loaded), if given, is awaited on the
+    event loop and should hand CPU work to run_cpu. format="columns"
+    caches the row list as parallel arrays under its own key. finalize,
+    if given, maps the cached value to this request's content.
+
+    The result is rendered with FastJSONResponse directly, bypassing
+    FastAPI's jsonable_encoder.
+
+    The ETag is derived from the cache key (endpoint, normalized params,
+    data_version), so a matching If-None-Match gets a 304 without touching
+    the cache or recomputing anything.
+    """
+    if_none_match = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+
+    if format != "json":
+        params = dict(params, format=format)
+
+    def lookup(conn: sqlite3.Connection):
+        key = (name, normalize_params(params), get_data_version(conn))
+        if make_etag(key) in if_none_match:
+            return key, True, _NOT_MODIFIED
+        hit, value = result_cache.get(key)
+        return key, hit, value if hit else load(conn)
+
+    # Label executor metrics with the endpoint rather than "lookup".
+    lookup.__name__ = name
+
+    key, hit, value = await run_db(lookup)
+    headers = {"ETag": make_etag(key), "Cache-Control": "no-cache"}
+    if value is _NOT_MODIFIED:
+        return Response(status_code=304, headers=headers)
+
+    if not hit:
+        if compute is not None:
+            value = await compute(value)
+        value = shape_rows(value, format)
+        result_cache.set(key, value)
+    return FastJSONResponse(finalize(value) if finalize else value, headers=headers)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _pool
+    with get_pool().connection() as conn:
+        get_snapshot(conn)
+
+    warmup = None
+    if WARMUP:
+        warmup_state.reset()
+        db_path = get_pool().db_path
+        preload = preload_paths(db_path, snapshot_path(db_path)) if WARMUP_PRELOAD else []
+        warmup = asyncio.create_task(run_warmup(app, warmup_state, preload=preload, urls=WARMUP_URLS))
+    else:
+        warmup_state.reset("disabled")
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+        with suppress(asyncio.CancelledError):
+            await warmup
+    shutdown_executors()
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+app = FastAPI(
+    title="Cell Counts Dashboard API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
+# Compress bodies of at least COMPRESS_MIN_BYTES (Brotli if installed, else gzip).
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_BYTES", "1024")))
 
 # CORS
 cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
@@ -20,302 +321,820 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Outermost, so latency includes compression and CORS handling.
+app.add_middleware(TimingMiddleware)
+
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Cell Counts Dashboard API. See /api/v1/health"}
 
 @app.get("/api/v1/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+@app.get("/api/v1/health/ready")
+async def health_ready():
+    """
+    Readiness: 200 once the startup warmup has finished, with or without
+    errors (or when it is disabled), 503 while it is still running. The
+    body reports per-step timings and any warmup errors.
+    """
+    state = warmup_state.stats()
+    return FastJSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/api/v1/health/db")
+async def health_db():
+    """
+    The database file this process serves (after resolving DB_PATH), its
+    data_version and whether a matching snapshot is in use.
+    """
+    def describe(conn: sqlite3.Connection) -> dict:
+        return {
+            "db_path": DB_PATH,
+            "resolved_path": get_pool().db_path,
+            "immutable": DB_IMMUTABLE,
+            "data_version": get_data_version(conn),
+            "snapshot": get_snapshot(conn) is not None,
+        }
+
+    return await run_db(describe)
+
+@app.get("/api/v1/health/pool")
+async def health_pool():
+    """
+    Connection pool checkout/wait metrics.
+    """
+    return get_pool().stats()
+
+@app.get("/api/v1/health/cache")
+async def health_cache():
+    """
+    Result cache hit/miss counters.
+    """
+    return result_cache.stats()
+
+@app.get("/api/v1/health/concurrency")
+async def health_concurrency():
+    """
+    Executor sizes and running/waiting requests per endpoint class.
+    """
+    return {
+        "db_workers": DB_WORKERS,
+        "stats_processes": CPU_WORKERS,
+        "limits": {name: limit.stats() for name, limit in LIMITS.items()},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text exposition: request latency per route, executor task
+    latency per function, per-statement SQL metrics (SQL_PROFILE=1) and
+    gauges for the connection pool, result cache and concurrency limits.
+    """
+    pool = get_pool().stats()
+    cache = result_cache.stats()
+    limits = {name: limit.stats() for name, limit in LIMITS.items()}
+    extra = {
+        "db_pool_connections": (
+            "gauge", "Pooled SQLite connections by state.",
+            [((("state", "in_use"),), pool["in_use"]), ((("state", "idle"),), pool["size"] - pool["in_use"])],
+        ),
+        "db_pool_checkouts_total": ("counter", "Connection checkouts.", [((), pool["checkouts"])]),
+        "db_pool_wait_seconds_total": (
+            "counter", "Time spent waiting for a pooled connection.", [((), pool["wait_seconds_total"])],
+        ),
+        "result_cache_entries": ("gauge", "Entries in the result cache.", [((), cache["size"])]),
+        "result_cache_requests_total": (
+            "counter", "Result cache lookups by outcome.",
+            [((("outcome", "hit"),), cache["hits"]), ((("outcome", "miss"),), cache["misses"])],
+        ),
+        "endpoint_requests": (
+            "gauge", "Requests per endpoint class by state.",
+            [
+                ((("class", name), ("state", state)), stats[state])
+                for name, stats in limits.items()
+                for state in ("running", "waiting")
+            ],
+        ),
+    }
+    return PlainTextResponse(
+        render_prometheus(extra), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+FREQUENCY_COLUMNS = ["sample", "total_count", "population", "count", "percentage"]
+STREAM_FETCH_SIZE = 1000
+
+
+def _encode_cursor(sample: str, population: str) -> str:
+    raw = json.dumps([sample, population]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sample, population = json.loads(base64.urlsafe_b64decode(padded))
+        return str(sample), str(population)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+
+
+def _frequency_query(cursor: str | None, limit: int | None) -> tuple[str, dict]:
+    """
+    Keyset-paginated frequency query ordered by (sample, population).
+    CROSS JOIN pins samples as the outer loop so rows come out in
+    sample_code index order and a page stops after `limit` rows.
+    """
+    where = ""
+    params: dict = {}
+    if cursor:
+        params["after_sample"], params["after_population"] = _decode_cursor(cursor)
+        # Split form of (sample, population) > (:a, :b) so the range seek
+        # can use the unique index on samples.sample_code.
+        where = """
+    WHERE s.sample_code >= :after_sample
+      AND (s.sample_code > :after_sample OR p.name > :after_population)"""
+
+    query = f"""
+    SELECT
+        s.sample_code AS sample,
+        sf.total_count AS total_count,
+        p.name AS population,
+        sf.count AS count,
+        ROUND(sf.percentage, 2) AS percentage
+    FROM samples s
+    CROSS JOIN sample_frequencies sf ON sf.sample_id = s.id
+    JOIN populations p ON p.id = sf.population_id{where}
+    ORDER BY sample, population
+    """
+    if limit is not None:
+        query += "LIMIT :limit"
+        params["limit"] = limit
+    return query, params
+
+
+def _stream_frequency(query: str, params: dict, fmt: str):
+    """
+    Yield NDJSON lines or CSV chunks straight from the cursor, holding one
+    pooled connection until the stream is exhausted or closed.
+    """
+    with get_pool().connection() as conn:
+        cur = conn.execute(query, params)
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(FREQUENCY_COLUMNS)
+            yield buf.getvalue()
+        while True:
+            rows = cur.fetchmany(STREAM_FETCH_SIZE)
+            if not rows:
+                break
+            if fmt == "csv":
+                buf.seek(0)
+                buf.truncate()
+                writer.writerows(tuple(r) for r in rows)
+                yield buf.getvalue()
+            else:
+                yield "".join(json.dumps(dict(r)) + "\n" for r in rows)
+
+
+async def _limited_stream(limit: EndpointLimit, chunks):
+    """
+    Hold a slot of limit while a streaming body is being sent.
+    """
+    async with limit.slot():
+        async for chunk in chunks:
+            yield chunk
+
+
+def _fetch_all(conn: sqlite3.Connection, query: str, params: dict) -> list:
+    return conn.execute(query, params).fetchall()
+
+
 @app.get("/api/v1/frequency")
-def frequency(limit: int = 200):
+async def frequency(
+    limit: int | None = None,
+    cursor: str | None = None,
+    format: Literal["json", "columns", "ndjson", "csv"] = "json",
+):
     """
     Part 2: Frequency of each cell population per sample.
 
     Returns rows with:
       sample, total_count, population, count, percentage
+
+    Rows are ordered by (sample, population). Pass the X-Next-Cursor
+    response header back as ?cursor= to fetch the next page.
+    format=ndjson|csv streams all remaining rows (or up to limit) with
+    constant memory; format=json|columns defaults to limit=200, and
+    columns returns {column: [values]} instead of a list of rows.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    if format in ("ndjson", "csv"):
+        query, params = _frequency_query(cursor, limit)
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        chunks = iterate_in(db_executor(), _stream_frequency(query, params, format))
+        return StreamingResponse(_limited_stream(LIMITS["query"], chunks), media_type=media_type)
 
-    query = """
-    WITH totals AS (
-        SELECT
-            s.id AS sample_id,
-            s.sample_code AS sample,
-            SUM(cc.count) AS total_count
-        FROM samples s
-        JOIN cell_counts cc ON cc.sample_id = s.id
-        GROUP BY s.id, s.sample_code
-    ),
-    freqs AS (
-        SELECT
-            t.sample AS sample,
-            t.total_count AS total_count,
-            p.name AS population,
-            cc.count AS count,
-            ROUND(100.0 * cc.count / t.total_count, 2) AS percentage
-        FROM totals t
-        JOIN cell_counts cc ON cc.sample_id = t.sample_id
-        JOIN populations p ON p.id = cc.population_id
-    )
-    SELECT *
-    FROM freqs
-    ORDER BY sample, population
-    LIMIT ?;
+    limit = 200 if limit is None else limit
+    query, params = _frequency_query(cursor, limit)
+    async with LIMITS["query"].slot():
+        rows = await run_db(_fetch_all, query, params)
+
+    headers = {}
+    if rows and len(rows) == limit:
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1]["sample"], rows[-1]["population"])
+    return FastJSONResponse(shape_rows([dict(r) for r in rows], format), headers=headers)
+
+# (column, arrow type) of /export rows: sample metadata then its frequencies.
+EXPORT_COLUMNS = [
+    ("sample", "string"),
+    ("project", "string"),
+    ("subject", "string"),
+    ("condition", "string"),
+    ("age", "int"),
+    ("sex", "string"),
+    ("treatment", "string"),
+    ("response", "string"),
+    ("sample_type", "string"),
+    ("time", "int"),
+    ("total_count", "int"),
+    ("population", "string"),
+    ("count", "int"),
+    ("percentage", "float"),
+]
+# Rows per record batch / Parquet row group.
+EXPORT_BATCH_ROWS = 65_536
+
+
+def _export_query(cohort: CohortFilter) -> tuple[str, dict]:
+    """
+    Cohort frequency rows without a global sort, so the first batch is
+    ready as soon as the first samples are read. CROSS JOIN keeps the
+    cohort as the outer loop: each sample's populations are contiguous.
     """
+    cte, params = cohort_cte(cohort)
+    sample_columns = ", ".join(f"c.{name}" for name, _ in EXPORT_COLUMNS[:10])
+    query = f"""
+    {cte}
+    SELECT {sample_columns}, sf.total_count, p.name AS population, sf.count, sf.percentage
+    FROM cohort c
+    CROSS JOIN sample_frequencies sf ON sf.sample_id = c.sample_id
+    JOIN populations p ON p.id = sf.population_id
+    """
+    return query, params
 
-    rows = cur.execute(query, (limit,)).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+
+def _stream_export(query: str, params: dict, fmt: str):
+    """
+    Yield the encoded export batch by batch, holding one pooled
+    connection until the stream is exhausted or closed.
+    """
+    writer = arrow_io.ExportWriter(fmt, EXPORT_COLUMNS)
+    with get_pool().connection() as conn:
+        cur = conn.execute(query, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            yield writer.write(rows)
+    yield writer.finish()
+
+
+def _values(values: list | None) -> tuple | None:
+    return tuple(values) if values else None
+
+
+@app.get("/api/v1/export")
+async def export(
+    format: Literal["arrow", "parquet"] = "arrow",
+    project: list[str] | None = Query(None),
+    condition: list[str] | None = Query(None),
+    sex: list[str] | None = Query(None),
+    age_min: int | None = None,
+    age_max: int | None = None,
+    treatment: list[str] | None = Query(None),
+    response: list[str] | None = Query(None),
+    sample_type: list[str] | None = Query(None),
+    timepoint: list[int] | None = Query(None),
+):
+    """
+    Frequency table of any cohort (every filter optional and repeatable)
+    as an Arrow IPC stream or a Parquet file, encoded and streamed in
+    batches of EXPORT_BATCH_ROWS rows with constant memory.
+
+    One row per (sample, population) with the sample's metadata and
+    total_count, count and unrounded percentage; rows are grouped by
+    sample, in no particular sample order.
+    Needs the optional pyarrow package (501 without it).
+    """
+    if not arrow_io.available():
+        raise HTTPException(status_code=501, detail="Export needs the optional pyarrow package")
+
+    cohort = CohortFilter(
+        project=_values(project), condition=_values(condition), sex=_values(sex),
+        age_min=age_min, age_max=age_max, treatment=_values(treatment), response=_values(response),
+        sample_type=_values(sample_type), timepoints=_values(timepoint),
+    )
+    query, params = _export_query(cohort)
+    media_type, suffix = arrow_io.EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="frequency{suffix}"'}
+    if format == "parquet":
+        # Parquet pages are already compressed; skip the compression middleware.
+        headers["Content-Encoding"] = "identity"
+    chunks = iterate_in(db_executor(), _stream_export(query, params, format))
+    return StreamingResponse(_limited_stream(LIMITS["query"], chunks), media_type=media_type, headers=headers)
 
 @app.get("/api/v1/meta/filters")
-def meta_filters():
+async def meta_filters(request: Request):
     """
     Returns distinct filter values present in the DB so the frontend can build dropdowns.
     """
-    import sqlite3
-    from .db import get_connection
+    async with LIMITS["light"].slot():
+        return await cached_result(request, "meta_filters", {}, _meta_filters)
 
-    conn = get_connection(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        def distinct_list(sql: str, params: dict | None = None) -> list[str]:
-            rows = conn.execute(sql, params or {}).fetchall()
-            vals = []
-            for r in rows:
-                v = r["v"]
-                if v is None:
-                    continue
-                v = str(v).strip()
-                if v == "":
-                    continue
-                vals.append(v)
-            return vals
-
-        conditions = distinct_list("""
-            SELECT DISTINCT condition AS v
-            FROM subjects
-            WHERE condition IS NOT NULL AND TRIM(condition) != ''
-            ORDER BY LOWER(condition)
-        """)
-
-        treatments = distinct_list("""
-            SELECT DISTINCT treatment AS v
-            FROM treatment_courses
-            WHERE treatment IS NOT NULL AND TRIM(treatment) != ''
-            ORDER BY LOWER(treatment)
-        """)
-
-        sample_types = distinct_list("""
-            SELECT DISTINCT sample_type AS v
-            FROM samples
-            WHERE sample_type IS NOT NULL AND TRIM(sample_type) != ''
-            ORDER BY LOWER(sample_type)
-        """)
-
-        timepoints = conn.execute("""
-            SELECT DISTINCT time_from_treatment_start AS v
-            FROM samples
-            WHERE time_from_treatment_start IS NOT NULL
-            ORDER BY time_from_treatment_start
-        """).fetchall()
-        time_from_treatment_start = [int(r["v"]) for r in timepoints]
-
-        responses = distinct_list("""
-            SELECT DISTINCT response AS v
-            FROM treatment_courses
-            WHERE response IN ('yes','no')
-            ORDER BY response
-        """)
-
-        sexes = distinct_list("""
-            SELECT DISTINCT sex AS v
-            FROM subjects
-            WHERE sex IS NOT NULL AND TRIM(sex) != ''
-            ORDER BY sex
-        """)
 
-        return {
-            "conditions": conditions,
-            "treatments": treatments,
-            "sample_types": sample_types,
-            "time_from_treatment_start": time_from_treatment_start,
-            "responses": responses,
-            "sexes": sexes,
-        }
-    finally:
-        conn.close()
+def _meta_filters(conn: sqlite3.Connection) -> dict:
+    def distinct_list(sql: str, params: dict | None = None) -> list[str]:
+        rows = conn.execute(sql, params or {}).fetchall()
+        vals = []
+        for r in rows:
+            v = r["v"]
+            if v is None:
+                continue
+            v = str(v).strip()
+            if v == "":
+                continue
+            vals.append(v)
+        return vals
+
+    conditions = distinct_list("""
+        SELECT DISTINCT condition AS v
+        FROM subjects
+        WHERE condition IS NOT NULL AND TRIM(condition) != ''
+        ORDER BY condition COLLATE NOCASE
+    """)
+
+    treatments = distinct_list("""
+        SELECT DISTINCT treatment AS v
+        FROM treatment_courses
+        WHERE treatment IS NOT NULL AND TRIM(treatment) != ''
+        ORDER BY treatment COLLATE NOCASE
+    """)
+
+    sample_types = distinct_list("""
+        SELECT DISTINCT sample_type AS v
+        FROM samples
+        WHERE sample_type IS NOT NULL AND TRIM(sample_type) != ''
+        ORDER BY sample_type COLLATE NOCASE
+    """)
+
+    timepoints = conn.execute("""
+        SELECT DISTINCT time_from_treatment_start AS v
+        FROM samples
+        WHERE time_from_treatment_start IS NOT NULL
+        ORDER BY time_from_treatment_start
+    """).fetchall()
+    time_from_treatment_start = [int(r["v"]) for r in timepoints]
+
+    responses = distinct_list("""
+        SELECT DISTINCT response AS v
+        FROM treatment_courses
+        WHERE response IN ('yes','no')
+        ORDER BY response
+    """)
+
+    sexes = distinct_list("""
+        SELECT DISTINCT sex AS v
+        FROM subjects
+        WHERE sex IS NOT NULL AND TRIM(sex) != ''
+        ORDER BY sex
+    """)
+
+    return {
+        "conditions": conditions,
+        "treatments": treatments,
+        "sample_types": sample_types,
+        "time_from_treatment_start": time_from_treatment_start,
+        "responses": responses,
+        "sexes": sexes,
+    }
 
 @app.get("/api/v1/part3/frequencies")
-def part3_frequencies(
+async def part3_frequencies(
+    request: Request,
     condition: str = "melanoma",
     treatment: str = "miraclib",
     sample_type: str = "PBMC",
+    format: RowFormat = "json",
 ):
     """
     Part 3:
     Relative frequencies (%) per sample and population for
     condition+treatment+sample_type samples, split by response (yes/no).
+    format=columns returns {column: [values]} instead of a list of rows.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    params = {"condition": condition, "treatment": treatment, "sample_type": sample_type}
+    async with LIMITS["query"].slot():
+        return await cached_result(
+            request, "part3_frequencies", params,
+            lambda conn: _part3_frequencies(conn, **params),
+            format=format,
+        )
 
-    query = """
-    WITH filtered_samples AS (
-        SELECT
-            s.id AS sample_id,
-            s.sample_code AS sample,
-            tc.response AS response
-        FROM samples s
-        JOIN subjects subj ON subj.id = s.subject_id
-        JOIN treatment_courses tc ON tc.id = s.treatment_course_id
-        WHERE
-            LOWER(subj.condition) = LOWER(:condition)
-            AND LOWER(tc.treatment) = LOWER(:treatment)
-            AND LOWER(s.sample_type) = LOWER(:sample_type)
-            AND tc.response IN ('yes', 'no')
-    ),
-    totals AS (
-        SELECT
-            fs.sample_id,
-            SUM(cc.count) AS total_count
-        FROM filtered_samples fs
-        JOIN cell_counts cc ON cc.sample_id = fs.sample_id
-        GROUP BY fs.sample_id
-    ),
-    freqs AS (
-        SELECT
-            fs.sample AS sample,
-            fs.response AS response,
-            p.name AS population,
-            ROUND(100.0 * cc.count / t.total_count, 2) AS percentage
-        FROM filtered_samples fs
-        JOIN totals t ON t.sample_id = fs.sample_id
-        JOIN cell_counts cc ON cc.sample_id = fs.sample_id
-        JOIN populations p ON p.id = cc.population_id
-    )
-    SELECT *
-    FROM freqs
+
+def _part3_cohort(condition: Values, treatment: Values, sample_type: Values) -> CohortFilter:
+    return CohortFilter(condition=condition, treatment=treatment, sample_type=sample_type, response=("yes", "no"))
+
+
+def _part3_frequencies(conn: sqlite3.Connection, condition: str, treatment: str, sample_type: str) -> list[dict]:
+    cohort = _part3_cohort(condition, treatment, sample_type)
+    snap = get_snapshot(conn)
+    if snap is not None:
+        return _part3_frequencies_snapshot(snap, cohort)
+
+    cte, params = cohort_cte(cohort)
+    query = f"""
+    {cte}
+    SELECT
+        c.sample AS sample,
+        c.response AS response,
+        p.name AS population,
+        ROUND(sf.percentage, 2) AS percentage
+    FROM cohort c
+    JOIN sample_frequencies sf ON sf.sample_id = c.sample_id
+    JOIN populations p ON p.id = sf.population_id
     ORDER BY population, response, sample;
     """
 
-    params = {
-        "condition": condition.strip(),
-        "treatment": treatment.strip(),
-        "sample_type": sample_type.strip(),
-    }
-
-    rows = cur.execute(query, params).fetchall()
-    conn.close()
+    rows = conn.execute(query, params).fetchall()
     return [dict(r) for r in rows]
 
+
+def _part3_frequencies_snapshot(snap: Snapshot, cohort: CohortFilter) -> list[dict]:
+    mask = snap.mask(cohort)
+    counts = snap.arrays["counts"][mask]
+    pct = np.round(snap.percentages(mask), 2)
+    samples = snap.arrays["sample_codes"][mask].tolist()
+    responses = ["yes" if r == 1 else "no" for r in snap.arrays["response"][mask]]
+
+    rows = [
+        {
+            "sample": samples[i],
+            "response": responses[i],
+            "population": population,
+            "percentage": None if np.isnan(pct[i, j]) else float(pct[i, j]),
+        }
+        for j, population in enumerate(snap.populations)
+        for i in np.flatnonzero(counts[:, j] >= 0)
+    ]
+    rows.sort(key=lambda r: (r["population"], r["response"], r["sample"]))
+    return rows
+
+@app.get("/api/v1/part3/boxplot")
+async def part3_boxplot(
+    request: Request,
+    condition: str = "melanoma",
+    treatment: str = "miraclib",
+    sample_type: str = "PBMC",
+    bins: int = Query(0, ge=0, le=100),
+    format: RowFormat = "json",
+):
+    """
+    Part 3:
+    Boxplot-ready summaries of relative frequencies (%) per population and
+    response: n, min/q1/median/q3/max, mean, Tukey whiskers (1.5 IQR) and
+    the most extreme outliers. bins > 0 adds histogram counts over edges
+    shared by both responses. The payload does not grow with cohort size.
+    """
+    cohort = {"condition": condition, "treatment": treatment, "sample_type": sample_type}
+    params = dict(cohort, bins=bins)
+
+    async def compute(matrix: ResponseMatrix) -> list[dict]:
+        return await run_cpu(boxplot_summary, matrix, bins)
+
+    async with LIMITS["stats"].slot():
+        return await cached_result(
+            request, "part3_boxplot", params,
+            lambda conn: _part3_matrix(conn, **cohort),
+            compute,
+            format,
+        )
+
+# Upper bound on ?n_resamples for permutation/bootstrap statistics.
+MAX_RESAMPLES = int(os.getenv("MAX_RESAMPLES", "100000"))
+
+
 @app.get("/api/v1/part3/stats")
-def part3_stats(
+async def part3_stats(
+    request: Request,
     condition: str = "melanoma",
     treatment: str = "miraclib",
     sample_type: str = "PBMC",
+    method: Literal["mwu", "permutation", "bootstrap"] = "mwu",
+    n_resamples: int = Query(10_000, ge=100, le=MAX_RESAMPLES),
+    seed: int = 0,
+    format: RowFormat = "json",
 ):
     """
     Part 3:
     Statistical comparison (responders vs non-responders)
     of relative frequencies (%) per immune cell population.
+
+    method=mwu (default) reports asymptotic Mann-Whitney U p-values.
+    method=permutation replaces them with two-sided permutation p-values
+    from n_resamples label shuffles; method=bootstrap adds a 95% CI for
+    the median difference. Resampling is reproducible for a given seed.
+    format=columns returns {column: [values]} instead of a list of rows.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    cohort = {"condition": condition, "treatment": treatment, "sample_type": sample_type}
+    params = dict(cohort, method=method)
+    if method != "mwu":
+        params.update(n_resamples=n_resamples, seed=seed)
 
-    query = """
-    WITH filtered_samples AS (
-        SELECT
-            s.id AS sample_id,
-            tc.response AS response
-        FROM samples s
-        JOIN subjects subj ON subj.id = s.subject_id
-        JOIN treatment_courses tc ON tc.id = s.treatment_course_id
-        WHERE
-            LOWER(subj.condition) = LOWER(:condition)
-            AND LOWER(tc.treatment) = LOWER(:treatment)
-            AND LOWER(s.sample_type) = LOWER(:sample_type)
-            AND tc.response IN ('yes', 'no')
-    ),
-    totals AS (
-        SELECT
-            fs.sample_id,
-            SUM(cc.count) AS total_count
-        FROM filtered_samples fs
-        JOIN cell_counts cc ON cc.sample_id = fs.sample_id
-        GROUP BY fs.sample_id
-    )
+    async def compute(matrix: ResponseMatrix) -> list[dict]:
+        if method == "mwu":
+            return await run_cpu(compare_responders, matrix)
+        return await _resampled_stats(matrix, method, n_resamples, seed)
+
+    async with LIMITS["stats"].slot():
+        return await cached_result(
+            request, "part3_stats", params,
+            lambda conn: _part3_matrix(conn, **cohort),
+            compute,
+            format,
+        )
+
+
+async def _resampled_stats(matrix: ResponseMatrix, method: ResampleMethod, n_resamples: int, seed: int) -> list[dict]:
+    """
+    Spread resample chunks over the statistics pool, then combine them.
+    """
+    chunks = await asyncio.gather(*(
+        run_cpu(resample_chunk, matrix, method, size, child_seed)
+        for size, child_seed in resample_plan(n_resamples, seed)
+    ))
+    return await run_cpu(summarize_resamples, matrix, method, chunks, n_resamples)
+
+
+def _part3_matrix(conn: sqlite3.Connection, condition: str, treatment: str, sample_type: str) -> ResponseMatrix:
+    cohort = _part3_cohort(condition, treatment, sample_type)
+    snap = get_snapshot(conn)
+    if snap is not None:
+        return snap.response_matrix(snap.mask(cohort))
+
+    cte, params = cohort_cte(cohort)
+    query = f"""
+    {cte}
     SELECT
-        fs.response AS response,
-        p.name AS population,
-        100.0 * cc.count / t.total_count AS percentage
-    FROM filtered_samples fs
-    JOIN totals t ON t.sample_id = fs.sample_id
-    JOIN cell_counts cc ON cc.sample_id = fs.sample_id
-    JOIN populations p ON p.id = cc.population_id;
+        c.sample_id AS sample_id,
+        c.response AS response,
+        sf.population_id AS population_id,
+        sf.percentage AS percentage
+    FROM cohort c
+    JOIN sample_frequencies sf ON sf.sample_id = c.sample_id;
+    """
+
+    rows = conn.execute(query, params).fetchall()
+    population_names = {r["id"]: r["name"] for r in conn.execute("SELECT id, name FROM populations")}
+    return pivot_percentages(*zip(*rows), population_names=population_names) if rows else ResponseMatrix.empty()
+
+
+class StatsCohort(BaseModel):
+    condition: str
+    treatment: str
+    sample_type: str
+
+
+class BatchStatsRequest(BaseModel):
+    cohorts: list[StatsCohort] = []
+    cross_product: bool = False
+
+
+@app.post("/api/v1/part3/stats/batch")
+async def part3_stats_batch(body: BatchStatsRequest):
     """
+    Part 3 stats for many cohorts in one pass.
 
+    Pass a list of cohorts, or cross_product=true for every
+    condition x treatment x sample_type combination in the DB. Cohorts are
+    masked out of the columnar snapshot, or, without one, fetched with a
+    single query and grouped in memory. Each
+    result carries its per-cohort q_value plus q_value_global, corrected
+    across every test in the response.
+    """
+    if not body.cross_product and not body.cohorts:
+        raise HTTPException(status_code=422, detail="Provide cohorts or set cross_product=true")
+
+    async with LIMITS["stats"].slot():
+        wanted, matrices = await run_db(_batch_matrices, body)
+        tested = [k for k in wanted if k in matrices]
+        results = dict(zip(tested, await run_cpu(compare_responders_many, [matrices[k] for k in tested])))
+
+    out = []
+    for k, cohort in wanted.items():
+        out.append({
+            "condition": cohort.condition,
+            "treatment": cohort.treatment,
+            "sample_type": cohort.sample_type,
+            "n_samples": len(matrices[k].is_yes) if k in matrices else 0,
+            "results": results.get(k, []),
+        })
+
+    n_tests = attach_global_qvalues([c["results"] for c in out])
+    return FastJSONResponse({"n_cohorts": len(out), "n_tests": n_tests, "cohorts": out})
+
+
+def _cohort_key(condition: str, treatment: str, sample_type: str) -> tuple[str, str, str]:
+    return nocase(condition.strip()), nocase(treatment.strip()), nocase(sample_type.strip())
+
+
+def _batch_matrices(conn: sqlite3.Connection, body: BatchStatsRequest) -> tuple[dict, dict]:
+    """
+    Resolve the requested cohorts (unique, in request order) and build a
+    ResponseMatrix for each one that has data.
+    """
+    if body.cross_product:
+        meta = _meta_filters(conn)
+        cohorts = [
+            StatsCohort(condition=c, treatment=t, sample_type=st)
+            for c, t, st in itertools.product(meta["conditions"], meta["treatments"], meta["sample_types"])
+        ]
+    else:
+        cohorts = body.cohorts
+
+    wanted = {_cohort_key(c.condition, c.treatment, c.sample_type): c for c in cohorts}
+
+    snap = get_snapshot(conn)
+    if snap is not None:
+        matrices = {
+            k: snap.response_matrix(snap.mask(_part3_cohort(c.condition, c.treatment, c.sample_type)))
+            for k, c in wanted.items()
+        }
+    else:
+        matrices = _batch_matrices_sql(conn, wanted)
+    return wanted, matrices
+
+
+def _batch_matrices_sql(conn: sqlite3.Connection, wanted: dict) -> dict:
+    """
+    SQL fallback for the batch endpoint: fetch every cohort's rows with a
+    single query and pivot each group.
+    """
+    if not wanted:  # cross_product over a database with no samples
+        return {}
+    # One cohort spanning every requested value; rows are regrouped below.
+    conditions, treatments, sample_types = (tuple(sorted(set(values))) for values in zip(*wanted))
+    cte, params = cohort_cte(_part3_cohort(conditions, treatments, sample_types))
+    query = f"""
+    {cte}
+    SELECT
+        c.condition AS condition,
+        c.treatment AS treatment,
+        c.sample_type AS sample_type,
+        c.sample_id AS sample_id,
+        c.response AS response,
+        sf.population_id AS population_id,
+        sf.percentage AS percentage
+    FROM cohort c
+    JOIN sample_frequencies sf ON sf.sample_id = c.sample_id;
+    """
+    rows = conn.execute(query, params).fetchall()
+
+    grouped = defaultdict(list)
+    for r in rows:
+        grouped[_cohort_key(r["condition"], r["treatment"], r["sample_type"])].append(tuple(r)[3:])
+
+    population_names = {r["id"]: r["name"] for r in conn.execute("SELECT id, name FROM populations")}
+    return {
+        k: pivot_percentages(*zip(*cohort_rows), population_names=population_names)
+        for k, cohort_rows in grouped.items()
+    }
+
+
+@app.get("/api/v1/timecourse")
+async def timecourse(
+    request: Request,
+    condition: str = "melanoma",
+    treatment: str = "miraclib",
+    sample_type: str = "PBMC",
+    include_subjects: bool = False,
+):
+    """
+    Per-population frequency trajectories over time_from_treatment_start,
+    split by response (yes/no).
+
+    Returns:
+      - timepoints: distinct timepoints in the cohort
+      - series: one row per (population, response, time) with n and the
+        median / IQR of percentage and of the delta from each subject's
+        baseline (their earliest sample in the cohort)
+      - subjects (include_subjects=true): the per-sample rows behind it
+    """
     params = {
-        "condition": condition.strip(),
-        "treatment": treatment.strip(),
-        "sample_type": sample_type.strip(),
+        "condition": condition,
+        "treatment": treatment,
+        "sample_type": sample_type,
+        "include_subjects": include_subjects,
     }
+    async with LIMITS["query"].slot():
+        return await cached_result(
+            request, "timecourse", params,
+            lambda conn: _timecourse(conn, **params),
+        )
 
-    rows = cur.execute(query, params).fetchall()
-    conn.close()
 
-    values = defaultdict(lambda: {"yes": [], "no": []})
-    for r in rows:
-        values[r["population"]][r["response"]].append(float(r["percentage"]))
-
-    results = []
-    for pop, grp in values.items():
-        yes_vals = grp["yes"]
-        no_vals = grp["no"]
-
-        stat, pval = mannwhitneyu(yes_vals, no_vals, alternative="two-sided")
-
-        results.append({
-            "population": pop,
-            "n_yes": len(yes_vals),
-            "n_no": len(no_vals),
-            "median_yes": round(median(yes_vals), 3),
-            "median_no": round(median(no_vals), 3),
-            "u_statistic": round(float(stat), 3),
-            "p_value": float(pval),
-            "significant_p_lt_0_05": bool(pval < 0.05),
-        })
+def _timecourse(
+    conn: sqlite3.Connection,
+    condition: str,
+    treatment: str,
+    sample_type: str,
+    include_subjects: bool,
+) -> dict:
+    cohort = _part3_cohort(condition, treatment, sample_type)
+    cte, params = cohort_cte(cohort)
+    # One ordered scan: FIRST_VALUE picks each course's baseline per
+    # population, and rows come out grouped for the NumPy aggregation.
+    query = f"""
+    {cte}
+    SELECT
+        p.name AS population,
+        c.response AS response,
+        c.time AS time,
+        c.project AS project,
+        c.subject AS subject,
+        sf.percentage AS percentage,
+        sf.percentage - FIRST_VALUE(sf.percentage) OVER (
+            PARTITION BY c.course_id, sf.population_id
+            ORDER BY c.time, c.sample_id
+        ) AS delta
+    FROM cohort c
+    JOIN sample_frequencies sf ON sf.sample_id = c.sample_id
+    JOIN populations p ON p.id = sf.population_id
+    ORDER BY p.name, c.response, c.time, c.project, c.subject;
+    """
+    rows = conn.execute(query, params).fetchall()
 
-    results.sort(key=lambda r: r["p_value"])
-    m = len(results)
+    out = {"timepoints": [], "series": []}
+    if include_subjects:
+        out["subjects"] = []
+    if not rows:
+        return out
+
+    population, resp, time, _, _, pct, delta = (np.asarray(col) for col in zip(*rows))
+    pct = pct.astype(float)
+    delta = delta.astype(float)
 
-    # 1) raw BH adjusted p-values
-    raw = [r["p_value"] * m / (i + 1) for i, r in enumerate(results)]
+    # Group boundaries wherever (population, response, time) changes.
+    changed = (population[1:] != population[:-1]) | (resp[1:] != resp[:-1]) | (time[1:] != time[:-1])
+    starts = np.concatenate([[0], np.flatnonzero(changed) + 1])
+    ends = np.append(starts[1:], len(rows))
 
-    # 2) enforce monotonicity the correct way (from the end)
-    qvals = [0.0] * m
-    prev = 1.0
-    for i in range(m - 1, -1, -1):
-        prev = min(prev, raw[i])
-        qvals[i] = prev
+    def summary(values: np.ndarray) -> tuple:
+        if np.isnan(values).all():
+            return None, None, None
+        q1, med, q3 = np.nanpercentile(values, [25, 50, 75])
+        return round(float(q1), 3), round(float(med), 3), round(float(q3), 3)
 
-    # 3) attach q-values
-    for r, q in zip(results, qvals):
-        r["q_value"] = float(q)
-        r["significant_fdr_0_05"] = bool(q < 0.05)
-    return results
+    for a, b in zip(starts, ends):
+        q1, med, q3 = summary(pct[a:b])
+        dq1, dmed, dq3 = summary(delta[a:b])
+        out["series"].append({
+            "population": str(population[a]),
+            "response": str(resp[a]),
+            "time": int(time[a]),
+            "n": int(b - a),
+            "median": med,
+            "q1": q1,
+            "q3": q3,
+            "median_delta": dmed,
+            "q1_delta": dq1,
+            "q3_delta": dq3,
+        })
+
+    out["timepoints"] = np.unique(time).tolist()
+    if include_subjects:
+        out["subjects"] = [
+            {
+                "project": r["project"],
+                "subject": r["subject"],
+                "response": r["response"],
+                "population": r["population"],
+                "time": r["time"],
+                "percentage": None if r["percentage"] is None else round(r["percentage"], 3),
+                "delta": None if r["delta"] is None else round(r["delta"], 3),
+            }
+            for r in rows
+        ]
+    return out
 
 
 @app.get("/api/v1/part4/summary")
-def part4_summary(
+async def part4_summary(
+    request: Request,
     condition: str = "melanoma",
     treatment: str = "miraclib",
     sample_type: str = "PBMC",
@@ -335,107 +1154,182 @@ def part4_summary(
       - subjects by response (yes/no; excludes NULL/empty)
       - subjects by gender (excludes NULL/empty)
     """
-    import sqlite3
-    from .db import get_connection
-
-    conn = get_connection(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        sql = """
-        WITH baseline AS (
-            SELECT
-                sam.id AS sample_id,
-                sam.sample_code AS sample,
-                subj.id AS subject_id,
-                proj.name AS project,
-                tc.response AS response,
-                subj.sex AS sex
-            FROM samples sam
-            JOIN subjects subj ON subj.id = sam.subject_id
-            JOIN projects proj ON proj.id = subj.project_id
-            JOIN treatment_courses tc ON tc.id = sam.treatment_course_id
-            WHERE lower(subj.condition) = lower(:condition)
-              AND sam.sample_type = :sample_type
-              AND sam.time_from_treatment_start = :time0
-              AND lower(tc.treatment) = lower(:treatment)
-        ),
-        totals AS (
-            SELECT
-                COUNT(*) AS n_samples,
-                COUNT(DISTINCT subject_id) AS n_subjects
-            FROM baseline
-        ),
-        counts AS (
-            SELECT
-                'samples_by_project' AS section,
-                project AS key,
-                COUNT(*) AS n
-            FROM baseline
-            GROUP BY project
-
-            UNION ALL
-
-            SELECT
-                'subjects_by_response' AS section,
-                COALESCE(response, 'unknown') AS key,
-                COUNT(DISTINCT subject_id) AS n
-            FROM baseline
-            GROUP BY COALESCE(response, 'unknown')
-
-            UNION ALL
-
-            SELECT
-                'subjects_by_sex' AS section,
-                COALESCE(sex, 'unknown') AS key,
-                COUNT(DISTINCT subject_id) AS n
-            FROM baseline
-            GROUP BY COALESCE(sex, 'unknown')
+    params = {
+        "condition": condition,
+        "treatment": treatment,
+        "sample_type": sample_type,
+        "time0": time0,
+    }
+    async with LIMITS["query"].slot():
+        # Cache entries are shared across case variants; echo this request's filter.
+        return await cached_result(
+            request, "part4_summary", params,
+            lambda conn: _part4_summary(conn, **params),
+            finalize=lambda result: {**result, "filter": params},
         )
+
+
+def _part4_summary(conn: sqlite3.Connection, condition: str, treatment: str, sample_type: str, time0: int) -> dict:
+    cohort = CohortFilter(condition=condition, treatment=treatment, sample_type=sample_type, timepoints=time0)
+    if USE_CUBE and cube_available(conn):
+        return _part4_summary_cube(conn, cohort)
+    return _part4_summary_sql(conn, cohort)
+
+
+def _part4_summary_cube(conn: sqlite3.Connection, cohort: CohortFilter) -> dict:
+    """
+    Same result as _part4_summary_sql, rolled up from cohort_cube rows.
+    Treatment, sample type and timepoint are fixed, so subject counts add
+    up exactly (see app.cube).
+    """
+    rows = cube_rollup(conn, cohort, ("project", "response", "sex"))
+    sections = {"samples_by_project": {}, "subjects_by_response": {}, "subjects_by_sex": {}}
+    for r in rows:
+        by_project = sections["samples_by_project"]
+        by_project[r["project"]] = by_project.get(r["project"], 0) + r["n_samples"]
+        for section, key in (("subjects_by_response", r["response"]), ("subjects_by_sex", r["sex"])):
+            key = key if key is not None else "unknown"
+            sections[section][key] = sections[section].get(key, 0) + r["n_subjects"]
+
+    out = {
+        "filter": _part4_filter(cohort),
+        "totals": {
+            "n_samples": sum(r["n_samples"] for r in rows),
+            "n_subjects": sum(r["n_subjects"] for r in rows),
+        },
+    }
+    for section, counts in sections.items():
+        out[section] = [{"key": k, "n": int(n)} for k, n in sorted(counts.items())]
+    return out
+
+
+def _part4_filter(cohort: CohortFilter) -> dict:
+    return {
+        "condition": cohort.condition,
+        "treatment": cohort.treatment,
+        "sample_type": cohort.sample_type,
+        "time0": cohort.timepoints,
+    }
+
+
+def _part4_summary_sql(conn: sqlite3.Connection, cohort: CohortFilter) -> dict:
+    cte, cohort_params = cohort_cte(cohort, "baseline")
+    sql = f"""
+    {cte},
+    totals AS (
         SELECT
-            c.section,
-            c.key,
-            c.n,
-            t.n_samples,
-            t.n_subjects
-        FROM counts c
-        CROSS JOIN totals t
-        ORDER BY c.section, c.key;
-        """
-
-        params = {
-            "condition": condition,
-            "treatment": treatment,
-            "sample_type": sample_type,
-            "time0": time0,
-        }
+            COUNT(*) AS n_samples,
+            COUNT(DISTINCT subject_id) AS n_subjects
+        FROM baseline
+    ),
+    counts AS (
+        SELECT
+            'samples_by_project' AS section,
+            project AS key,
+            COUNT(*) AS n
+        FROM baseline
+        GROUP BY project
 
-        rows = conn.execute(sql, params).fetchall()
+        UNION ALL
 
-        # Build structured response
-        out = {
-            "filter": params,
-            "totals": {"n_samples": 0, "n_subjects": 0},
-            "samples_by_project": [],
-            "subjects_by_response": [],
-            "subjects_by_sex": [],
-        }
+        SELECT
+            'subjects_by_response' AS section,
+            COALESCE(response, 'unknown') AS key,
+            COUNT(DISTINCT subject_id) AS n
+        FROM baseline
+        GROUP BY COALESCE(response, 'unknown')
 
-        if rows:
-            out["totals"]["n_samples"] = int(rows[0]["n_samples"])
-            out["totals"]["n_subjects"] = int(rows[0]["n_subjects"])
+        UNION ALL
 
-        buckets = {
-            "samples_by_project": "samples_by_project",
-            "subjects_by_response": "subjects_by_response",
-            "subjects_by_sex": "subjects_by_sex",
-        }
+        SELECT
+            'subjects_by_sex' AS section,
+            COALESCE(sex, 'unknown') AS key,
+            COUNT(DISTINCT subject_id) AS n
+        FROM baseline
+        GROUP BY COALESCE(sex, 'unknown')
+    )
+    SELECT
+        c.section,
+        c.key,
+        c.n,
+        t.n_samples,
+        t.n_subjects
+    FROM counts c
+    CROSS JOIN totals t
+    ORDER BY c.section, c.key;
+    """
 
-        for r in rows:
-            section = r["section"]
-            out[buckets[section]].append(
-                {"key": r["key"], "n": int(r["n"])}
-            )
+    rows = conn.execute(sql, cohort_params).fetchall()
 
-        return out
-    finally:
-        conn.close()
\ No newline at end of file
+    # Build structured response
+    out = {
+        "filter": _part4_filter(cohort),
+        "totals": {"n_samples": 0, "n_subjects": 0},
+        "samples_by_project": [],
+        "subjects_by_response": [],
+        "subjects_by_sex": [],
+    }
+
+    if rows:
+        out["totals"]["n_samples"] = int(rows[0]["n_samples"])
+        out["totals"]["n_subjects"] = int(rows[0]["n_subjects"])
+
+    buckets = {
+        "samples_by_project": "samples_by_project",
+        "subjects_by_response": "subjects_by_response",
+        "subjects_by_sex": "subjects_by_sex",
+    }
+
+    for r in rows:
+        section = r["section"]
+        out[buckets[section]].append(
+            {"key": r["key"], "n": int(r["n"])}
+        )
+
+    return out
+
+
+@app.get("/api/v1/cube")
+async def cohort_cube(
+    request: Request,
+    group_by: list[Literal[CUBE_DIMENSIONS]] = Query(list(CUBE_DIMENSIONS)),
+    condition: str | None = None,
+    treatment: str | None = None,
+    sample_type: str | None = None,
+    timepoint: int | None = None,
+    project: str | None = None,
+    response: str | None = None,
+    sex: str | None = None,
+    format: RowFormat = "json",
+):
+    """
+    Sample and distinct-subject counts from the pre-aggregated cohort cube,
+    optionally filtered on any cube dimension and grouped by `group_by`
+    (repeat the parameter; default: every dimension, i.e. the whole cube).
+
+    n_subjects is null where it cannot be summed exactly: when treatment,
+    sample_type or timepoint is neither grouped nor fixed, one subject may
+    be counted in several cube cells.
+    """
+    params = {
+        "group_by": tuple(dict.fromkeys(group_by)),
+        "condition": condition,
+        "treatment": treatment,
+        "sample_type": sample_type,
+        "timepoint": timepoint,
+        "project": project,
+        "response": response,
+        "sex": sex,
+    }
+    cohort = CohortFilter(
+        condition=condition, treatment=treatment, sample_type=sample_type, timepoints=timepoint,
+        project=project, response=response, sex=sex,
+    )
+
+    def lookup(conn: sqlite3.Connection) -> list[dict]:
+        if not cube_available(conn):
+            raise HTTPException(status_code=503, detail="cohort_cube is missing; reload the database")
+        return cube_rollup(conn, cohort, params["group_by"])
+
+    async with LIMITS["light"].slot():
+        return await cached_result(request, "cube", params, lookup, format=format)
@@ -0,0 +1,177 @@
+"""
+In-process metrics, exposed in Prometheus text format on /metrics.
+
+- HTTP requests: latency histogram per (method, route template, status),
+  recorded by TimingMiddleware from the first byte in to the last byte out.
+- Executor tasks: latency histogram per function for run_db / run_cpu
+  calls (SQL work and SciPy/NumPy statistics respectively).
+- SQL statements: latency histogram, rows returned and SQLite VM steps per
+  statement, recorded only when the pool uses profiling connections
+  (SQL_PROFILE=1, see app.profiling).
+
+Everything is process-local; with several workers, scrape each one.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Thread-safe labelled histogram with fixed upper bounds (plus +Inf).
+    """
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        labels = tuple(zip(self.label_names, label_values))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [count per bucket..., +Inf count, sum]
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0.0
+            for bound, n in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += n
+                yield f"{self.name}_bucket", labels + (("le", _format_bound(bound)),), cumulative
+            yield f"{self.name}_count", labels, cumulative
+            yield f"{self.name}_sum", labels, series[-1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """
+    Thread-safe labelled counter.
+    """
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *label_values: str) -> None:
+        labels = tuple(zip(self.label_names, label_values))
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            yield self.name, labels, value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+)
+TASK_LATENCY = Histogram(
+    "executor_task_duration_seconds", "Time spent in run_db/run_cpu calls by function.", ("executor", "function")
+)
+SQL_LATENCY = Histogram(
+    "sqlite_query_duration_seconds", "SQLite statement execution time including row fetches.", ("query",)
+)
+SQL_ROWS = Counter("sqlite_query_rows_total", "Rows returned by SQLite statements.", ("query",))
+SQL_VM_STEPS = Counter("sqlite_query_vm_steps_total", "Approximate SQLite VM instructions per statement.", ("query",))
+
+METRICS = (HTTP_LATENCY, TASK_LATENCY, SQL_LATENCY, SQL_ROWS, SQL_VM_STEPS)
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        inner = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+        name = f"{name}{{{inner}}}"
+    return f"{name} {int(value)}" if value == int(value) else f"{name} {value!r}"
+
+
+def render_prometheus(extra: Dict[str, Tuple[str, str, Iterable[Tuple[Labels, float]]]]) -> str:
+    """
+    Text exposition of all metrics plus values read from elsewhere (pool,
+    cache, limits), given as {name: (type, help, [(labels, value), ...])}.
+    """
+    lines = []
+    for metric in METRICS:
+        kind = "histogram" if isinstance(metric, Histogram) else "counter"
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        lines.extend(_format_sample(*sample) for sample in metric.samples())
+    for name, (kind, help, values) in extra.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(_format_sample(name, labels, value) for labels, value in values)
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    for metric in METRICS:
+        metric.clear()
+
+
+class TimingMiddleware:
+    """
+    Record HTTP_LATENCY for every request, labelled with the matched route
+    template (FastAPI sets scope["route"] while routing) so paths with
+    user input never become label values.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], template, status)
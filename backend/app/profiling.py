@@ -0,0 +1,187 @@
+"""
+Optional per-statement SQLite profiling.
+
+ProfilingConnection is a sqlite3.Connection factory whose cursors time
+each statement from execute() until its rows are exhausted (SQLite does
+most of the work while stepping, not in execute), count the rows returned
+and, through a progress handler, approximate the VM instructions spent.
+Results go to the sqlite_query_* metrics (app.metrics), labelled with the
+whitespace-collapsed statement text (see query_label).
+
+Statements slower than SQL_SLOW_MS are logged; with SQL_EXPLAIN_SLOW=1
+the log also carries EXPLAIN QUERY PLAN, run once per distinct statement
+with the original parameters.
+
+Profiling adds Python overhead to every fetch, so the pool only uses it
+when SQL_PROFILE=1.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .metrics import SQL_LATENCY, SQL_ROWS, SQL_VM_STEPS
+
+logger = logging.getLogger(__name__)
+
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "200"))
+SQL_EXPLAIN_SLOW = os.getenv("SQL_EXPLAIN_SLOW", "0") == "1"
+
+# The progress handler fires every PROGRESS_STEPS VM instructions.
+PROGRESS_STEPS = 1000
+QUERY_LABEL_CHARS = 120
+
+_explained: set = set()
+_explained_lock = threading.Lock()
+
+
+def query_label(sql: str) -> str:
+    """
+    Whitespace-collapsed statement text; long statements (which often
+    share a cohort CTE prefix) are truncated and suffixed with a hash.
+    """
+    text = re.sub(r"\s+", " ", sql).strip()
+    if len(text) <= QUERY_LABEL_CHARS:
+        return text
+    digest = hashlib.sha1(text.encode()).hexdigest()[:8]
+    return f"{text[:QUERY_LABEL_CHARS]}... #{digest}"
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    _sql: Optional[str] = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._begin(sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._begin(sql, ())
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        self._count(0 if row is None else 1, exhausted=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._count(len(rows), exhausted=not rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._count(len(rows), exhausted=True)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._count(1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _begin(self, sql, parameters) -> None:
+        self._sql = sql
+        self._params = parameters
+        self._elapsed = 0.0
+        self._rows = 0
+        self.connection._vm_steps = 0
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def _count(self, n: int, exhausted: bool = False) -> None:
+        if self._sql is not None:
+            self._rows += n
+            if exhausted:
+                self._finish()
+
+    def _finish(self) -> None:
+        sql = self._sql
+        if sql is None:
+            return
+        self._sql = None
+        conn = self.connection
+        steps = conn._vm_steps * PROGRESS_STEPS
+        label = query_label(sql)
+        SQL_LATENCY.observe(self._elapsed, label)
+        SQL_ROWS.inc(self._rows, label)
+        SQL_VM_STEPS.inc(steps, label)
+
+        elapsed_ms = self._elapsed * 1000
+        if elapsed_ms >= SQL_SLOW_MS:
+            plan = _explain(conn, sql, self._params) if SQL_EXPLAIN_SLOW else None
+            logger.warning(
+                "slow query: %.1f ms, %d rows, ~%d VM steps: %s%s",
+                elapsed_ms, self._rows, steps, label,
+                f"\n{plan}" if plan else "",
+            )
+
+
+def _explain(conn: sqlite3.Connection, sql: str, params) -> Optional[str]:
+    """
+    EXPLAIN QUERY PLAN for sql, once per distinct statement. A plain
+    cursor is used so the plan query itself is not profiled.
+    """
+    with _explained_lock:
+        if sql in _explained:
+            return None
+        _explained.add(sql)
+    try:
+        rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as exc:
+        return f"  (EXPLAIN failed: {exc})"
+    return "\n".join(f"  {row[0]:>3} {row[1]:>3} {row[3]}" for row in rows)
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """
+    Connection factory (sqlite3.connect(..., factory=ProfilingConnection))
+    whose cursors record per-statement metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._vm_steps = 0
+        self.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def _progress(self) -> int:
+        self._vm_steps += 1
+        return 0
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() creates its cursor in C without calling cursor().
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
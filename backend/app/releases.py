@@ -0,0 +1,176 @@
+"""
+Versioned, read-only releases of the database for multi-worker serving.
+
+A release is an immutable copy of the DB plus its columnar snapshot:
+
+    data/releases/
+      current -> 000007        symlink, swapped atomically by publish
+      000006/app.db
+      000006/app.snapshot/
+      000007/app.db
+      000007/app.snapshot/
+
+Workers serve DB_PATH=data/releases/current/app.db. Since a release file
+never changes once published, it can be opened with immutable=1
+(DB_IMMUTABLE=1): SQLite then skips locking and change detection, and
+every worker maps the same file and snapshot arrays, sharing one copy in
+the OS page cache. Loads keep going to the working DB (data/app.db); publish
+copies it into a new release and moves `current`, and each worker switches
+to the new release on its next reload check (see main.get_pool). Requests
+already running finish on the release they started with.
+
+Each release's data_version is above the previous one's, so caches and
+ETags keyed on it never confuse two releases.
+
+    python -m app.releases --db data/app.db --releases data/releases
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import stat
+import time
+from pathlib import Path
+from typing import Optional
+
+from .db import get_data_version
+from .snapshot import snapshot_path, write_snapshot
+
+CURRENT = "current"
+DB_NAME = "app.db"
+DEFAULT_KEEP = 3
+
+
+def list_releases(releases_dir) -> list[Path]:
+    """
+    Published release directories, oldest first.
+    """
+    root = Path(releases_dir)
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_dir() and not p.is_symlink() and p.name.isdigit())
+
+
+def current_release(releases_dir) -> Optional[Path]:
+    link = Path(releases_dir) / CURRENT
+    if not link.is_symlink():
+        return None
+    return link.resolve()
+
+
+def _release_version(release: Optional[Path]) -> int:
+    if release is None or not (release / DB_NAME).exists():
+        return 0
+    conn = sqlite3.connect(f"{(release / DB_NAME).as_uri()}?mode=ro", uri=True)
+    try:
+        return get_data_version(conn)
+    finally:
+        conn.close()
+
+
+def _make_read_only(path: Path) -> None:
+    for p in [path, *path.rglob("*")] if path.is_dir() else [path]:
+        if p.is_file():
+            p.chmod(p.stat().st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _swap_current(releases_dir: Path, release: Path) -> None:
+    tmp = releases_dir / f".{CURRENT}.tmp-{os.getpid()}"
+    tmp.unlink(missing_ok=True)
+    tmp.symlink_to(release.name, target_is_directory=True)
+    os.replace(tmp, releases_dir / CURRENT)
+
+
+def prune_releases(releases_dir, keep: int = DEFAULT_KEEP) -> list[Path]:
+    """
+    Remove all but the newest `keep` releases (never the current one).
+    Workers still reading a removed release keep their open files.
+    """
+    current = current_release(releases_dir)
+    releases = list_releases(releases_dir)
+    removed = []
+    for release in releases[: max(len(releases) - keep, 0)]:
+        if current is not None and release.resolve() == current:
+            continue
+        shutil.rmtree(release)
+        removed.append(release)
+    return removed
+
+
+def publish_release(db_path: str, releases_dir, keep: int = DEFAULT_KEEP) -> Path:
+    """
+    Copy db_path into a new release directory with a fresh snapshot and
+    make it current. Returns the release directory.
+    """
+    src = Path(db_path)
+    if not src.exists():
+        raise FileNotFoundError(f"No such database: {src}")
+    root = Path(releases_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    previous = list_releases(root)
+    name = f"{int(previous[-1].name) + 1 if previous else 1:06d}"
+    release = root / name
+    build = root / f".{name}.tmp-{os.getpid()}"
+    shutil.rmtree(build, ignore_errors=True)
+    build.mkdir()
+
+    try:
+        # VACUUM INTO writes a consistent, compacted copy even while the
+        # working DB has an uncheckpointed WAL.
+        conn = sqlite3.connect(str(src))
+        try:
+            conn.execute("VACUUM INTO ?", (str(build / DB_NAME),))
+        finally:
+            conn.close()
+
+        conn = sqlite3.connect(str(build / DB_NAME))
+        conn.row_factory = sqlite3.Row
+        try:
+            # Rollback journal: an immutable reader never looks for -wal/-shm.
+            conn.execute("PRAGMA journal_mode = DELETE")
+            version = max(get_data_version(conn), _release_version(current_release(root)) + 1)
+            conn.execute(
+                """
+                INSERT INTO db_meta(key, value) VALUES ('data_version', ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                """,
+                (version,),
+            )
+            conn.commit()
+            write_snapshot(conn, snapshot_path(str(build / DB_NAME)))
+        finally:
+            conn.close()
+
+        _make_read_only(build)
+        build.rename(release)
+    except BaseException:
+        shutil.rmtree(build, ignore_errors=True)
+        raise
+
+    _swap_current(root, release)
+    prune_releases(root, keep)
+    return release
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish the database as a new read-only release.")
+    parser.add_argument("--db", required=True, help="Working SQLite db to publish (e.g., data/app.db)")
+    parser.add_argument("--releases", required=True, help="Releases directory (e.g., data/releases)")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="Releases to keep, including the new one")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    release = publish_release(args.db, args.releases, keep=args.keep)
+    conn = sqlite3.connect(f"{(release / DB_NAME).as_uri()}?mode=ro", uri=True)
+    try:
+        version = get_data_version(conn)
+    finally:
+        conn.close()
+    print(f"Published {args.db} as {release} (data_version {version}) in {time.perf_counter() - started:.2f}s")
+    print(f"{Path(args.releases) / CURRENT} -> {release.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+JSON responses for the API.
+
+FastJSONResponse renders with orjson when it is installed (several times
+faster than the stdlib encoder on our large row lists, and it accepts NumPy
+scalars/arrays directly), and falls back to the stdlib encoder otherwise,
+after converting NumPy values to Python ones. Both write NaN and
+infinities as null. Handlers that return large payloads build it directly,
+which also skips FastAPI's jsonable_encoder pass over the content.
+
+to_columns() turns a list of row dicts into parallel arrays, the shape
+served for `?format=columns`: keys are sent once instead of once per row.
+"""
+
+import json
+import math
+from typing import Any, Literal
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Row endpoints: a list of objects, or one object of parallel arrays.
+RowFormat = Literal["json", "columns"]
+
+
+def _plain(value: Any) -> Any:
+    """
+    value with NumPy scalars and arrays turned into Python values and
+    non-finite floats into None, as orjson renders them.
+    """
+    if isinstance(value, dict):
+        return {_plain(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return _plain(value.tolist())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return json.dumps(
+                _plain(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+            ).encode("utf-8")
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def to_columns(rows: list[dict]) -> dict[str, list]:
+    """
+    {key: [value per row]} for a list of row dicts. Keys appear in first-
+    seen order; rows missing a key contribute None for it.
+    """
+    keys: dict[str, None] = {}
+    for row in rows:
+        keys.update(dict.fromkeys(row))
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+def shape_rows(rows: list[dict], format: RowFormat) -> Any:
+    return to_columns(rows) if format == "columns" else rows
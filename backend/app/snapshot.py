@@ -0,0 +1,376 @@
+"""
+Columnar (sample x population) snapshot of the analytics DB.
+
+The loader writes a directory next to the SQLite file (app.db ->
+app.snapshot/) holding a wide count matrix plus per-sample metadata
+arrays as .npy files. The API memory-maps them and answers cohort
+queries with boolean masks instead of SQL joins over cell_counts.
+
+app.snapshot is a symlink to a versioned sibling directory
+(app.snapshot.<ns>/), swapped atomically when a new snapshot is written;
+the previous directory is kept for readers still loading it.
+
+Layout:
+  meta.json          populations, category dictionaries, data_version
+  sample_ids.npy     int64, sorted ascending (samples.id)
+  sample_codes.npy   unicode
+  subject_ids.npy    int64
+  counts.npy         int32 (n_samples, n_populations), -1 where missing
+                     (int64 only if a count does not fit)
+  totals.npy         int64 per-sample total of present counts
+  measured.npy       int32 per-sample number of populations present
+  <column>.npy       int32 category codes for CATEGORY_COLUMNS
+  response.npy       int8: 1 yes, 0 no, -1 unknown
+  age.npy, time.npy  int32 (-1 where age is unknown)
+
+Wide panels (hundreds of populations) make counts.npy the dominant array;
+it is stored at 32 bits and per-sample presence is precomputed so cohort
+queries only touch the count rows of the samples they select.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .cohort import CohortFilter
+from .db import get_data_version, nocase
+from .stats import ResponseMatrix
+
+SNAPSHOT_FORMAT = 2
+
+CATEGORY_COLUMNS = ["project", "condition", "sex", "treatment", "sample_type"]
+
+RESPONSE_CODES = {"yes": 1, "no": 0}
+
+
+def snapshot_path(db_path: str) -> Path:
+    return Path(db_path).with_suffix(".snapshot")
+
+
+def _encode(values: list, categories: Optional[list[str]] = None) -> tuple[np.ndarray, list[str]]:
+    """
+    Dictionary-encode strings case-insensitively (NOCASE semantics);
+    the first spelling seen is kept as the display value. Codes already
+    in `categories` are kept and new values are appended to it.
+    """
+    categories = list(categories or [])
+    lookup: dict[str, int] = {nocase(v): i for i, v in enumerate(categories)}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        k = nocase(v)
+        code = lookup.get(k)
+        if code is None:
+            code = lookup[k] = len(categories)
+            categories.append(v)
+        codes[i] = code
+    return codes, categories
+
+
+_SAMPLES_SQL = """
+    SELECT
+        s.id AS sample_id,
+        s.sample_code AS sample,
+        subj.id AS subject_id,
+        proj.name AS project,
+        subj.condition AS condition,
+        subj.age AS age,
+        subj.sex AS sex,
+        tc.treatment AS treatment,
+        tc.response AS response,
+        s.sample_type AS sample_type,
+        s.time_from_treatment_start AS time
+    FROM samples s
+    JOIN subjects subj ON subj.id = s.subject_id
+    JOIN projects proj ON proj.id = subj.project_id
+    JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+    {where}
+    ORDER BY s.id
+"""
+
+_SAMPLE_COLUMNS = ["sample_id", "sample", "subject_id", *CATEGORY_COLUMNS, "age", "response", "time"]
+
+# Sample ids per IN (...) query when reading part of the DB.
+_ID_CHUNK = 900
+
+
+def _id_chunks(ids: np.ndarray):
+    for i in range(0, ids.size, _ID_CHUNK):
+        chunk = [int(x) for x in ids[i:i + _ID_CHUNK]]
+        yield chunk, ",".join("?" * len(chunk))
+
+
+def _read_samples(conn: sqlite3.Connection, ids: Optional[np.ndarray] = None) -> dict[str, list]:
+    """
+    Sample metadata columns, ordered by sample id; all samples, or only
+    `ids` (sorted).
+    """
+    if ids is None:
+        rows = conn.execute(_SAMPLES_SQL.format(where="")).fetchall()
+    else:
+        rows = []
+        for chunk, marks in _id_chunks(ids):
+            rows.extend(conn.execute(_SAMPLES_SQL.format(where=f"WHERE s.id IN ({marks})"), chunk).fetchall())
+    return {k: [r[k] for r in rows] for k in _SAMPLE_COLUMNS}
+
+
+def _sample_arrays(cols: dict[str, list]) -> dict[str, np.ndarray]:
+    return {
+        "sample_ids": np.array(cols["sample_id"], dtype=np.int64),
+        "sample_codes": np.array(cols["sample"], dtype=str),
+        "subject_ids": np.array(cols["subject_id"], dtype=np.int64),
+        "response": np.array([RESPONSE_CODES.get(v, -1) for v in cols["response"]], dtype=np.int8),
+        "age": np.array([-1 if v is None else v for v in cols["age"]], dtype=np.int32),
+        "time": np.array(cols["time"], dtype=np.int32),
+    }
+
+
+def _fill_counts(
+    conn: sqlite3.Connection,
+    counts: np.ndarray,
+    sample_ids: np.ndarray,
+    pop_ids: np.ndarray,
+    ids: Optional[np.ndarray] = None,
+) -> None:
+    """
+    Write cell_counts into the rows of `counts` (one per sample_ids),
+    for every sample or only for `ids`.
+    """
+    sql = "SELECT sample_id, population_id, count FROM cell_counts"
+    queries = [(sql, [])] if ids is None else [
+        (f"{sql} WHERE sample_id IN ({marks})", chunk) for chunk, marks in _id_chunks(ids)
+    ]
+    for query, params in queries:
+        cur = conn.execute(query, params)
+        while True:
+            chunk = cur.fetchmany(100_000)
+            if not chunk:
+                break
+            arr = np.array(chunk, dtype=np.int64)
+            counts[np.searchsorted(sample_ids, arr[:, 0]), np.searchsorted(pop_ids, arr[:, 1])] = arr[:, 2]
+
+
+def _save(out_dir: Path, arrays: dict[str, np.ndarray], meta: dict) -> Path:
+    """
+    Write arrays and meta.json into a new versioned directory and point
+    the out_dir symlink at it with os.replace, so readers never see a
+    partial or missing snapshot.
+    """
+    new_dir = out_dir.with_name(f"{out_dir.name}.{time.time_ns()}")
+    new_dir.mkdir(parents=True)
+
+    arrays = dict(arrays)
+    counts = arrays["counts"]
+    arrays["totals"] = np.where(counts >= 0, counts, 0).sum(axis=1, dtype=np.int64)
+    arrays["measured"] = (counts >= 0).sum(axis=1, dtype=np.int32)
+    for name, arr in arrays.items():
+        np.save(new_dir / f"{name}.npy", arr)
+    (new_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    previous = out_dir.resolve() if out_dir.is_symlink() else None
+    if out_dir.is_dir() and not out_dir.is_symlink():
+        # A snapshot written before the symlink layout: move it aside once.
+        previous = out_dir.with_name(f"{out_dir.name}.{time.time_ns()}")
+        out_dir.rename(previous)
+    link = out_dir.with_name(f".{out_dir.name}.tmp-{os.getpid()}")
+    link.unlink(missing_ok=True)
+    link.symlink_to(new_dir.name, target_is_directory=True)
+    os.replace(link, out_dir)
+
+    keep = {new_dir.name, previous.name if previous else None}
+    for old in out_dir.parent.glob(f"{out_dir.name}.*"):
+        if old.suffix[1:].isdigit() and old.is_dir() and not old.is_symlink() and old.name not in keep:
+            shutil.rmtree(old, ignore_errors=True)
+    return out_dir
+
+
+def _meta(conn: sqlite3.Connection, n_samples: int, populations: list[str], categories: dict) -> dict:
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "data_version": get_data_version(conn),
+        "n_samples": n_samples,
+        "populations": populations,
+        "categories": categories,
+    }
+
+
+def write_snapshot(conn: sqlite3.Connection, out_dir: Path) -> Path:
+    """
+    Export the DB into a snapshot directory. The directory is built under
+    a temporary name and swapped into place so readers never see a
+    partially written snapshot.
+    """
+    out_dir = Path(out_dir)
+    pops = conn.execute("SELECT id, name FROM populations ORDER BY id").fetchall()
+    pop_ids = np.array([int(r[0]) for r in pops], dtype=np.int64)
+
+    cols = _read_samples(conn)
+    arrays = _sample_arrays(cols)
+    sample_ids = arrays["sample_ids"]
+    max_count = conn.execute("SELECT MAX(count) FROM cell_counts").fetchone()[0] or 0
+    dtype = np.int32 if max_count <= np.iinfo(np.int32).max else np.int64
+    counts = np.full((sample_ids.size, pop_ids.size), -1, dtype=dtype)
+    _fill_counts(conn, counts, sample_ids, pop_ids)
+    arrays["counts"] = counts
+
+    categories = {}
+    for col in CATEGORY_COLUMNS:
+        arrays[col], categories[col] = _encode(cols[col])
+
+    return _save(out_dir, arrays, _meta(conn, int(sample_ids.size), [r[1] for r in pops], categories))
+
+
+def update_snapshot(conn: sqlite3.Connection, out_dir: Path, sample_ids: Iterable[int]) -> Path:
+    """
+    Bring the snapshot up to date after an incremental load that added or
+    changed only `sample_ids`: their rows (metadata and counts) are read
+    from the DB and the rest is copied from the existing snapshot, which
+    must match the data version just before the load. Falls back to
+    write_snapshot when that does not hold.
+    """
+    out_dir = Path(out_dir)
+    old = Snapshot.load(out_dir)
+    pops = conn.execute("SELECT id, name FROM populations ORDER BY id").fetchall()
+    names = [r[1] for r in pops]
+    if (
+        old is None
+        or old.data_version != get_data_version(conn) - 1
+        or names[: len(old.populations)] != old.populations
+    ):
+        return write_snapshot(conn, out_dir)
+
+    pop_ids = np.array([int(r[0]) for r in pops], dtype=np.int64)
+    ids = np.unique(np.fromiter(sample_ids, dtype=np.int64))
+    old_ids = np.asarray(old.arrays["sample_ids"])
+    new_ids = ids[~np.isin(ids, old_ids)]
+    if new_ids.size and old_ids.size and new_ids[0] <= old_ids[-1]:
+        # Not an append (ids are assigned in increasing order).
+        return write_snapshot(conn, out_dir)
+
+    # New samples are appended; changed ones are overwritten in place.
+    cols = _read_samples(conn, ids)
+    read = _sample_arrays(cols)
+    categories = {}
+    for col in CATEGORY_COLUMNS:
+        read[col], categories[col] = _encode(cols[col], old.meta["categories"][col])
+    is_new = np.isin(read["sample_ids"], new_ids)
+    at = np.searchsorted(old_ids, read["sample_ids"][~is_new])
+    arrays = {}
+    for name, values in read.items():
+        merged = np.concatenate([old.arrays[name], values[is_new]])
+        merged = merged.astype(np.result_type(merged, values), copy=False)
+        merged[at] = values[~is_new]
+        arrays[name] = merged
+
+    # Rows of the given samples are read whole: counts may also have been removed.
+    rows = np.full((ids.size, pop_ids.size), -1, dtype=np.int64)
+    _fill_counts(conn, rows, ids, pop_ids, ids)
+    old_counts = old.arrays["counts"]
+    fits = rows.size == 0 or rows.max() <= np.iinfo(old_counts.dtype).max
+    all_ids = arrays["sample_ids"]
+    counts = np.full((all_ids.size, pop_ids.size), -1, dtype=old_counts.dtype if fits else np.int64)
+    counts[: old_counts.shape[0], : old_counts.shape[1]] = old_counts
+    counts[np.searchsorted(all_ids, ids)] = rows
+    arrays["counts"] = counts
+
+    return _save(out_dir, arrays, _meta(conn, int(all_ids.size), names, categories))
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot directory.
+    """
+
+    def __init__(self, path: Path, meta: dict, arrays: dict[str, np.ndarray]):
+        self.path = path
+        self.meta = meta
+        self.arrays = arrays
+        self.populations: list[str] = meta["populations"]
+        self.data_version: int = meta["data_version"]
+
+        # Case-folded value -> code, per category column.
+        self._codes = {
+            col: {nocase(v): i for i, v in enumerate(values)}
+            for col, values in meta["categories"].items()
+        }
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Snapshot"]:
+        # Read every file from the directory the link points at right now.
+        path = Path(path).resolve()
+        meta_file = path / "meta.json"
+        if not meta_file.exists():
+            return None
+        meta = json.loads(meta_file.read_text())
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return None
+        arrays = {p.stem: np.load(p, mmap_mode="r") for p in path.glob("*.npy")}
+        return cls(path, meta, arrays)
+
+    @property
+    def n_samples(self) -> int:
+        return int(self.meta["n_samples"])
+
+    def category_mask(self, column: str, values: tuple) -> np.ndarray:
+        codes = [self._codes[column].get(nocase(v)) for v in values]
+        return np.isin(self.arrays[column], [c for c in codes if c is not None])
+
+    def mask(self, cohort: CohortFilter) -> np.ndarray:
+        """
+        Boolean sample mask with the same semantics as cohort_cte().
+        """
+        m = np.ones(self.n_samples, dtype=bool)
+        for column in CATEGORY_COLUMNS:
+            values = cohort.values(column)
+            if values is not None:
+                m &= self.category_mask(column, values)
+
+        responses = cohort.values("response")
+        if responses is not None:
+            m &= np.isin(self.arrays["response"], [RESPONSE_CODES[v] for v in responses if v in RESPONSE_CODES])
+
+        age = self.arrays["age"]
+        if cohort.age_min is not None:
+            m &= (age >= 0) & (age >= cohort.age_min)
+        if cohort.age_max is not None:
+            m &= (age >= 0) & (age <= cohort.age_max)
+
+        timepoints = cohort.values("timepoints")
+        if timepoints is not None:
+            m &= np.isin(self.arrays["time"], timepoints)
+        return m
+
+    def percentages(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Relative frequencies (%) for the masked samples, NaN where a
+        population was not measured.
+        """
+        counts = self.arrays["counts"][mask]
+        totals = self.arrays["totals"][mask]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = 100.0 * counts / totals[:, None]
+        pct[counts < 0] = np.nan
+        return pct
+
+    def response_matrix(self, mask: np.ndarray) -> ResponseMatrix:
+        """
+        Same shape as stats.pivot_percentages over sample_frequencies:
+        samples without any counts and populations never measured in the
+        cohort are dropped.
+        """
+        mask = mask & (self.arrays["response"] >= 0) & (self.arrays["measured"] > 0)
+        keep = (self.arrays["counts"][mask] >= 0).any(axis=0)
+        return ResponseMatrix(
+            [p for p, k in zip(self.populations, keep) if k],
+            self.percentages(mask)[:, keep],
+            self.arrays["response"][mask] == 1,
+        )
+
+
+def load_snapshot(db_path: str) -> Optional[Snapshot]:
+    return Snapshot.load(snapshot_path(db_path))
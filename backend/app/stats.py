@@ -0,0 +1,363 @@
+"""
+Columnar statistics for responder vs non-responder comparisons.
+
+Percentages are pivoted into a (samples x populations) matrix once, and
+medians, Mann-Whitney U tests and Benjamini-Hochberg q-values are computed
+for all populations in batched NumPy/SciPy calls rather than per-population
+Python loops.
+
+Permutation p-values and bootstrap confidence intervals are computed in
+independent chunks (resample_chunk), each seeded from its own spawned
+SeedSequence, so chunks can run on any number of worker processes and
+still give the same result for a given seed.
+"""
+
+from typing import Literal, NamedTuple, Sequence
+
+import numpy as np
+
+ResampleMethod = Literal["permutation", "bootstrap"]
+
+# Resamples per chunk; fixed so results do not depend on the worker count.
+RESAMPLE_CHUNK = 1000
+
+BOOTSTRAP_CI = 0.95
+
+# Tukey fences for boxplot whiskers, and how many of the most extreme
+# outliers are listed per box (the rest are only counted).
+WHISKER_IQR = 1.5
+MAX_OUTLIERS = 50
+
+
+def _scipy_stats():
+    """
+    scipy.stats, imported on first use: it accounts for most of the API's
+    import time, and only the statistics paths need it.
+    """
+    from scipy import stats
+
+    return stats
+
+
+class ResponseMatrix(NamedTuple):
+    """Per-sample percentages, one column per population."""
+    populations: list[str]
+    values: np.ndarray   # (n_samples, n_populations), NaN where missing
+    is_yes: np.ndarray   # (n_samples,) True for responders
+
+    @classmethod
+    def empty(cls) -> "ResponseMatrix":
+        return cls([], np.empty((0, 0)), np.zeros(0, dtype=bool))
+
+
+def pivot_percentages(
+    sample_ids: Sequence[int],
+    responses: Sequence[str],
+    population_ids: Sequence[int],
+    percentages: Sequence[float],
+    population_names: dict[int, str],
+) -> ResponseMatrix:
+    """
+    Pivot long-format (sample, population, percentage) columns into a
+    ResponseMatrix. Populations are ordered by id.
+    """
+    samples, s_idx = np.unique(np.asarray(sample_ids, dtype=np.int64), return_inverse=True)
+    pops, p_idx = np.unique(np.asarray(population_ids, dtype=np.int64), return_inverse=True)
+
+    values = np.full((samples.size, pops.size), np.nan)
+    values[s_idx, p_idx] = np.asarray(percentages, dtype=float)
+
+    is_yes = np.zeros(samples.size, dtype=bool)
+    is_yes[s_idx] = np.asarray(responses, dtype=object) == "yes"
+
+    return ResponseMatrix([population_names[int(p)] for p in pops], values, is_yes)
+
+
+def bh_qvalues(pvals: np.ndarray) -> np.ndarray:
+    """
+    Benjamini-Hochberg adjusted p-values, returned in input order.
+    NaN p-values are left as NaN and do not count towards the number
+    of tests.
+    """
+    p = np.asarray(pvals, dtype=float)
+    q = np.full_like(p, np.nan)
+    finite = np.flatnonzero(np.isfinite(p))
+    m = finite.size
+    if m == 0:
+        return q
+
+    order = finite[np.argsort(p[finite], kind="stable")]
+    raw = p[order] * m / np.arange(1, m + 1)
+    # Enforce monotonicity from the largest p-value down, capped at 1.
+    q[order] = np.minimum(np.minimum.accumulate(raw[::-1])[::-1], 1.0)
+    return q
+
+
+def compare_responders(matrix: ResponseMatrix) -> list[dict]:
+    """
+    Mann-Whitney U (two-sided) per population between responders and
+    non-responders, with BH q-values. Rows are sorted by p-value.
+    Populations without values in both groups cannot be tested and are
+    left out. Returns [] when either group is empty.
+    """
+    # Only populations measured in both groups can be tested.
+    testable = np.flatnonzero(
+        ~np.isnan(matrix.values[matrix.is_yes]).all(axis=0)
+        & ~np.isnan(matrix.values[~matrix.is_yes]).all(axis=0)
+    )
+    if testable.size == 0:
+        return []
+    populations = [matrix.populations[j] for j in testable]
+    values = matrix.values[:, testable]
+    yes = values[matrix.is_yes]
+    no = values[~matrix.is_yes]
+
+    has_missing = bool(np.isnan(values).any())
+    stat, pval = _scipy_stats().mannwhitneyu(
+        yes, no, axis=0, alternative="two-sided",
+        nan_policy="omit" if has_missing else "propagate",
+    )
+    stat = np.atleast_1d(stat)
+    pval = np.atleast_1d(pval)
+
+    n_yes = np.count_nonzero(~np.isnan(yes), axis=0)
+    n_no = np.count_nonzero(~np.isnan(no), axis=0)
+    median_yes = np.nanmedian(yes, axis=0)
+    median_no = np.nanmedian(no, axis=0)
+
+    order = np.argsort(pval, kind="stable")
+    q_sorted = bh_qvalues(pval)[order]
+
+    results = []
+    for j, q in zip(order, q_sorted):
+        p = float(pval[j])
+        results.append({
+            "population": populations[j],
+            "n_yes": int(n_yes[j]),
+            "n_no": int(n_no[j]),
+            "median_yes": round(float(median_yes[j]), 3),
+            "median_no": round(float(median_no[j]), 3),
+            "u_statistic": round(float(stat[j]), 3),
+            "p_value": p,
+            "significant_p_lt_0_05": bool(p < 0.05),
+            "q_value": float(q),
+            "significant_fdr_0_05": bool(q < 0.05),
+        })
+    return results
+
+
+def compare_responders_many(matrices: Sequence[ResponseMatrix]) -> list[list[dict]]:
+    """
+    compare_responders for several cohorts in one call, so a batch costs a
+    single round trip to the statistics process pool.
+    """
+    return [compare_responders(m) for m in matrices]
+
+
+def attach_global_qvalues(result_sets: Sequence[list[dict]]) -> int:
+    """
+    Apply BH across every test in result_sets (in place), adding
+    q_value_global and significant_fdr_0_05_global. Returns the number
+    of tests corrected.
+    """
+    flat = [r for results in result_sets for r in results]
+    q = bh_qvalues(np.array([r["p_value"] for r in flat], dtype=float))
+    for r, qv in zip(flat, q):
+        r["q_value_global"] = float(qv)
+        r["significant_fdr_0_05_global"] = bool(qv < 0.05)
+    return len(flat)
+
+
+def resample_plan(n_resamples: int, seed: int | None) -> list[tuple[int, np.random.SeedSequence]]:
+    """
+    Split n_resamples into RESAMPLE_CHUNK-sized chunks, each with an
+    independent child seed.
+    """
+    sizes = [RESAMPLE_CHUNK] * (n_resamples // RESAMPLE_CHUNK)
+    if n_resamples % RESAMPLE_CHUNK:
+        sizes.append(n_resamples % RESAMPLE_CHUNK)
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def _permutation_exceedances(yes: np.ndarray, no: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    For each column of yes (n1, k) / no (n2, k), count label permutations
+    whose U is at least as far from its mean as the observed U (two-sided).
+    U is linear in the responder rank sum, so one shared (size, n) label
+    matrix times the (n, k) ranks gives every column's permuted U at once.
+    """
+    n1, n2 = yes.shape[0], no.shape[0]
+    ranks = _scipy_stats().rankdata(np.concatenate([yes, no]), axis=0)
+    mu = n1 * n2 / 2
+    offset = n1 * (n1 + 1) / 2
+    observed = np.abs(ranks[:n1].sum(axis=0) - offset - mu)
+
+    labels = np.zeros((size, n1 + n2))
+    labels[:, :n1] = 1.0
+    u = rng.permuted(labels, axis=1) @ ranks - offset
+    # Rank sums are multiples of 0.5, so the tolerance only absorbs rounding.
+    return np.count_nonzero(np.abs(u - mu) >= observed - 1e-9, axis=0)
+
+
+def _bootstrap_medians(values: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Medians of `size` resamples (with replacement) of values. With values
+    sorted, an order statistic of a resample is the value at the same
+    order statistic of its indices, so only integer index rows are
+    partitioned and nothing is gathered.
+    """
+    ordered = np.sort(values)
+    n = ordered.size
+    hi = n // 2
+    idx = np.partition(rng.integers(0, n, (size, n), dtype=np.int32), hi, axis=1)
+    upper = ordered[idx[:, hi]]
+    if n % 2:
+        return upper
+    # Everything left of the kth slot is <= it; its max is the lower middle.
+    return (ordered[idx[:, :hi].max(axis=1)] + upper) / 2
+
+
+def _bootstrap_median_diffs(yes: np.ndarray, no: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Medians of responder minus non-responder values over `size` bootstrap
+    resamples, each group resampled independently.
+    """
+    return _bootstrap_medians(yes, size, rng) - _bootstrap_medians(no, size, rng)
+
+
+def resample_chunk(
+    matrix: ResponseMatrix,
+    method: ResampleMethod,
+    size: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """
+    One chunk of resamples for every population.
+
+    permutation: (n_populations,) exceedance counts.
+    bootstrap:   (size, n_populations) median differences.
+    Populations without values in both groups are NaN.
+    """
+    rng = np.random.default_rng(seed)
+    yes = matrix.values[matrix.is_yes]
+    no = matrix.values[~matrix.is_yes]
+    n_pops = len(matrix.populations)
+    out = np.full(n_pops if method == "permutation" else (size, n_pops), np.nan)
+    if yes.shape[0] == 0 or no.shape[0] == 0:
+        return out
+
+    # Populations measured in every sample share one set of permutations.
+    complete = ~np.isnan(matrix.values).any(axis=0)
+    if method == "permutation" and complete.any():
+        out[complete] = _permutation_exceedances(yes[:, complete], no[:, complete], size, rng)
+
+    for j in range(n_pops):
+        if method == "permutation" and complete[j]:
+            continue
+        y = yes[:, j][~np.isnan(yes[:, j])]
+        n = no[:, j][~np.isnan(no[:, j])]
+        if y.size == 0 or n.size == 0:
+            continue
+        if method == "permutation":
+            out[j] = _permutation_exceedances(y[:, None], n[:, None], size, rng)[0]
+        else:
+            out[:, j] = _bootstrap_median_diffs(y, n, size, rng)
+    return out
+
+
+def summarize_resamples(
+    matrix: ResponseMatrix,
+    method: ResampleMethod,
+    chunks: Sequence[np.ndarray],
+    n_resamples: int,
+) -> list[dict]:
+    """
+    Combine resample_chunk outputs with the Mann-Whitney summary.
+
+    permutation: p_value becomes the permutation p-value (k + 1) / (B + 1);
+    q-values and sorting follow it.
+    bootstrap: adds median_diff and a percentile confidence interval
+    (BOOTSTRAP_CI) for it; p-values stay asymptotic Mann-Whitney.
+    """
+    results = compare_responders(matrix)
+    if not results:
+        return results
+    column = {name: j for j, name in enumerate(matrix.populations)}
+
+    if method == "permutation":
+        exceed = np.sum(chunks, axis=0)
+        for r in results:
+            r["p_value"] = float((exceed[column[r["population"]]] + 1) / (n_resamples + 1))
+            r["significant_p_lt_0_05"] = bool(r["p_value"] < 0.05)
+        results.sort(key=lambda r: r["p_value"])
+        for r, q in zip(results, bh_qvalues(np.array([r["p_value"] for r in results]))):
+            r["q_value"] = float(q)
+            r["significant_fdr_0_05"] = bool(q < 0.05)
+    else:
+        alpha = (1 - BOOTSTRAP_CI) / 2
+        diffs = np.concatenate(chunks, axis=0)
+        low, high = np.nanquantile(diffs, [alpha, 1 - alpha], axis=0)
+        yes = np.nanmedian(matrix.values[matrix.is_yes], axis=0)
+        no = np.nanmedian(matrix.values[~matrix.is_yes], axis=0)
+        for r in results:
+            j = column[r["population"]]
+            r["median_diff"] = round(float(yes[j] - no[j]), 3)
+            r["ci_low"] = round(float(low[j]), 3)
+            r["ci_high"] = round(float(high[j]), 3)
+            r["ci_level"] = BOOTSTRAP_CI
+
+    for r in results:
+        r["method"] = method
+        r["n_resamples"] = n_resamples
+    return results
+
+
+def _r3(x) -> float:
+    return round(float(x), 3)
+
+
+def boxplot_summary(matrix: ResponseMatrix, bins: int = 0, max_outliers: int = MAX_OUTLIERS) -> list[dict]:
+    """
+    Five-number summary, Tukey whiskers and outliers per population x
+    response, with optional histograms over edges shared by both responses
+    of a population. Output size is independent of the number of samples.
+    """
+    out = []
+    for j, population in enumerate(matrix.populations):
+        column = matrix.values[:, j]
+        present = ~np.isnan(column)
+        if not present.any():
+            continue
+        edges = np.histogram_bin_edges(column[present], bins=bins) if bins else None
+
+        for response, in_group in (("yes", matrix.is_yes), ("no", ~matrix.is_yes)):
+            v = np.sort(column[in_group & present])
+            if v.size == 0:
+                continue
+            q1, median, q3 = np.percentile(v, [25, 50, 75])
+            low, high = q1 - WHISKER_IQR * (q3 - q1), q3 + WHISKER_IQR * (q3 - q1)
+            inside = v[(v >= low) & (v <= high)]
+            outliers = v[(v < low) | (v > high)]
+            # Keep the most extreme ones: largest distance from the median.
+            extreme = outliers[np.argsort(-np.abs(outliers - median), kind="stable")[:max_outliers]]
+
+            row = {
+                "population": population,
+                "response": response,
+                "n": int(v.size),
+                "min": _r3(v[0]),
+                "q1": _r3(q1),
+                "median": _r3(median),
+                "q3": _r3(q3),
+                "max": _r3(v[-1]),
+                "mean": _r3(v.mean()),
+                "whisker_low": _r3(inside[0]),
+                "whisker_high": _r3(inside[-1]),
+                "n_outliers": int(outliers.size),
+                "outliers": [_r3(x) for x in np.sort(extreme)],
+            }
+            if edges is not None:
+                counts, _ = np.histogram(v, bins=edges)
+                row["histogram"] = {"edges": [_r3(e) for e in edges], "counts": counts.tolist()}
+            out.append(row)
+    return out
@@ -0,0 +1,211 @@
+"""
+Synthetic cell-count CSVs with the same schema as data/cell-count.csv.
+
+Every subject gets one sample per timepoint; subjects are split evenly and
+contiguously across projects. Metadata follows the proportions of the real
+dataset (melanoma/carcinoma/healthy, miraclib/phauximab for patients and
+'none' with no response for healthy subjects, PBMC/WB, ages 50-79), and
+counts are log-normal around per-population levels with a modest
+responder effect on the first two populations, so Part 3 statistics have
+something to find.
+
+Rows are generated and written in blocks of subjects with NumPy, so memory
+stays flat and 10^7 samples are practical:
+
+    python -m app.synthetic --samples 1000000 --out ../data/synthetic-1m.csv.gz
+    python -m app.synthetic --samples 10000000 --out ../data/synthetic-10m --shards 16
+"""
+
+import argparse
+import csv
+import gzip
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .load_db import METADATA_COLUMNS, POPULATION_COLUMNS
+
+DEFAULT_TIMEPOINTS = (0, 7, 14)
+
+# Subjects generated per NumPy block.
+BLOCK_SUBJECTS = 20_000
+
+CONDITIONS = np.array(["melanoma", "carcinoma", "healthy"])
+CONDITION_WEIGHTS = [0.49, 0.37, 0.14]
+TREATMENTS = np.array(["miraclib", "phauximab"])
+SAMPLE_TYPE_WEIGHTS = {"PBMC": 0.7, "WB": 0.3}
+
+# Median count and log-scale spread per population; unknown names get the
+# default level. Responders are shifted by RESPONDER_SHIFT on the first two.
+POPULATION_LEVELS = {
+    "b_cell": 10_000,
+    "cd8_t_cell": 25_000,
+    "cd4_t_cell": 30_000,
+    "nk_cell": 15_000,
+    "monocyte": 20_000,
+}
+DEFAULT_LEVEL = 15_000
+COUNT_SIGMA = 0.35
+RESPONDER_SHIFT = 0.08
+
+
+def _width(n: int, minimum: int) -> int:
+    return max(minimum, len(str(max(n - 1, 0))))
+
+
+def generate_blocks(
+    n_samples: int,
+    projects: int = 3,
+    populations: Optional[Sequence[str]] = None,
+    timepoints: Sequence[int] = DEFAULT_TIMEPOINTS,
+    seed: int = 0,
+    block_subjects: int = BLOCK_SUBJECTS,
+) -> Iterator[List[tuple]]:
+    """
+    Yield lists of CSV rows (METADATA_COLUMNS + populations) totalling
+    n_samples, one block of subjects at a time. Output is deterministic for
+    a given seed and arguments.
+    """
+    populations = list(populations or POPULATION_COLUMNS)
+    timepoints = [int(t) for t in timepoints]
+    per_subject = len(timepoints)
+    n_subjects = -(-n_samples // per_subject)
+    subject_width = _width(n_subjects, 3)
+    sample_width = _width(n_samples, 5)
+
+    rng = np.random.default_rng(seed)
+    levels = np.log([POPULATION_LEVELS.get(p, DEFAULT_LEVEL) for p in populations])
+    shift = np.zeros(len(populations))
+    shift[:2] = RESPONDER_SHIFT
+    sample_types = np.array(list(SAMPLE_TYPE_WEIGHTS))
+    tp = np.array(timepoints)
+
+    for start in range(0, n_subjects, block_subjects):
+        subj = np.arange(start, min(start + block_subjects, n_subjects))
+        k = len(subj)
+        project = subj * projects // n_subjects + 1
+        condition = rng.choice(CONDITIONS, size=k, p=CONDITION_WEIGHTS)
+        healthy = condition == "healthy"
+        treatment = np.where(healthy, "none", rng.choice(TREATMENTS, size=k))
+        responder = rng.random(k) < 0.5
+        response = np.where(healthy, "", np.where(responder, "yes", "no"))
+        age = rng.integers(50, 80, size=k)
+        sex = np.where(rng.random(k) < 0.52, "M", "F")
+        sample_type = rng.choice(sample_types, size=k, p=list(SAMPLE_TYPE_WEIGHTS.values()))
+
+        # One row per (subject, timepoint), truncated at n_samples.
+        row_subj = np.repeat(np.arange(k), per_subject)
+        sample_idx = np.repeat(subj, per_subject) * per_subject + np.tile(np.arange(per_subject), k)
+        keep = sample_idx < n_samples
+        row_subj, sample_idx = row_subj[keep], sample_idx[keep]
+        row_time = tp[sample_idx % per_subject]
+
+        log_counts = levels + rng.normal(0.0, COUNT_SIGMA, size=(len(row_subj), len(populations)))
+        log_counts += np.outer(responder[row_subj] & ~healthy[row_subj], shift)
+        counts = np.exp(log_counts).astype(np.int64)
+
+        rows = []
+        for i, s in enumerate(row_subj.tolist()):
+            rows.append((
+                f"prj{project[s]}",
+                f"sbj{subj[s]:0{subject_width}d}",
+                condition[s],
+                int(age[s]),
+                sex[s],
+                treatment[s],
+                response[s],
+                f"sample{sample_idx[i]:0{sample_width}d}",
+                sample_type[s],
+                int(row_time[i]),
+                *counts[i].tolist(),
+            ))
+        yield rows
+
+
+def _open_out(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "wt", newline="", compresslevel=1)
+    return open(path, "w", newline="")
+
+
+def write_synthetic_csv(
+    out: str,
+    n_samples: int,
+    shards: int = 1,
+    populations: Optional[Sequence[str]] = None,
+    gzip_shards: bool = False,
+    **kwargs,
+) -> List[Path]:
+    """
+    Write n_samples synthetic rows to `out` (a .csv or .csv.gz file), or,
+    with shards > 1, to `shards` files in the directory `out` for
+    app.ingest. Blocks are assigned to shards round-robin, so a subject
+    never spans two files. Returns the written paths.
+    """
+    populations = list(populations or POPULATION_COLUMNS)
+    header = [*METADATA_COLUMNS, *populations]
+    if shards <= 1:
+        paths = [Path(out)]
+    else:
+        suffix = ".csv.gz" if gzip_shards else ".csv"
+        paths = [Path(out) / f"part-{i:04d}{suffix}" for i in range(shards)]
+
+    if len(paths) > 1 and "block_subjects" not in kwargs:
+        # Small outputs: make sure every shard gets at least one block.
+        per_subject = len(kwargs.get("timepoints", DEFAULT_TIMEPOINTS))
+        n_subjects = -(-n_samples // per_subject)
+        kwargs["block_subjects"] = max(1, min(BLOCK_SUBJECTS, -(-n_subjects // len(paths))))
+
+    files = [_open_out(p) for p in paths]
+    try:
+        writers = [csv.writer(f) for f in files]
+        for w in writers:
+            w.writerow(header)
+        for i, rows in enumerate(generate_blocks(n_samples, populations=populations, **kwargs)):
+            writers[i % len(writers)].writerows(rows)
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic cell-count CSVs matching the input schema.")
+    parser.add_argument("--samples", type=int, required=True, help="Number of samples (rows) to generate")
+    parser.add_argument("--out", required=True, help="Output .csv/.csv.gz file, or a directory with --shards")
+    parser.add_argument("--shards", type=int, default=1, help="Split output across this many files in --out")
+    parser.add_argument("--gzip", action="store_true", help="Compress shard files (single files: use a .gz name)")
+    parser.add_argument("--projects", type=int, default=3, help="Number of projects")
+    parser.add_argument(
+        "--populations",
+        default=",".join(POPULATION_COLUMNS),
+        help="Comma-separated population columns",
+    )
+    parser.add_argument(
+        "--timepoints",
+        default=",".join(str(t) for t in DEFAULT_TIMEPOINTS),
+        help="Comma-separated time_from_treatment_start values; one sample per subject each",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    paths = write_synthetic_csv(
+        args.out,
+        args.samples,
+        shards=args.shards,
+        gzip_shards=args.gzip,
+        projects=args.projects,
+        populations=[p.strip() for p in args.populations.split(",") if p.strip()],
+        timepoints=[int(t) for t in args.timepoints.split(",") if t.strip()],
+        seed=args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {args.samples} samples to {len(paths)} file(s) under {args.out} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
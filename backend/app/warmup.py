@@ -0,0 +1,193 @@
+"""
+Startup warmup for freshly started API processes.
+
+After a scale-up the first requests pay for a cold OS page cache, lazy
+imports (scipy.stats), an unstarted stats process pool and an empty
+result cache. run_warmup() does that work once, in the background, right
+after startup:
+
+1. preload: read the database file (and WAL) and the columnar snapshot
+   sequentially, so SQLite's mmap reads and np.load(mmap_mode="r") hit
+   the page cache;
+2. imports: import the modules the API loads lazily;
+3. requests: send WARMUP_URLS through the app in-process (no network),
+   which opens the pool, loads the snapshot, starts the stats workers
+   and primes the result cache with the dashboard's default cohort
+   (melanoma / miraclib / PBMC).
+
+WarmupState records progress for the readiness endpoint. A failed step
+is logged and recorded and the warmup carries on; the process reports
+ready once every step has run ("degraded" if any of them failed).
+"""
+
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+# What the dashboard requests on first load, with its default cohort.
+DEFAULT_WARMUP_URLS = (
+    "/api/v1/meta/filters",
+    "/api/v1/frequency?limit=200",
+    "/api/v1/part3/boxplot?condition=melanoma&treatment=miraclib&sample_type=PBMC",
+    "/api/v1/part3/stats?condition=melanoma&treatment=miraclib&sample_type=PBMC",
+    "/api/v1/part4/summary?condition=melanoma&treatment=miraclib&sample_type=PBMC&time0=0",
+)
+
+# Imported lazily by the request paths (see stats._scipy_stats).
+WARMUP_MODULES = ("scipy.stats",)
+
+PRELOAD_CHUNK = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    """
+    Progress of the warmup: status is "pending", "running", "done" or
+    "degraded" (finished with errors; "disabled" when warmup is turned
+    off), with per-step timings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, status: str = "pending") -> None:
+        with self._lock:
+            self.status = status
+            self.started_at: Optional[float] = None
+            self.finished_at: Optional[float] = None
+            self.steps: dict[str, dict] = {}
+            self.errors: list[str] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("done", "degraded", "disabled")
+
+    def start(self) -> None:
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.perf_counter()
+
+    def record(self, step: str, seconds: float, **details) -> None:
+        with self._lock:
+            self.steps[step] = {"seconds": round(seconds, 4), **details}
+
+    def fail(self, step: str, error: str) -> None:
+        with self._lock:
+            self.errors.append(f"{step}: {error}")
+
+    def finish(self) -> None:
+        with self._lock:
+            self.status = "degraded" if self.errors else "done"
+            self.finished_at = time.perf_counter()
+
+    def stats(self) -> dict:
+        with self._lock:
+            elapsed = None
+            if self.started_at is not None:
+                elapsed = round((self.finished_at or time.perf_counter()) - self.started_at, 4)
+            return {
+                "ready": self.ready,
+                "status": self.status,
+                "seconds": elapsed,
+                "steps": dict(self.steps),
+                "errors": list(self.errors),
+            }
+
+
+def preload_paths(db_path: str, snapshot_dir: Optional[Path]) -> list[Path]:
+    """
+    Files worth having in the page cache: the DB, its WAL, and the
+    snapshot's arrays.
+    """
+    paths = [Path(db_path), Path(f"{db_path}-wal")]
+    if snapshot_dir is not None and snapshot_dir.is_dir():
+        paths.extend(sorted(p for p in snapshot_dir.iterdir() if p.is_file()))
+    return [p for p in paths if p.is_file()]
+
+
+def preload_files(paths: Iterable[Path], chunk_size: int = PRELOAD_CHUNK) -> int:
+    """
+    Read each file once, sequentially, into the OS page cache. Returns the
+    number of bytes read.
+    """
+    total = 0
+    buf = bytearray(chunk_size)
+    for path in paths:
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                total += n
+    return total
+
+
+def import_modules(names: Sequence[str]) -> None:
+    for name in names:
+        importlib.import_module(name)
+
+
+async def run_warmup(
+    app,
+    state: WarmupState,
+    preload: Sequence[Path] = (),
+    modules: Sequence[str] = WARMUP_MODULES,
+    urls: Sequence[str] = DEFAULT_WARMUP_URLS,
+) -> None:
+    """
+    Run the warmup steps against app (an ASGI app) and record them in
+    state. Blocking steps run on a worker thread so the event loop keeps
+    serving health checks meanwhile.
+    """
+    state.start()
+    try:
+        started = time.perf_counter()
+        try:
+            n_bytes = await asyncio.to_thread(preload_files, preload)
+            state.record("preload", time.perf_counter() - started, files=len(preload), bytes=n_bytes)
+        except Exception as exc:
+            _failed(state, "preload", exc)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(import_modules, modules)
+            state.record("imports", time.perf_counter() - started, modules=list(modules))
+        except Exception as exc:
+            _failed(state, "imports", exc)
+
+        try:
+            await _warm_urls(app, state, urls)
+        except Exception as exc:
+            _failed(state, "requests", exc)
+    finally:
+        # Whatever happened above, readiness must not stay pending.
+        state.finish()
+
+
+async def _warm_urls(app, state: WarmupState, urls: Sequence[str]) -> None:
+    import httpx  # only needed here; keeps it out of the API's import time
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for url in urls:
+            started = time.perf_counter()
+            try:
+                resp = await client.get(url)
+                await resp.aread()
+            except Exception as exc:  # keep warming the remaining URLs
+                _failed(state, url, exc)
+                continue
+            state.record(url, time.perf_counter() - started, status=resp.status_code)
+            if resp.status_code >= 400:
+                state.fail(url, f"HTTP {resp.status_code}")
+
+
+def _failed(state: WarmupState, step: str, exc: Exception) -> None:
+    logger.warning("warmup step %s failed", step, exc_info=exc)
+    state.fail(step, f"{type(exc).__name__}: {exc}")
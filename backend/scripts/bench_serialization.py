@@ -0,0 +1,91 @@
+"""
+Benchmark response serialization and compression for the large payloads.
+
+For the part3 frequency rows and a full /frequency listing, compares:
+  - before: FastAPI's default path (jsonable_encoder + JSONResponse)
+  - after:  FastJSONResponse (orjson when installed), as rows and as
+            ?format=columns parallel arrays
+and reports median encode time plus raw / gzip / brotli payload sizes.
+
+Usage (from backend/):
+  python scripts/bench_serialization.py [--repeat 20]
+"""
+
+import argparse
+import gzip
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.db import get_connection  # noqa: E402
+from app.main import DB_PATH, _frequency_query, _part3_frequencies  # noqa: E402
+from app.responses import FastJSONResponse, orjson, to_columns  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def encode_default(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def encode_fast(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def encode_fast_columns(rows) -> bytes:
+    return FastJSONResponse(to_columns(rows)).body
+
+
+def median_ms(fn, arg, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def sizes(body: bytes) -> str:
+    out = f"{len(body) / 1024:9.1f} KB  gzip {len(gzip.compress(body, 6)) / 1024:8.1f} KB"
+    if brotli is not None:
+        out += f"  br {len(brotli.compress(body, quality=4)) / 1024:8.1f} KB"
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = get_connection(DB_PATH)
+    query, params = _frequency_query(None, None)
+    payloads = {
+        "part3/frequencies": _part3_frequencies(conn, "melanoma", "miraclib", "PBMC"),
+        "frequency (all rows)": [dict(r) for r in conn.execute(query, params)],
+    }
+    conn.close()
+
+    print(f"orjson: {'yes' if orjson else 'no (stdlib fallback)'}, brotli: {'yes' if brotli else 'no'}")
+    variants = [
+        ("default", encode_default),
+        ("fast rows", encode_fast),
+        ("fast columns", encode_fast_columns),
+    ]
+    for name, rows in payloads.items():
+        print(f"\n{name}: {len(rows)} rows")
+        for label, fn in variants:
+            ms = median_ms(fn, rows, args.repeat)
+            print(f"  {label:<13} {ms:8.1f} ms  {sizes(fn(rows))}")
+
+
+if __name__ == "__main__":
+    main()
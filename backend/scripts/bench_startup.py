@@ -0,0 +1,156 @@
+"""
+Measure API startup: import time and time to the first fast response.
+
+1. Import: run `import app.main` in --runs fresh interpreters and report
+   the median wall time (plus the slowest modules from -X importtime).
+2. Startup: for WARMUP=0 and WARMUP=1, start uvicorn (as start.sh does)
+   on a free port and record, from process start:
+     - listening: first 200 from /api/v1/health
+     - ready:     first 200 from /api/v1/health/ready
+     - first_fast: end of the dashboard's first-load requests
+                   (app.warmup.DEFAULT_WARMUP_URLS), sent once ready,
+   plus each of those requests' latency.
+
+The OS page cache is shared between runs; pass --drop-caches (Linux,
+root) to drop it before each server start so cold-disk reads are
+included.
+
+Usage (from backend/):
+  python scripts/bench_startup.py
+  python scripts/bench_startup.py --runs 10 --out startup.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+from app.warmup import DEFAULT_WARMUP_URLS  # noqa: E402
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def measure_import(runs: int) -> dict:
+    times = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND, capture_output=True, text=True, check=True
+        )
+        times.append(float(out.stdout.strip()))
+
+    trace = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    ).stderr
+    # Lines are "import time: self | cumulative | <indent>name", children
+    # before their parent; app.main's direct imports are indented by two.
+    top, children = [], []
+    for line in trace.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        name = name[1:]
+        if name.startswith("  ") and not name.startswith("   "):
+            children.append((int(cumulative) / 1e6, name.strip()))
+        elif not name.startswith(" "):
+            if name == "app.main":
+                top = children
+            children = []
+    top.sort(reverse=True)
+    return {
+        "median_s": statistics.median(times),
+        "runs_s": times,
+        "top_level_modules_s": {name: round(seconds, 4) for seconds, name in top[:8]},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _drop_caches() -> None:
+    subprocess.run(["sync"], check=True)
+    Path("/proc/sys/vm/drop_caches").write_text("3\n")
+
+
+def _wait_for(client: httpx.Client, url: str, started: float, timeout: float) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def measure_startup(warmup: bool, drop_caches: bool, timeout: float) -> dict:
+    if drop_caches:
+        _drop_caches()
+    port = _free_port()
+    env = dict(os.environ, WARMUP="1" if warmup else "0")
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            listening = _wait_for(client, "/api/v1/health", started, timeout)
+            ready = _wait_for(client, "/api/v1/health/ready", started, timeout)
+            latencies = {}
+            for url in DEFAULT_WARMUP_URLS:
+                t = time.perf_counter()
+                client.get(url).raise_for_status()
+                latencies[url] = round(time.perf_counter() - t, 4)
+            first_fast = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        "listening_s": round(listening, 4),
+        "ready_s": round(ready, 4),
+        "first_fast_s": round(first_fast, 4),
+        "first_request_s": latencies,
+        "first_requests_total_s": round(sum(latencies.values()), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters for the import measurement")
+    parser.add_argument("--drop-caches", action="store_true", help="Drop the OS page cache before each start (root)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for each server")
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    results = {"import": measure_import(args.runs)}
+    print(f"import app.main: median {results['import']['median_s'] * 1000:.0f} ms over {args.runs} runs")
+    for name, seconds in results["import"]["top_level_modules_s"].items():
+        print(f"  {name:<24} {seconds * 1000:8.1f} ms")
+
+    for warmup in (False, True):
+        label = f"WARMUP={int(warmup)}"
+        r = results[label] = measure_startup(warmup, args.drop_caches, args.timeout)
+        print(
+            f"{label}: listening {r['listening_s']:.2f}s, ready {r['ready_s']:.2f}s, "
+            f"first-load requests {r['first_requests_total_s'] * 1000:.0f} ms, "
+            f"first fast response at {r['first_fast_s']:.2f}s"
+        )
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
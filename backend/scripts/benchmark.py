@@ -0,0 +1,241 @@
+"""
+Benchmark the loader and every /api/v1 endpoint.
+
+1. Data: generate a synthetic CSV (--samples, see app.synthetic), use an
+   existing CSV (--csv), or skip loading and reuse a database (--db
+   without --csv/--samples).
+2. Load: time load_csv_to_db(bulk=True) into a fresh database, including
+   the columnar snapshot.
+3. Endpoints: drive the ASGI app in-process (httpx.ASGITransport, no
+   network) against that database. Each case gets one untimed warm-up
+   request, then --requests requests from --concurrency concurrent
+   clients; p50/p99/mean latency and throughput are recorded. The result
+   cache is disabled unless --warm-cache, so timings reflect real work.
+   GET routes under /api/v1 without an explicit case below are benchmarked
+   with their default parameters, so new endpoints are covered too.
+
+Results are written as JSON (--out). Pass --compare with an earlier file
+to print p50/p99 ratios per case.
+
+Usage (from backend/):
+  python scripts/benchmark.py --samples 1000000 --out bench-1m.json
+  python scripts/benchmark.py --db data/app.db --requests 100 --compare bench-old.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.cache import ResultCache  # noqa: E402
+from app.concurrency import shutdown  # noqa: E402
+from app.load_db import load_csv_to_db  # noqa: E402
+from app.synthetic import write_synthetic_csv  # noqa: E402
+
+# (method, path, query params, JSON body)
+CASES = [
+    ("GET", "/api/v1/health", {}, None),
+    ("GET", "/api/v1/meta/filters", {}, None),
+    ("GET", "/api/v1/frequency", {}, None),
+    ("GET", "/api/v1/frequency", {"format": "ndjson", "limit": 100_000}, None),
+    ("GET", "/api/v1/part3/frequencies", {}, None),
+    ("GET", "/api/v1/part3/frequencies", {"format": "columns"}, None),
+    ("GET", "/api/v1/part3/boxplot", {}, None),
+    ("GET", "/api/v1/part3/stats", {}, None),
+    ("GET", "/api/v1/part3/stats", {"method": "permutation", "n_resamples": 1000}, None),
+    ("POST", "/api/v1/part3/stats/batch", {}, {"cross_product": True}),
+    ("GET", "/api/v1/timecourse", {}, None),
+    ("GET", "/api/v1/part4/summary", {}, None),
+]
+
+
+def all_cases() -> list:
+    covered = {(method, path) for method, path, _, _ in CASES}
+    extra = [
+        ("GET", route.path, {}, None)
+        for route in main.app.routes
+        if route.path.startswith("/api/v1/")
+        and "GET" in getattr(route, "methods", ())
+        and ("GET", route.path) not in covered
+    ]
+    return CASES + extra
+
+
+def case_label(method: str, path: str, params: dict) -> str:
+    return f"{method} {path}" + (f"?{urlencode(params)}" if params else "")
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_load(csv_path: str, db_path: str) -> dict:
+    started = time.perf_counter()
+    stats = load_csv_to_db(csv_path, db_path, replace_db=True, bulk=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "csv": csv_path,
+        "csv_bytes": Path(csv_path).stat().st_size,
+        "rows": stats.rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(stats.rows / max(elapsed, 1e-9), 1),
+        "db_bytes": Path(db_path).stat().st_size,
+    }
+
+
+async def benchmark_case(client: httpx.AsyncClient, case, requests: int, concurrency: int) -> dict:
+    method, path, params, body = case
+
+    async def call() -> tuple[float, int, int]:
+        started = time.perf_counter()
+        resp = await client.request(method, path, params=params, json=body)
+        return time.perf_counter() - started, resp.status_code, len(resp.content)
+
+    _, status, size = await call()
+    if status >= 400:
+        return {"error": f"warm-up returned HTTP {status}"}
+
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            elapsed, code, _ = await call()
+            latencies.append(elapsed)
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "requests_per_sec": round(requests / wall, 2),
+        "response_bytes": size,
+        "status": statuses,
+    }
+
+
+async def benchmark_endpoints(cases, requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for case in cases:
+            label = case_label(case[0], case[1], case[2])
+            results[label] = await benchmark_case(client, case, requests, concurrency)
+            r = results[label]
+            if "error" in r:
+                print(f"  {label}: {r['error']}")
+            else:
+                print(
+                    f"  {label}: p50 {r['p50_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms, "
+                    f"{r['requests_per_sec']:.1f} req/s, {r['response_bytes']:,} B"
+                )
+    return results
+
+
+def compare(new: dict, old_path: str) -> None:
+    old = json.loads(Path(old_path).read_text())
+    print(f"\nCompared with {old_path} (new / old; < 1 is faster):")
+    if new.get("load") and old.get("load"):
+        print(f"  load: {new['load']['seconds'] / old['load']['seconds']:.2f}x")
+    for label, r in new["endpoints"].items():
+        o = old.get("endpoints", {}).get(label)
+        if not o or "error" in r or "error" in o:
+            continue
+        print(f"  {label}: p50 {r['p50_ms'] / o['p50_ms']:.2f}x, p99 {r['p99_ms'] / o['p99_ms']:.2f}x")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    data = parser.add_mutually_exclusive_group()
+    data.add_argument("--samples", type=int, help="Generate a synthetic CSV with this many samples")
+    data.add_argument("--csv", help="Load this CSV instead of generating one")
+    parser.add_argument("--db", help="Database path (default: in --workdir); reused as-is without --samples/--csv")
+    parser.add_argument("--workdir", help="Directory for generated files (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic data seed")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per endpoint case")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent in-process clients")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the result cache enabled")
+    parser.add_argument("--only", help="Only benchmark cases whose label contains this substring")
+    parser.add_argument("--out", default="benchmark.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="cell-counts-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    db_path = args.db or str(workdir / "bench.db")
+
+    load = None
+    csv_path = args.csv
+    if args.samples:
+        csv_path = str(workdir / f"synthetic-{args.samples}.csv")
+        started = time.perf_counter()
+        write_synthetic_csv(csv_path, args.samples, seed=args.seed)
+        print(f"Generated {args.samples} samples in {time.perf_counter() - started:.1f}s -> {csv_path}")
+    if csv_path:
+        load = benchmark_load(csv_path, db_path)
+        print(f"Load: {load['rows']} rows in {load['seconds']:.2f}s ({load['rows_per_sec']:,.0f} rows/sec)")
+    elif not Path(db_path).exists():
+        parser.error("pass --samples or --csv, or --db pointing at an existing database")
+
+    main.DB_PATH = db_path
+    if not args.warm_cache:
+        main.result_cache = ResultCache(maxsize=0)
+
+    cases = [c for c in all_cases() if not args.only or args.only in case_label(c[0], c[1], c[2])]
+    print(f"Endpoints ({args.requests} requests x {args.concurrency} clients, db {db_path}):")
+    try:
+        endpoints = asyncio.run(benchmark_endpoints(cases, args.requests, args.concurrency))
+    finally:
+        shutdown()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "db": db_path,
+            "samples": args.samples,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warm_cache": args.warm_cache,
+        },
+        "load": load,
+        "endpoints": endpoints,
+    }
+    Path(args.out).write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Wrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -10,27 +10,25 @@ NOTE: this does filter to keep only PBMC samples.
 """
 
 import sqlite3
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.cohort import CohortFilter, cohort_cte  # noqa: E402
+
 DB_PATH = Path(__file__).resolve().parents[1] / "data" / "app.db"
 
+COHORT = CohortFilter(condition="melanoma", sex="M", timepoints=0, response="yes")
+
 
 def main() -> None:
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
 
-    sql = """
-    WITH eligible_samples AS (
-      SELECT s.id AS sample_id
-      FROM samples s
-      JOIN subjects subj        ON subj.id = s.subject_id
-      JOIN treatment_courses tc ON tc.id = s.treatment_course_id
-      WHERE
-        subj.condition = 'melanoma'
-        AND subj.sex = 'M'
-        AND s.time_from_treatment_start = 0
-        AND tc.response = 'yes'
-    ),
+    cte, params = cohort_cte(COHORT, "eligible_samples")
+    sql = f"""
+    {cte},
     b_cell AS (
       SELECT id AS population_id
       FROM populations
@@ -46,7 +44,7 @@ def main() -> None:
     AND cc.population_id = b.population_id;
     """
 
-    n_samples, avg_b = cur.execute(sql).fetchone()
+    n_samples, avg_b = cur.execute(sql, params).fetchone()
     conn.close()
 
     print(f"n_samples = {n_samples}")
@@ -54,4 +52,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
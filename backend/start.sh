@@ -2,4 +2,18 @@
 set -e
 
 # Render sets PORT. Locally default to 8000.
-exec uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000}
\ No newline at end of file
+# WEB_CONCURRENCY > 1 runs that many uvicorn worker processes.
+PORT=${PORT:-8000}
+WORKERS=${WEB_CONCURRENCY:-1}
+
+# Serve the current published release (python -m app.releases) when there is
+# one: opened immutable, its pages and snapshot arrays are shared by all
+# workers through the OS page cache, and each worker switches to a newly
+# published release without a restart.
+RELEASES=${DB_RELEASES:-data/releases}
+if [ -z "$DB_PATH" ] && [ -e "$RELEASES/current/app.db" ]; then
+  export DB_PATH="$RELEASES/current/app.db"
+  export DB_IMMUTABLE=${DB_IMMUTABLE:-1}
+fi
+
+exec uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --workers "$WORKERS"
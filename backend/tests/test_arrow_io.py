@@ -0,0 +1,108 @@
+import csv
+import sqlite3
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app import arrow_io
+from app.load_db import load_csv_to_db, resolve_populations
+
+client = TestClient(main.app)
+
+CSV_PATH = str(Path(__file__).resolve().parents[2] / "data" / "cell-count.csv")
+
+TABLES = ["projects", "subjects", "treatment_courses", "samples", "populations", "cell_counts", "sample_frequencies"]
+
+INT_COLUMNS = {"age", "time_from_treatment_start", "b_cell", "cd8_t_cell", "cd4_t_cell", "nk_cell", "monocyte"}
+
+
+def dump(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {t: conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall() for t in TABLES}
+    finally:
+        conn.close()
+
+
+def typed_columns():
+    """The bundled CSV as {column: values}, with numeric columns as ints."""
+    with open(CSV_PATH, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return {
+        name: [int(r[name]) if name in INT_COLUMNS else r[name] for r in rows]
+        for name in rows[0]
+    }
+
+
+def test_typed_rows_discover_populations():
+    rows = [{"project": "p", "b_cell": 0, "t_reg": None, "note": "x"}, {"b_cell": 12.0, "t_reg": 3}]
+    fieldnames = ["project", "subject", "condition", "age", "sex", "treatment", "response",
+                  "sample", "sample_type", "time_from_treatment_start", "b_cell", "t_reg", "note"]
+    assert resolve_populations(fieldnames, rows) == ["b_cell", "t_reg"]
+
+
+def test_export_without_pyarrow_is_501(monkeypatch):
+    monkeypatch.setattr(arrow_io, "available", lambda: False)
+    resp = client.get("/api/v1/export?format=parquet")
+    assert resp.status_code == 501
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_arrow_input_matches_csv(tmp_path, suffix):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    table = pa.table(typed_columns())
+    path = tmp_path / f"cell-count{suffix}"
+    if suffix == ".parquet":
+        # Several row groups, read back in smaller batches.
+        pq.write_table(table, path, row_group_size=1000)
+    else:
+        with ipc.new_file(str(path), table.schema) as writer:
+            writer.write_table(table, max_chunksize=1000)
+
+    csv_db = str(tmp_path / "csv.db")
+    arrow_db = str(tmp_path / "arrow.db")
+    load_csv_to_db(CSV_PATH, csv_db, replace_db=True, bulk=True, snapshot=False)
+    stats = load_csv_to_db(str(path), arrow_db, replace_db=True, bulk=True, batch_size=700, snapshot=False)
+
+    assert stats.rows == table.num_rows
+    assert dump(arrow_db) == dump(csv_db)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_export_matches_frequency_table(fmt):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    url = "/api/v1/export?condition=melanoma&sample_type=PBMC&treatment=miraclib&treatment=phauximab"
+    resp = client.get(f"{url}&format={fmt}")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == arrow_io.EXPORT_FORMATS[fmt][0]
+
+    source = pa.BufferReader(resp.content)
+    table = ipc.open_stream(source).read_all() if fmt == "arrow" else pq.read_table(source)
+    assert table.column_names == [name for name, _ in main.EXPORT_COLUMNS]
+
+    conn = sqlite3.connect(main.DB_PATH)
+    try:
+        expected = conn.execute(
+            """
+            SELECT s.sample_code, p.name, sf.count, sf.percentage
+            FROM samples s
+            JOIN subjects subj ON subj.id = s.subject_id
+            JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+            JOIN sample_frequencies sf ON sf.sample_id = s.id
+            JOIN populations p ON p.id = sf.population_id
+            WHERE subj.condition = 'melanoma' AND s.sample_type = 'PBMC'
+              AND tc.treatment IN ('miraclib', 'phauximab')
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+    got = zip(*(table.column(c).to_pylist() for c in ("sample", "population", "count", "percentage")))
+    assert sorted(got) == sorted(expected)
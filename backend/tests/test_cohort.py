@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+from app.cohort import CohortFilter, _cohort_sql, cohort_cte
+from app.main import DB_PATH
+from app.snapshot import load_snapshot
+
+def cohort_sample_ids(cohort):
+    cte, params = cohort_cte(cohort)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return sorted(r[0] for r in conn.execute(f"{cte} SELECT sample_id FROM cohort", params))
+    finally:
+        conn.close()
+
+def test_sql_text_is_cached_per_shape():
+    a_sql, a_params = cohort_cte(CohortFilter(condition="melanoma", timepoints=(0, 7)))
+    b_sql, b_params = cohort_cte(CohortFilter(condition="carcinoma", timepoints=(7, 14)))
+    assert a_sql == b_sql
+    assert a_params != b_params
+    assert cohort_cte(CohortFilter(condition="melanoma", timepoints=0))[0] != a_sql
+
+    hits = _cohort_sql.cache_info().hits
+    cohort_cte(CohortFilter(condition="healthy", timepoints=(0, 14)))
+    assert _cohort_sql.cache_info().hits == hits + 1
+
+def test_values_are_normalized():
+    params = CohortFilter(condition=" Melanoma ", sex="m", response="YES").params()
+    assert params == {"cohort_condition_0": "Melanoma", "cohort_sex_0": "M", "cohort_response_0": "yes"}
+
+@pytest.mark.parametrize("cohort", [
+    CohortFilter(),
+    CohortFilter(condition="MELANOMA", treatment="miraclib", sample_type="pbmc", response=("yes", "no")),
+    CohortFilter(project="PRJ1", sex="f", timepoints=(0, 14)),
+    CohortFilter(condition=("melanoma", "carcinoma"), age_min=60, age_max=70),
+    CohortFilter(response="no", sample_type="WB", timepoints=7),
+    CohortFilter(condition=()),
+])
+def test_sql_and_snapshot_select_same_samples(cohort):
+    ids = cohort_sample_ids(cohort)
+    snap = load_snapshot(DB_PATH)
+    assert snap.arrays["sample_ids"][snap.mask(cohort)].tolist() == ids
+
+def test_filters_narrow_the_cohort():
+    everyone = cohort_sample_ids(CohortFilter())
+    males = cohort_sample_ids(CohortFilter(sex="M"))
+    older_males = cohort_sample_ids(CohortFilter(sex="M", age_min=65))
+
+    assert 0 < len(older_males) < len(males) < len(everyone)
+    assert set(older_males) <= set(males)
+    assert cohort_sample_ids(CohortFilter(condition=())) == []
@@ -0,0 +1,259 @@
+import csv
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.compact import migrate_to_compact
+from app.db import get_connection, init_schema, storage_mode
+from app.load_db import load_csv_to_db
+
+client = TestClient(main.app)
+
+CSV_PATH = str(Path(__file__).resolve().parents[2] / "data" / "cell-count.csv")
+
+TABLES = [
+    "projects",
+    "subjects",
+    "treatment_courses",
+    "samples",
+    "populations",
+    "cell_counts",
+    "sample_frequencies",
+    "sample_hashes",
+    "cohort_cube",
+    "db_meta",
+]
+
+
+def dump(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {t: conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall() for t in TABLES}
+    finally:
+        conn.close()
+
+
+def write_rows(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture(scope="module")
+def standard_db(tmp_path_factory):
+    db = str(tmp_path_factory.mktemp("standard") / "app.db")
+    load_csv_to_db(CSV_PATH, db, replace_db=True, bulk=True, snapshot=False)
+    return db
+
+
+def test_compact_load_matches_standard(tmp_path, standard_db):
+    db = str(tmp_path / "compact.db")
+    load_csv_to_db(CSV_PATH, db, replace_db=True, bulk=True, snapshot=False, storage="compact")
+
+    conn = sqlite3.connect(db)
+    assert storage_mode(conn) == "compact"
+    conn.close()
+    # Separate loads: same rows, but each database gets its own data_version.
+    compact, standard = dump(db), dump(standard_db)
+    assert compact.pop("db_meta") != standard.pop("db_meta")
+    assert compact == standard
+
+
+def test_migrate_to_compact_preserves_rows_and_shrinks(tmp_path, standard_db):
+    src = tmp_path / "app.db"
+    shutil.copy(standard_db, src)
+    dst = migrate_to_compact(str(src), str(tmp_path / "compact.db"))
+
+    assert dump(str(dst)) == dump(standard_db)
+    assert dst.stat().st_size < 0.8 * src.stat().st_size
+    assert (tmp_path / "compact.snapshot" / "meta.json").exists()
+
+    # Later incremental loads behave the same on either layout.
+    with open(CSV_PATH, newline="") as f:
+        rows = list(csv.DictReader(f))
+    delta = tmp_path / "delta.csv"
+    write_rows(delta, [dict(rows[0], b_cell="1"), dict(rows[1], sample="sample_new", treatment="phauximab")])
+    for db in (src, dst):
+        load_csv_to_db(str(delta), str(db), incremental=True, snapshot=False)
+    assert dump(str(dst)) == dump(str(src))
+
+
+def test_compact_keeps_first_spelling(tmp_path):
+    with open(CSV_PATH, newline="") as f:
+        rows = [dict(r, sample_type="PBMC") for r in list(csv.DictReader(f))[:6]]
+    rows[3]["sample_type"] = "pbmc"
+    path = tmp_path / "mixed.csv"
+    write_rows(path, rows)
+
+    db = str(tmp_path / "compact.db")
+    load_csv_to_db(str(path), db, replace_db=True, snapshot=False, storage="compact")
+    conn = sqlite3.connect(db)
+    try:
+        assert conn.execute("SELECT DISTINCT sample_type FROM samples").fetchall() == [("PBMC",)]
+        assert conn.execute("SELECT COUNT(*) FROM samples WHERE sample_type = 'Pbmc'").fetchone()[0] == 6
+    finally:
+        conn.close()
+
+
+def test_init_schema_refuses_other_layout(tmp_path, standard_db):
+    conn = get_connection(standard_db)
+    try:
+        with pytest.raises(ValueError, match="standard storage"):
+            init_schema(conn, storage="compact")
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/frequency?limit=500",
+    "/api/v1/meta/filters",
+    "/api/v1/part3/frequencies?condition=MELANOMA&treatment=Miraclib&sample_type=pbmc",
+    "/api/v1/part3/stats",
+    "/api/v1/timecourse",
+    "/api/v1/part4/summary",
+    "/api/v1/cube?group_by=treatment&group_by=sample_type",
+])
+def test_api_on_compact_matches_standard(monkeypatch, tmp_path, standard_db, url):
+    compact_db = str(tmp_path / "compact.db")
+    migrate_to_compact(standard_db, compact_db, snapshot=False)
+
+    monkeypatch.setattr(main, "USE_SNAPSHOT", False)
+    monkeypatch.setattr(main, "USE_CUBE", False)
+    # Opening a pool resets the snapshot globals; restore them afterwards.
+    for name in ("_snapshot", "_snapshot_version", "_snapshot_db_path"):
+        monkeypatch.setattr(main, name, None)
+    results = []
+    for db in (standard_db, compact_db):
+        monkeypatch.setattr(main, "DB_PATH", db)
+        monkeypatch.setattr(main, "_pool", None)
+        main.result_cache.clear()
+        try:
+            resp = client.get(url)
+        finally:
+            main.get_pool().close()
+        assert resp.status_code == 200
+        results.append(resp.json())
+    main.result_cache.clear()
+    assert results[0] == results[1]
+
+
+# Schema of databases written before the derived tables and NOCASE
+# columns existed.
+BASELINE_SCHEMA = """
+CREATE TABLE projects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+CREATE TABLE subjects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_code TEXT NOT NULL,
+    project_id INTEGER NOT NULL,
+    condition TEXT NOT NULL,
+    age INTEGER,
+    sex TEXT CHECK (sex IN ('M','F')),
+    UNIQUE(subject_code, project_id)
+);
+CREATE TABLE treatment_courses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject_id INTEGER NOT NULL,
+    treatment TEXT NOT NULL,
+    response TEXT CHECK (response IN ('yes','no')),
+    UNIQUE(subject_id, treatment)
+);
+CREATE TABLE samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sample_code TEXT NOT NULL UNIQUE,
+    subject_id INTEGER NOT NULL,
+    treatment_course_id INTEGER NOT NULL,
+    sample_type TEXT NOT NULL,
+    time_from_treatment_start INTEGER NOT NULL
+);
+CREATE TABLE populations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+CREATE TABLE cell_counts (
+    sample_id INTEGER NOT NULL,
+    population_id INTEGER NOT NULL,
+    count INTEGER NOT NULL CHECK (count >= 0),
+    PRIMARY KEY (sample_id, population_id)
+);
+"""
+
+
+@pytest.fixture
+def baseline_db(tmp_path, standard_db):
+    db = tmp_path / "baseline.db"
+    conn = sqlite3.connect(db)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("ATTACH DATABASE ? AS src", (standard_db,))
+    for table in ("projects", "subjects", "treatment_courses", "samples", "populations", "cell_counts"):
+        conn.execute(f"INSERT INTO {table} SELECT * FROM src.{table}")
+    # Later rows spelled in another case, as a case-sensitive schema allowed.
+    for table, column, fold in (
+        ("subjects", "condition", "upper"),
+        ("treatment_courses", "treatment", "upper"),
+        ("samples", "sample_type", "lower"),
+    ):
+        conn.execute(
+            f"""
+            UPDATE {table} SET {column} = {fold}({column})
+            WHERE id % 3 = 1 AND id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {column})
+            """
+        )
+    conn.commit()
+    conn.close()
+    return db
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/meta/filters",
+    "/api/v1/part3/frequencies?condition=melanoma&treatment=miraclib&sample_type=PBMC",
+    "/api/v1/part3/stats",
+    "/api/v1/part4/summary",
+    "/api/v1/cube?group_by=condition&group_by=treatment&group_by=sample_type",
+])
+def test_migrate_baseline_schema_db(monkeypatch, tmp_path, standard_db, baseline_db, url):
+    compact_db = str(tmp_path / "compact.db")
+    migrate_to_compact(str(baseline_db), compact_db, snapshot=False)
+
+    conn = sqlite3.connect(compact_db)
+    try:
+        for table in ("sample_frequencies", "cohort_cube"):
+            assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] > 0
+        assert conn.execute("SELECT value FROM dict_sample_type ORDER BY code").fetchall() == [("PBMC",), ("WB",)]
+    finally:
+        conn.close()
+
+    monkeypatch.setattr(main, "USE_SNAPSHOT", False)
+    # Opening a pool resets the snapshot globals; restore them afterwards.
+    for name in ("_snapshot", "_snapshot_version", "_snapshot_db_path"):
+        monkeypatch.setattr(main, name, None)
+    results = []
+    for db in (standard_db, compact_db):
+        monkeypatch.setattr(main, "DB_PATH", db)
+        monkeypatch.setattr(main, "_pool", None)
+        main.result_cache.clear()
+        try:
+            resp = client.get(url)
+        finally:
+            main.get_pool().close()
+        assert resp.status_code == 200
+        results.append(resp.json())
+    main.result_cache.clear()
+    assert results[0] == results[1]
+
+
+def test_migrate_refuses_courses_differing_in_case(tmp_path, baseline_db):
+    conn = sqlite3.connect(baseline_db)
+    conn.execute(
+        """
+        INSERT INTO treatment_courses(subject_id, treatment, response)
+        SELECT subject_id, upper(treatment), response FROM treatment_courses WHERE id = 1
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(ValueError, match="differing only in case"):
+        migrate_to_compact(str(baseline_db), str(tmp_path / "compact.db"), snapshot=False)
+    assert not (tmp_path / "compact.db").exists()
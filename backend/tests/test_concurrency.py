@@ -0,0 +1,73 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from app.concurrency import EndpointLimit, iterate_in
+from app.main import LIMITS, app
+
+client = TestClient(app)
+
+def test_concurrency_stats_structure():
+    resp = client.get("/api/v1/health/concurrency")
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["db_workers"] >= 1
+    assert set(data["limits"]) == set(LIMITS)
+    for stats in data["limits"].values():
+        assert set(stats) == {"limit", "running", "waiting", "total"}
+
+def test_requests_count_against_their_class():
+    before = client.get("/api/v1/health/concurrency").json()["limits"]
+    client.get("/api/v1/part3/stats")
+    client.get("/api/v1/meta/filters")
+    client.get("/api/v1/health")
+    after = client.get("/api/v1/health/concurrency").json()["limits"]
+
+    assert after["stats"]["total"] == before["stats"]["total"] + 1
+    assert after["light"]["total"] == before["light"]["total"] + 1
+    assert after["query"]["total"] == before["query"]["total"]
+    assert all(s["running"] == 0 and s["waiting"] == 0 for s in after.values())
+
+def test_endpoint_limit_queues_excess_requests():
+    limit = EndpointLimit("test", 1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limit.slot():
+                await release.wait()
+
+        first = asyncio.create_task(hold())
+        second = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        snapshot = limit.stats()
+        release.set()
+        await asyncio.gather(first, second)
+        return snapshot
+
+    during = asyncio.run(scenario())
+    assert during["running"] == 1
+    assert during["waiting"] == 1
+    assert limit.stats() == {"limit": 1, "running": 0, "waiting": 0, "total": 2}
+
+def test_iterate_in_closes_abandoned_iterator():
+    closed = []
+
+    def numbers():
+        try:
+            yield from range(100)
+        finally:
+            closed.append(True)
+
+    async def take_two():
+        with ThreadPoolExecutor(1) as executor:
+            chunks = iterate_in(executor, numbers())
+            out = [await anext(chunks), await anext(chunks)]
+            await chunks.aclose()
+            return out
+
+    assert asyncio.run(take_two()) == [0, 1]
+    assert closed == [True]
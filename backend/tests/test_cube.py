@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+client = TestClient(main.app)
+
+def fetch(monkeypatch, use_cube, url, **kwargs):
+    monkeypatch.setattr(main, "USE_CUBE", use_cube)
+    main.result_cache.clear()
+    resp = client.get(url, **kwargs)
+    assert resp.status_code == 200
+    return resp.json()
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"condition": "MELANOMA", "treatment": "Miraclib", "sample_type": "pbmc", "time0": 0},
+    {"condition": "carcinoma", "treatment": "phauximab", "sample_type": "WB", "time0": 7},
+    {"condition": "healthy", "treatment": "none", "sample_type": "PBMC", "time0": 14},
+    {"condition": "unknown"},
+])
+def test_part4_cube_matches_sql(monkeypatch, params):
+    via_sql = fetch(monkeypatch, False, "/api/v1/part4/summary", params=params)
+    via_cube = fetch(monkeypatch, True, "/api/v1/part4/summary", params=params)
+    assert via_cube == via_sql
+
+def test_cube_rollup_matches_direct_counts():
+    main.result_cache.clear()
+    rows = client.get(
+        "/api/v1/cube",
+        params={"group_by": ["treatment", "timepoint"], "condition": "Melanoma", "sample_type": "pbmc"},
+    ).json()
+
+    conn = sqlite3.connect(main.DB_PATH)
+    expected = conn.execute(
+        """
+        SELECT tc.treatment, s.time_from_treatment_start, COUNT(*), COUNT(DISTINCT s.subject_id)
+        FROM samples s
+        JOIN subjects subj ON subj.id = s.subject_id
+        JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+        WHERE subj.condition = 'melanoma' AND s.sample_type = 'PBMC'
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        """
+    ).fetchall()
+    conn.close()
+
+    assert [(r["treatment"], r["timepoint"], r["n_samples"], r["n_subjects"]) for r in rows] == expected
+
+def test_cube_withholds_inexact_subject_counts():
+    main.result_cache.clear()
+    [total] = client.get("/api/v1/cube", params={"group_by": ["condition"], "condition": "melanoma"}).json()
+    assert total["n_samples"] > 0
+    # Subjects have samples at several timepoints, so they cannot be summed.
+    assert total["n_subjects"] is None
+
+    resp = client.get("/api/v1/cube", params={"group_by": "age"})
+    assert resp.status_code == 422
+
+@pytest.mark.parametrize("storage", [None, "compact"])
+def test_incremental_load_refreshes_only_new_cells(tmp_path, storage):
+    import csv
+    from pathlib import Path
+
+    from app.cube import refresh_cohort_cube
+    from app.db import get_connection
+    from app.load_db import load_csv_to_db
+
+    csv_path = Path(__file__).resolve().parents[2] / "data" / "cell-count.csv"
+    with open(csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    base_csv, delta_csv = tmp_path / "base.csv", tmp_path / "delta.csv"
+    for path, part in ((base_csv, rows[:5000]), (delta_csv, rows[4990:5200])):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(part)
+    # A new sample in a new case spelling of an existing cell, and one in a new cell.
+    with open(delta_csv, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writerow(dict(rows[0], sample="sample_upper", sample_type=rows[0]["sample_type"].lower()))
+        writer.writerow(dict(rows[0], sample="sample_late", time_from_treatment_start="99"))
+
+    db = str(tmp_path / "app.db")
+    load_csv_to_db(str(base_csv), db, replace_db=True, bulk=True, storage=storage, snapshot=False)
+    load_csv_to_db(str(delta_csv), db, incremental=True, snapshot=False)
+
+    conn = get_connection(db)
+    try:
+        cube_sql = "SELECT * FROM cohort_cube ORDER BY condition, treatment, sample_type, time, project, response, sex"
+        incremental = [tuple(r) for r in conn.execute(cube_sql)]
+        refresh_cohort_cube(conn)
+        rebuilt = [tuple(r) for r in conn.execute(cube_sql)]
+    finally:
+        conn.rollback()
+        conn.close()
+    assert incremental == rebuilt
+    assert sum(r[7] for r in incremental) == 5202
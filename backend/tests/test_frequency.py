@@ -81,4 +81,51 @@ def test_frequency_limit_respected():
     assert resp.status_code == 200
 
     rows = resp.json()
-    assert len(rows) <= 5
\ No newline at end of file
+    assert len(rows) <= 5
+
+
+def test_frequency_keyset_pages_match_single_query():
+    full = client.get("/api/v1/frequency?limit=25").json()
+
+    pages = []
+    cursor = None
+    while len(pages) < len(full):
+        url = "/api/v1/frequency?limit=10"
+        if cursor:
+            url += f"&cursor={cursor}"
+        resp = client.get(url)
+        assert resp.status_code == 200
+        pages.extend(resp.json())
+        cursor = resp.headers["X-Next-Cursor"]
+
+    assert pages[:25] == full
+
+
+def test_frequency_invalid_cursor():
+    resp = client.get("/api/v1/frequency?cursor=not-a-cursor")
+    assert resp.status_code == 400
+
+
+def test_frequency_ndjson_stream():
+    import json
+
+    resp = client.get("/api/v1/frequency?format=ndjson&limit=12")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert rows == client.get("/api/v1/frequency?limit=12").json()
+
+
+def test_frequency_csv_stream_exports_all_rows():
+    import csv
+    import io
+
+    resp = client.get("/api/v1/frequency?format=csv")
+    assert resp.status_code == 200
+
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert set(rows[0].keys()) == {"sample", "total_count", "population", "count", "percentage"}
+    # Every sample has one row per population.
+    assert len(rows) % 5 == 0
+    assert len(rows) > 200
@@ -0,0 +1,128 @@
+import csv
+import gzip
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from app.ingest import expand_inputs, ingest
+from app.load_db import load_csv_to_db
+from app.synthetic import write_synthetic_csv
+
+CSV_PATH = str(Path(__file__).resolve().parents[2] / "data" / "cell-count.csv")
+
+COUNTS_SQL = """
+SELECT s.sample_code, subj.subject_code, tc.treatment, p.name, cc.count
+FROM cell_counts cc
+JOIN samples s ON s.id = cc.sample_id
+JOIN subjects subj ON subj.id = s.subject_id
+JOIN treatment_courses tc ON tc.id = s.treatment_course_id
+JOIN populations p ON p.id = cc.population_id
+ORDER BY 1, 4
+"""
+
+
+def shard_by_project(out_dir):
+    with open(CSV_PATH, newline="") as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    by_project = {}
+    for r in rows:
+        by_project.setdefault(r["project"], []).append(r)
+
+    for i, (project, shard) in enumerate(sorted(by_project.items())):
+        # Mix plain and gzip-compressed shards.
+        path = out_dir / (f"{project}.csv.gz" if i % 2 else f"{project}.csv")
+        opener = gzip.open if i % 2 else open
+        with opener(path, "wt", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(shard)
+    return len(by_project)
+
+
+def fetch_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(COUNTS_SQL).fetchall()
+    finally:
+        conn.close()
+
+
+def test_expand_inputs_directory_and_glob(tmp_path):
+    n_files = shard_by_project(tmp_path)
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert len(expand_inputs([str(tmp_path)])) == n_files
+    assert len(expand_inputs([str(tmp_path / "*.csv.gz")])) == n_files // 2
+
+
+def test_parallel_ingest_matches_single_file_load(tmp_path):
+    shards = tmp_path / "shards"
+    shards.mkdir()
+    shard_by_project(shards)
+
+    single_db = str(tmp_path / "single.db")
+    parallel_db = str(tmp_path / "parallel.db")
+    load_csv_to_db(CSV_PATH, single_db, replace_db=True)
+    stats = ingest([str(shards)], parallel_db, replace_db=True, workers=2, batch_size=500)
+
+    assert stats.rows == 10500
+    assert fetch_counts(parallel_db) == fetch_counts(single_db)
+
+
+def test_parallel_incremental_skips_ingested_files(tmp_path):
+    shard_by_project(tmp_path)
+    db = str(tmp_path / "app.db")
+
+    ingest([str(tmp_path)], db, replace_db=True, incremental=True, workers=2)
+    stats = ingest([str(tmp_path)], db, incremental=True, workers=2)
+
+    assert stats.rows == 0
+
+
+def test_parallel_ingest_reports_bad_file(tmp_path):
+    (tmp_path / "bad.csv").write_text("project,subject\nprj1,sbj1\n")
+
+    with pytest.raises(ValueError, match="missing required columns"):
+        ingest([str(tmp_path)], str(tmp_path / "app.db"), workers=1)
+
+
+def test_parallel_ingest_wide_panel(tmp_path):
+    populations = [f"pop_{i:03d}" for i in range(40)]
+    write_synthetic_csv(str(tmp_path / "shards"), 300, shards=3, populations=populations, seed=3)
+    db = str(tmp_path / "app.db")
+
+    stats = ingest([str(tmp_path / "shards")], db, workers=2)
+
+    conn = sqlite3.connect(db)
+    names = [r[0] for r in conn.execute("SELECT name FROM populations ORDER BY id")]
+    n_counts, n_freqs = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM cell_counts), (SELECT COUNT(*) FROM sample_frequencies)"
+    ).fetchone()
+    conn.close()
+    assert stats.rows == 300
+    assert names == populations
+    assert n_counts == n_freqs == 300 * 40
+
+
+def test_parallel_ingest_parquet_shard(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import pyarrow.csv as pacsv
+
+    shards = tmp_path / "shards"
+    shards.mkdir()
+    shard_by_project(shards)
+    # Replace the first CSV shard with its Parquet equivalent.
+    first = sorted(shards.glob("*.csv"))[0]
+    pq.write_table(pacsv.read_csv(first), first.with_suffix(".parquet"), row_group_size=256)
+    first.unlink()
+
+    single_db = str(tmp_path / "single.db")
+    parallel_db = str(tmp_path / "parallel.db")
+    load_csv_to_db(CSV_PATH, single_db, replace_db=True)
+    ingest([str(shards)], parallel_db, replace_db=True, workers=2, batch_size=500)
+
+    assert fetch_counts(parallel_db) == fetch_counts(single_db)
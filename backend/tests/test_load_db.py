@@ -0,0 +1,307 @@
+import csv
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from app.load_db import load_csv_to_db, load_population_config
+
+CSV_PATH = str(Path(__file__).resolve().parents[2] / "data" / "cell-count.csv")
+
+TABLES = [
+    "projects",
+    "subjects",
+    "treatment_courses",
+    "samples",
+    "populations",
+    "cell_counts",
+    "sample_frequencies",
+    "sqlite_sequence",
+]
+
+
+def dump(db_path, tables=TABLES):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {t: conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall() for t in tables}
+    finally:
+        conn.close()
+
+
+def test_bulk_load_matches_row_loader(tmp_path):
+    rows_db = str(tmp_path / "rows.db")
+    bulk_db = str(tmp_path / "bulk.db")
+
+    n_rows = load_csv_to_db(CSV_PATH, rows_db, replace_db=True)
+    n_bulk = load_csv_to_db(CSV_PATH, bulk_db, replace_db=True, bulk=True, batch_size=1000)
+
+    assert n_rows.rows == n_bulk.rows > 0
+    assert dump(rows_db) == dump(bulk_db)
+
+
+def test_bulk_reload_matches_row_loader(tmp_path):
+    rows_db = str(tmp_path / "rows.db")
+    bulk_db = str(tmp_path / "bulk.db")
+
+    for _ in range(2):
+        load_csv_to_db(CSV_PATH, rows_db)
+        load_csv_to_db(CSV_PATH, bulk_db, bulk=True)
+
+    # INSERT OR IGNORE burns AUTOINCREMENT values in the row loader, so
+    # compare table contents rather than sqlite_sequence here.
+    tables = [t for t in TABLES if t != "sqlite_sequence"]
+    assert dump(rows_db, tables) == dump(bulk_db, tables)
+
+
+def test_bulk_load_creates_indexes(tmp_path):
+    db = str(tmp_path / "bulk.db")
+    load_csv_to_db(CSV_PATH, db, replace_db=True, bulk=True)
+
+    conn = sqlite3.connect(db)
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+
+    assert "idx_subjects_condition" in names
+    assert "idx_samples_type_time" in names
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv_rows():
+    with open(CSV_PATH, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_incremental_skips_already_ingested_file(tmp_path):
+    db = str(tmp_path / "inc.db")
+    load_csv_to_db(CSV_PATH, db, replace_db=True, incremental=True)
+
+    stats = load_csv_to_db(CSV_PATH, db, incremental=True)
+
+    assert stats.skipped_file
+    assert stats.rows == 0
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"bulk": True}])
+def test_incremental_after_full_load_sees_no_changes(tmp_path, kwargs):
+    db = str(tmp_path / "full.db")
+    load_csv_to_db(CSV_PATH, db, replace_db=True, **kwargs)
+
+    conn = sqlite3.connect(db)
+    # Full loads don't hash the file; every sample gets a row hash.
+    assert conn.execute("SELECT COUNT(*) FROM ingested_files").fetchone()[0] == 0
+    n_samples, n_hashes = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM samples), (SELECT COUNT(*) FROM sample_hashes)"
+    ).fetchone()
+    conn.close()
+    assert n_hashes == n_samples
+
+    stats = load_csv_to_db(CSV_PATH, db, incremental=True)
+    assert not stats.skipped_file
+    assert stats.unchanged_samples == n_samples
+    assert stats.changed_samples == stats.new_samples == stats.updated_counts == 0
+
+
+def test_incremental_backfills_missing_row_hashes(tmp_path):
+    rows = read_csv_rows()
+    base_csv = tmp_path / "base.csv"
+    delta_csv = tmp_path / "delta.csv"
+    write_csv(base_csv, rows[:100])
+    write_csv(delta_csv, [dict(rows[0], b_cell="1")] + rows[1:100])
+
+    db = str(tmp_path / "inc.db")
+    load_csv_to_db(str(base_csv), db, replace_db=True)
+    conn = sqlite3.connect(db)
+    # As left by loaders that did not record row hashes.
+    conn.execute("DELETE FROM sample_hashes")
+    conn.commit()
+    conn.close()
+
+    stats = load_csv_to_db(str(delta_csv), db, incremental=True)
+    assert stats.changed_samples == 1
+    assert stats.unchanged_samples == 99
+    assert stats.updated_counts == 1
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM sample_hashes").fetchone()[0] == 100
+    conn.close()
+
+
+def test_incremental_writes_only_the_delta(tmp_path):
+    rows = read_csv_rows()
+    base_csv = tmp_path / "base.csv"
+    delta_csv = tmp_path / "delta.csv"
+    write_csv(base_csv, rows[:1000])
+
+    changed = dict(rows[0], b_cell="1")
+    unchanged = rows[1]
+    new = rows[1000]
+    write_csv(delta_csv, [changed, unchanged, new])
+
+    db = str(tmp_path / "inc.db")
+    load_csv_to_db(str(base_csv), db, replace_db=True, bulk=True)
+    stats = load_csv_to_db(str(delta_csv), db, incremental=True)
+
+    assert stats.rows == 3
+    assert stats.new_samples == 1
+    assert stats.changed_samples == 1
+    assert stats.unchanged_samples == 1
+    assert stats.updated_counts == 1
+
+    # Same end state as a full load of the combined data.
+    full_csv = tmp_path / "full.csv"
+    write_csv(full_csv, [changed] + rows[1:1001])
+    full_db = str(tmp_path / "full.db")
+    load_csv_to_db(str(full_csv), full_db, replace_db=True)
+
+    tables = [t for t in TABLES if t != "sqlite_sequence"]
+    assert dump(db, tables) == dump(full_db, tables)
+
+
+def test_incremental_load_upgrades_database_without_derived_tables(tmp_path):
+    rows = read_csv_rows()
+    base_csv = tmp_path / "base.csv"
+    delta_csv = tmp_path / "delta.csv"
+    write_csv(base_csv, rows[:1000])
+    write_csv(delta_csv, rows[1000:1500])
+
+    db = str(tmp_path / "inc.db")
+    load_csv_to_db(str(base_csv), db, replace_db=True, snapshot=False)
+    conn = sqlite3.connect(db)
+    # As built before these tables existed; init_schema recreates them empty.
+    for table in ("sample_frequencies", "cohort_cube", "sample_hashes", "db_meta"):
+        conn.execute(f"DROP TABLE {table}")
+    conn.commit()
+    conn.close()
+
+    stats = load_csv_to_db(str(delta_csv), db, incremental=True, snapshot=False)
+    assert stats.new_samples == 500
+
+    full_csv = tmp_path / "full.csv"
+    write_csv(full_csv, rows[:1500])
+    full_db = str(tmp_path / "full.db")
+    load_csv_to_db(str(full_csv), full_db, replace_db=True, snapshot=False)
+
+    for table in ("sample_frequencies", "cohort_cube"):
+        assert sorted(dump(db, [table])[table], key=repr) == sorted(dump(full_db, [table])[table], key=repr)
+
+
+@pytest.mark.parametrize("storage", [None, "compact"])
+def test_incremental_applies_changed_response(tmp_path, storage):
+    rows = read_csv_rows()
+    flipped = dict(rows[0], response="no" if rows[0]["response"] == "yes" else "yes")
+    base_csv = tmp_path / "base.csv"
+    delta_csv = tmp_path / "delta.csv"
+    write_csv(base_csv, rows[:100])
+    write_csv(delta_csv, [flipped])
+
+    db = str(tmp_path / "inc.db")
+    load_csv_to_db(str(base_csv), db, replace_db=True, storage=storage)
+    stats = load_csv_to_db(str(delta_csv), db, incremental=True)
+    assert stats.changed_samples == 1
+    assert stats.updated_counts == 0
+
+    # Same end state as a full load with the new response.
+    full_csv = tmp_path / "full.csv"
+    write_csv(full_csv, [flipped] + rows[1:100])
+    full_db = str(tmp_path / "full.db")
+    load_csv_to_db(str(full_csv), full_db, replace_db=True)
+    tables = ["subjects", "treatment_courses", "samples", "sample_frequencies", "sample_hashes"]
+    assert dump(db, tables) == dump(full_db, tables)
+    assert sorted(dump(db, ["cohort_cube"])["cohort_cube"], key=repr) == sorted(
+        dump(full_db, ["cohort_cube"])["cohort_cube"], key=repr
+    )
+
+    # The stored hash now matches the applied edit.
+    rerun_csv = tmp_path / "rerun.csv"
+    write_csv(rerun_csv, [flipped, rows[1]])
+    stats = load_csv_to_db(str(rerun_csv), db, incremental=True)
+    assert stats.unchanged_samples == 2 and stats.changed_samples == 0
+
+
+def test_each_load_bumps_data_version(tmp_path):
+    from app.db import get_data_version
+
+    db = str(tmp_path / "app.db")
+    versions = []
+    for kwargs in ({"replace_db": True}, {"bulk": True}, {"incremental": True}, {"incremental": True}):
+        load_csv_to_db(CSV_PATH, db, **kwargs)
+        conn = sqlite3.connect(db)
+        versions.append(get_data_version(conn))
+        conn.close()
+
+    # The second incremental run skips an already-ingested file and leaves the version alone.
+    first = versions[0]
+    assert versions == [first, first + 1, first + 2, first + 2]
+
+
+def test_discovers_numeric_population_columns(tmp_path):
+    rows = [
+        {**{k: v for k, v in r.items() if k != "monocyte"}, "pop_x": str(i), "notes": "n/a"}
+        for i, r in enumerate(read_csv_rows()[:50])
+    ]
+    rows[0]["pop_x"] = ""
+    path = tmp_path / "wide.csv"
+    write_csv(path, rows)
+
+    db = str(tmp_path / "app.db")
+    load_csv_to_db(str(path), db, replace_db=True, bulk=True)
+
+    conn = sqlite3.connect(db)
+    names = [r[0] for r in conn.execute("SELECT name FROM populations ORDER BY id")]
+    n_counts = conn.execute("SELECT COUNT(*) FROM cell_counts").fetchone()[0]
+    conn.close()
+
+    assert names == ["b_cell", "cd8_t_cell", "cd4_t_cell", "nk_cell", "pop_x"]
+    # The blank pop_x cell is "not measured" rather than zero.
+    assert n_counts == 50 * 5 - 1
+
+
+def test_population_config_selects_columns(tmp_path):
+    config = tmp_path / "panel.json"
+    config.write_text(json.dumps({"populations": ["b_cell", "nk_cell"]}))
+    db = str(tmp_path / "app.db")
+
+    load_csv_to_db(CSV_PATH, db, replace_db=True, bulk=True, populations=load_population_config(str(config)))
+
+    conn = sqlite3.connect(db)
+    names = [r[0] for r in conn.execute("SELECT name FROM populations ORDER BY id")]
+    conn.close()
+    assert names == ["b_cell", "nk_cell"]
+
+    with pytest.raises(ValueError, match="missing required columns.*t_reg"):
+        load_csv_to_db(CSV_PATH, db, replace_db=True, populations=["b_cell", "t_reg"])
+
+
+def test_incremental_blanked_count_is_removed(tmp_path):
+    rows = read_csv_rows()[:10]
+    base_csv = tmp_path / "base.csv"
+    delta_csv = tmp_path / "delta.csv"
+    write_csv(base_csv, rows)
+    write_csv(delta_csv, [dict(rows[0], nk_cell="")])
+
+    db = str(tmp_path / "inc.db")
+    load_csv_to_db(str(base_csv), db, replace_db=True, bulk=True)
+    stats = load_csv_to_db(str(delta_csv), db, incremental=True)
+    assert stats.changed_samples == 1
+    assert stats.updated_counts == 1
+
+    conn = sqlite3.connect(db)
+    remaining = conn.execute(
+        """
+        SELECT p.name FROM cell_counts cc
+        JOIN samples s ON s.id = cc.sample_id
+        JOIN populations p ON p.id = cc.population_id
+        WHERE s.sample_code = ?
+        """,
+        (rows[0]["sample"],),
+    ).fetchall()
+    conn.close()
+    assert "nk_cell" not in {r[0] for r in remaining}
+    assert len(remaining) == 4
@@ -0,0 +1,82 @@
+import logging
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+import app.profiling as profiling
+from app.main import DB_PATH, app
+from app.metrics import SQL_LATENCY, SQL_ROWS, Histogram, render_prometheus
+from app.profiling import ProfilingConnection, query_label
+
+client = TestClient(app)
+
+def test_metrics_exposes_request_and_task_latency():
+    client.get("/api/v1/part3/stats")
+    client.get("/api/v1/no-such-endpoint")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+
+    text = resp.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/part3/stats",status="200"}' in text
+    assert 'route="unmatched",status="404"' in text
+    assert 'executor_task_duration_seconds_count{executor="db",function="part3_stats"}' in text
+    assert 'db_pool_connections{state="idle"}' in text
+    assert 'result_cache_requests_total{outcome="hit"}' in text
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "test", ("k",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 5.0):
+        h.observe(v, "a")
+    samples = {(name, dict(labels).get("le")): value for name, labels, value in h.samples()}
+    assert samples[("t_seconds_bucket", "0.1")] == 1
+    assert samples[("t_seconds_bucket", "1.0")] == 3
+    assert samples[("t_seconds_bucket", "+Inf")] == 4
+    assert samples[("t_seconds_count", None)] == 4
+    assert samples[("t_seconds_sum", None)] == 6.05
+
+def test_render_escapes_label_values():
+    text = render_prometheus({"x": ("gauge", "help", [((("q", 'a "b"\nc'),), 1)])})
+    assert 'x{q="a \\"b\\"\\nc"} 1' in text
+
+def open_profiled() -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, factory=ProfilingConnection)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def rows_for(sql: str) -> float:
+    return next(v for _, labels, v in SQL_ROWS.samples() if labels == (("query", query_label(sql)),))
+
+def test_profiling_connection_records_statements():
+    conn = open_profiled()
+    fetched = conn.execute("SELECT * FROM samples WHERE time_from_treatment_start = ?", (0,)).fetchall()
+    iterated = sum(1 for _ in conn.execute("SELECT * FROM populations"))
+    conn.close()
+
+    assert rows_for("SELECT * FROM samples WHERE time_from_treatment_start = ?") >= len(fetched) > 0
+    assert rows_for("SELECT * FROM populations") >= iterated == 5
+    labels = {dict(labels)["query"] for _, labels, _ in SQL_LATENCY.samples()}
+    assert query_label("SELECT * FROM populations") in labels
+
+def test_query_labels_keep_long_statements_apart():
+    prefix = "SELECT " + "x, " * 100
+    a, b = query_label(prefix + "1 FROM a"), query_label(prefix + "1 FROM b")
+    assert a != b
+    assert len(a) < 150
+
+def test_slow_queries_are_logged_with_plan(monkeypatch, caplog):
+    monkeypatch.setattr(profiling, "SQL_SLOW_MS", 0.0)
+    monkeypatch.setattr(profiling, "SQL_EXPLAIN_SLOW", True)
+    sql = "SELECT COUNT(*) FROM samples WHERE sample_type = ? AND 'test_slow_queries' = 'test_slow_queries'"
+
+    conn = open_profiled()
+    with caplog.at_level(logging.WARNING, logger="app.profiling"):
+        conn.execute(sql, ("PBMC",)).fetchall()
+    conn.close()
+
+    messages = [r.getMessage() for r in caplog.records if "test_slow_queries" in r.getMessage()]
+    assert len(messages) == 1
+    assert "slow query" in messages[0]
+    assert "idx_samples_type_time" in messages[0]
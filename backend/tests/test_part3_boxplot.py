@@ -0,0 +1,47 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def test_part3_boxplot_matches_frequencies():
+    rows = client.get("/api/v1/part3/frequencies").json()
+    resp = client.get("/api/v1/part3/boxplot")
+    assert resp.status_code == 200
+
+    boxes = resp.json()
+    assert len(boxes) == 10
+    for box in boxes:
+        v = np.array([
+            r["percentage"] for r in rows
+            if r["population"] == box["population"] and r["response"] == box["response"]
+        ])
+        q1, median, q3 = np.percentile(v, [25, 50, 75])
+        assert box["n"] == len(v)
+        # frequencies are rounded to 2 decimals, summaries to 3
+        assert abs(box["median"] - median) < 0.01
+        assert abs(box["q1"] - q1) < 0.01
+        assert abs(box["q3"] - q3) < 0.01
+        assert box["min"] <= box["whisker_low"] <= box["q1"] <= box["median"]
+        assert box["median"] <= box["q3"] <= box["whisker_high"] <= box["max"]
+        assert box["n_outliers"] >= len(box["outliers"])
+        assert all(x < box["whisker_low"] or x > box["whisker_high"] for x in box["outliers"])
+
+def test_part3_boxplot_histogram_and_size():
+    plain = client.get("/api/v1/part3/boxplot")
+    assert len(plain.content) < 10_000
+    assert "histogram" not in plain.json()[0]
+
+    boxes = client.get("/api/v1/part3/boxplot", params={"bins": 10}).json()
+    by_population = {}
+    for box in boxes:
+        hist = box["histogram"]
+        assert len(hist["edges"]) == 11
+        assert sum(hist["counts"]) == box["n"]
+        by_population.setdefault(box["population"], []).append(hist["edges"])
+    assert all(a == b for a, b in by_population.values())
+
+def test_part3_boxplot_empty_cohort():
+    resp = client.get("/api/v1/part3/boxplot", params={"condition": "unknown"})
+    assert resp.status_code == 200
+    assert resp.json() == []
@@ -39,4 +39,16 @@ def test_part3_frequencies_percentage_bounds():
     rows = resp.json()
 
     for r in rows:
-        assert 0.0 <= r["percentage"] <= 100.0
\ No newline at end of file
+        assert 0.0 <= r["percentage"] <= 100.0
+
+
+def test_part3_frequencies_filters_are_case_insensitive():
+    lower = client.get(
+        "/api/v1/part3/frequencies?condition=melanoma&treatment=miraclib&sample_type=PBMC"
+    ).json()
+    mixed = client.get(
+        "/api/v1/part3/frequencies?condition=MELANOMA&treatment=Miraclib&sample_type=pbmc"
+    ).json()
+
+    assert len(lower) > 0
+    assert mixed == lower
@@ -70,4 +70,34 @@ def test_part3_stats_significance_consistency():
         assert not (q_sig and not p_sig), (
             f"Inconsistent significance for population {row['population']}: "
             f"p={row['p_value']}, q={row['q_value']}"
-        )
\ No newline at end of file
+        )
+
+
+def test_part3_stats_empty_cohort():
+    resp = client.get("/api/v1/part3/stats?condition=no-such-condition")
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+def test_part3_stats_permutation_method():
+    params = {"method": "permutation", "n_resamples": 1000, "seed": 3}
+    resp = client.get("/api/v1/part3/stats", params=params)
+    assert resp.status_code == 200
+
+    stats = resp.json()
+    assert len(stats) > 0
+    assert all(r["method"] == "permutation" and r["n_resamples"] == 1000 for r in stats)
+    assert client.get("/api/v1/part3/stats", params=params).json() == stats
+
+
+def test_part3_stats_bootstrap_method():
+    resp = client.get("/api/v1/part3/stats", params={"method": "bootstrap", "n_resamples": 1000})
+    assert resp.status_code == 200
+
+    for row in resp.json():
+        assert row["ci_low"] <= row["median_diff"] <= row["ci_high"]
+
+
+def test_part3_stats_rejects_bad_resample_count():
+    resp = client.get("/api/v1/part3/stats", params={"method": "permutation", "n_resamples": 10})
+    assert resp.status_code == 422
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+from app.main import _batch_matrices_sql, app, get_pool
+
+client = TestClient(app)
+
+URL = "/api/v1/part3/stats/batch"
+
+def strip_global(rows):
+    return [{k: v for k, v in r.items() if not k.endswith("_global")} for r in rows]
+
+def test_batch_matches_single_cohort_endpoint():
+    cohorts = [
+        {"condition": "melanoma", "treatment": "miraclib", "sample_type": "PBMC"},
+        {"condition": "carcinoma", "treatment": "phauximab", "sample_type": "WB"},
+    ]
+    resp = client.post(URL, json={"cohorts": cohorts})
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["n_cohorts"] == 2
+
+    for cohort, out in zip(cohorts, data["cohorts"]):
+        single = client.get("/api/v1/part3/stats", params=cohort).json()
+        assert strip_global(out["results"]) == single
+
+def test_batch_global_fdr_consistency():
+    data = client.post(URL, json={"cross_product": True}).json()
+
+    all_results = [r for c in data["cohorts"] for r in c["results"]]
+    assert data["n_tests"] == len(all_results) > 0
+
+    for r in all_results:
+        assert 0.0 <= r["q_value_global"] <= 1.0
+        assert r["q_value_global"] >= r["p_value"]
+        assert r["significant_fdr_0_05_global"] == (r["q_value_global"] < 0.05)
+
+    # BH monotonicity across the whole family of tests.
+    by_p = sorted(all_results, key=lambda r: r["p_value"])
+    qs = [r["q_value_global"] for r in by_p]
+    assert qs == sorted(qs)
+
+def test_batch_cross_product_covers_meta_filters():
+    meta = client.get("/api/v1/meta/filters").json()
+    data = client.post(URL, json={"cross_product": True}).json()
+
+    expected = len(meta["conditions"]) * len(meta["treatments"]) * len(meta["sample_types"])
+    assert data["n_cohorts"] == expected
+
+def test_batch_dedupes_case_variants():
+    cohorts = [
+        {"condition": "melanoma", "treatment": "miraclib", "sample_type": "PBMC"},
+        {"condition": "MELANOMA", "treatment": "Miraclib", "sample_type": "pbmc"},
+    ]
+    data = client.post(URL, json={"cohorts": cohorts}).json()
+    assert data["n_cohorts"] == 1
+
+def test_batch_sql_fallback_with_no_cohorts():
+    with get_pool().connection() as conn:
+        assert _batch_matrices_sql(conn, {}) == {}
+
+def test_batch_requires_cohorts():
+    resp = client.post(URL, json={})
+    assert resp.status_code == 422
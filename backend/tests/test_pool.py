@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import ConnectionPool
+from app.main import DB_PATH, app
+
+client = TestClient(app)
+
+def test_pool_stats_structure():
+    resp = client.get("/api/v1/health/pool")
+    assert resp.status_code == 200
+
+    data = resp.json()
+    expected_keys = {
+        "size",
+        "in_use",
+        "checkouts",
+        "waits",
+        "wait_seconds_total",
+        "max_wait_seconds",
+    }
+    assert set(data.keys()) == expected_keys
+
+def test_pool_checkouts_increase_per_request():
+    before = client.get("/api/v1/health/pool").json()["checkouts"]
+    client.get("/api/v1/frequency?limit=1")
+    client.get("/api/v1/meta/filters")
+    after = client.get("/api/v1/health/pool").json()
+
+    assert after["checkouts"] == before + 2
+    assert after["in_use"] == 0
+
+def test_pool_connections_are_read_only():
+    pool = ConnectionPool(DB_PATH, size=1)
+    try:
+        with pool.connection() as conn:
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("CREATE TABLE should_fail (x INTEGER)")
+    finally:
+        pool.close()
+
+def test_pool_records_waits_and_times_out():
+    pool = ConnectionPool(DB_PATH, size=1, timeout=0.05)
+    try:
+        conn = pool.acquire()
+        with pytest.raises(TimeoutError):
+            pool.acquire()
+        pool.release(conn)
+
+        stats = pool.stats()
+        assert stats["checkouts"] == 1
+        assert stats["in_use"] == 0
+    finally:
+        pool.close()
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.db import ConnectionPool
+
+client = TestClient(main.app)
+
+@pytest.fixture
+def traced_sql(monkeypatch):
+    """
+    Swap in a one-connection pool and capture every statement it runs,
+    with parameters bound, so the plans of the real endpoint SQL can be checked.
+    """
+    pool = ConnectionPool(main.DB_PATH, size=1)
+    statements = []
+    with pool.connection() as conn:
+        conn.set_trace_callback(statements.append)
+    monkeypatch.setattr(main, "_pool", pool)
+    # Force the endpoints to run their SQL rather than answer from cache,
+    # the columnar snapshot or the cohort cube.
+    monkeypatch.setattr(main, "USE_SNAPSHOT", False)
+    monkeypatch.setattr(main, "USE_CUBE", False)
+    main.result_cache.clear()
+    yield statements
+    pool.close()
+
+def query_plan(sql):
+    conn = sqlite3.connect(main.DB_PATH)
+    try:
+        return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/part3/frequencies?condition=MELANOMA&treatment=Miraclib&sample_type=pbmc",
+    "/api/v1/part3/stats?condition=Melanoma&treatment=MIRACLIB&sample_type=PBMC",
+    "/api/v1/part4/summary?condition=melanoma&treatment=miraclib&sample_type=pbmc&time0=0",
+    "/api/v1/timecourse?condition=Melanoma&treatment=miraclib&sample_type=PBMC",
+])
+def test_cohort_filters_use_indexes(traced_sql, url):
+    resp = client.get(url)
+    assert resp.status_code == 200
+
+    cohort_sql = [s for s in traced_sql if "samples" in s and "subj.condition" in s]
+    assert cohort_sql
+
+    for sql in cohort_sql:
+        plan = query_plan(sql)
+        # The driving table is searched through a filter index, not scanned.
+        assert any("USING INDEX idx_" in step for step in plan), plan
+        assert not any(step.startswith("SCAN s") or step.startswith("SCAN subj") for step in plan), plan
+
+def test_part4_cube_lookup_uses_slice_index(traced_sql, monkeypatch):
+    monkeypatch.setattr(main, "USE_CUBE", True)
+    resp = client.get("/api/v1/part4/summary?condition=melanoma&treatment=miraclib&sample_type=pbmc&time0=0")
+    assert resp.status_code == 200
+
+    [cube_sql] = [s for s in traced_sql if "FROM cohort_cube" in s]
+    plan = query_plan(cube_sql)
+    assert any("USING INDEX idx_cohort_cube_slice" in step for step in plan), plan
+    assert not any("samples" in s and "subj.condition" in s for s in traced_sql)
@@ -0,0 +1,205 @@
+import csv
+import gc
+import shutil
+import sqlite3
+import weakref
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.db import ConnectionPool, get_data_version
+from app.load_db import load_csv_to_db
+from app.releases import CURRENT, current_release, list_releases, publish_release
+
+client = TestClient(main.app)
+
+CSV_PATH = str(Path(__file__).resolve().parents[2] / "data" / "cell-count.csv")
+
+
+@pytest.fixture
+def working_db(tmp_path):
+    db = tmp_path / "app.db"
+    shutil.copy(main.DB_PATH, db)
+    return db
+
+
+def sample_csv(db, sample):
+    with open(CSV_PATH, newline="") as f:
+        row = next(csv.DictReader(f))
+    path = db.with_name(f"{sample}.csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        writer.writeheader()
+        writer.writerow(dict(row, sample=sample))
+    return str(path)
+
+
+def add_sample(db, sample):
+    load_csv_to_db(sample_csv(db, sample), str(db), incremental=True, snapshot=False)
+
+
+def version_of(db_path):
+    conn = sqlite3.connect(f"{Path(db_path).as_uri()}?mode=ro", uri=True)
+    try:
+        return get_data_version(conn)
+    finally:
+        conn.close()
+
+
+def test_publish_makes_read_only_current_release(tmp_path, working_db):
+    releases = tmp_path / "releases"
+    release = publish_release(str(working_db), releases)
+
+    assert current_release(releases) == release.resolve()
+    assert (releases / CURRENT).is_symlink()
+    db = release / "app.db"
+    assert (release / "app.snapshot" / "meta.json").exists()
+    assert not db.stat().st_mode & 0o222
+    conn = sqlite3.connect(str(db))
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    finally:
+        conn.close()
+
+
+def test_release_versions_increase_and_old_releases_are_pruned(tmp_path, working_db):
+    releases = tmp_path / "releases"
+    versions = []
+    for _ in range(4):
+        # Same source every time: versions still move forward.
+        release = publish_release(str(working_db), releases, keep=2)
+        versions.append(version_of(release / "app.db"))
+
+    assert versions == sorted(set(versions))
+    assert [p.name for p in list_releases(releases)] == ["000003", "000004"]
+    assert current_release(releases).name == "000004"
+
+
+def test_immutable_pool_reads(tmp_path, working_db):
+    release = publish_release(str(working_db), tmp_path / "releases")
+    pool = ConnectionPool(str(release / "app.db"), size=1, immutable=True)
+    try:
+        with pool.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] > 0
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("CREATE TABLE should_fail (x INTEGER)")
+    finally:
+        pool.close()
+
+
+def test_workers_follow_newly_published_release(monkeypatch, tmp_path, working_db):
+    releases = tmp_path / "releases"
+    publish_release(str(working_db), releases)
+
+    monkeypatch.setattr(main, "DB_PATH", str(releases / CURRENT / "app.db"))
+    monkeypatch.setattr(main, "DB_IMMUTABLE", True)
+    monkeypatch.setattr(main, "DB_RELOAD_INTERVAL", 1e-9)
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    main.result_cache.clear()
+
+    first = client.get("/api/v1/health/db").json()
+    assert first["resolved_path"].endswith("000001/app.db")
+    assert first["immutable"] and first["snapshot"]
+    assert client.get("/api/v1/frequency?limit=100000").status_code == 200
+
+    # A request still running on the old release keeps its connection.
+    old_pool = main.get_pool()
+    in_flight = old_pool.acquire()
+
+    add_sample(working_db, "sample_new")
+    publish_release(str(working_db), releases)
+
+    second = client.get("/api/v1/health/db").json()
+    assert second["resolved_path"].endswith("000002/app.db")
+    assert second["data_version"] > first["data_version"] and second["snapshot"]
+    samples = {r["sample"] for r in client.get("/api/v1/frequency?limit=100000").json()}
+    assert "sample_new" in samples
+
+    assert in_flight.execute("SELECT COUNT(*) FROM samples WHERE sample_code = 'sample_new'").fetchone()[0] == 0
+    old_pool.release(in_flight)
+    ref = weakref.ref(old_pool)
+    del old_pool, in_flight
+    gc.collect()
+    assert ref() is None
+
+    main.get_pool().close()
+    main.result_cache.clear()
+
+
+def test_snapshot_comes_from_the_pools_release(monkeypatch, tmp_path, working_db):
+    releases = tmp_path / "releases"
+    publish_release(str(working_db), releases)
+
+    monkeypatch.setattr(main, "DB_PATH", str(releases / CURRENT / "app.db"))
+    monkeypatch.setattr(main, "DB_IMMUTABLE", True)
+    monkeypatch.setattr(main, "DB_RELOAD_INTERVAL", 3600)
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    main.result_cache.clear()
+    main.get_pool()
+
+    # current moves on before this worker's next reload check: the pool
+    # still serves release 1 and must use release 1's snapshot.
+    publish_release(str(working_db), releases)
+    body = client.get("/api/v1/health/db").json()
+    assert body["resolved_path"].endswith("000001/app.db")
+    assert body["snapshot"]
+
+    main.get_pool().close()
+    main.result_cache.clear()
+
+
+def test_pool_reopens_database_rebuilt_in_place(monkeypatch, tmp_path, working_db):
+    monkeypatch.setattr(main, "DB_PATH", str(working_db))
+    monkeypatch.setattr(main, "DB_RELOAD_INTERVAL", 1e-9)
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    main.result_cache.clear()
+
+    assert len(client.get("/api/v1/frequency?limit=100000").json()) > 1
+    old_pool = main.get_pool()
+
+    # load_db --replace: a new file at the same path.
+    load_csv_to_db(sample_csv(working_db, "only_sample"), str(working_db), replace_db=True)
+
+    samples = {r["sample"] for r in client.get("/api/v1/frequency?limit=100000").json()}
+    assert samples == {"only_sample"}
+    assert main.get_pool() is not old_pool
+
+    old_pool.close()
+    main.get_pool().close()
+    main.result_cache.clear()
+
+
+def test_rebuilt_database_gets_new_etags(monkeypatch, working_db):
+    url = "/api/v1/part3/frequencies?condition=melanoma&treatment=miraclib&sample_type=PBMC"
+    load_csv_to_db(sample_csv(working_db, "first"), str(working_db), replace_db=True)
+    monkeypatch.setattr(main, "DB_PATH", str(working_db))
+    monkeypatch.setattr(main, "DB_RELOAD_INTERVAL", 1e-9)
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    main.result_cache.clear()
+
+    etag = client.get(url).headers["ETag"]
+    old_pool = main.get_pool()
+
+    load_csv_to_db(sample_csv(working_db, "second"), str(working_db), replace_db=True)
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert {r["sample"] for r in resp.json()} == {"second"}
+
+    old_pool.close()
+    main.get_pool().close()
+    main.result_cache.clear()
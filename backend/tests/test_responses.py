@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.responses as responses
+from app.main import app
+from app.responses import FastJSONResponse, to_columns
+
+client = TestClient(app)
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/frequency",
+    "/api/v1/part3/frequencies",
+    "/api/v1/part3/stats",
+    "/api/v1/part3/boxplot",
+])
+def test_columns_format_matches_rows(url):
+    rows = client.get(url).json()
+    columns = client.get(url, params={"format": "columns"}).json()
+    assert columns == to_columns(rows)
+    assert all(len(v) == len(rows) for v in columns.values())
+
+def test_to_columns_fills_missing_keys():
+    assert to_columns([{"a": 1}, {"a": 2, "b": 3}]) == {"a": [1, 2], "b": [None, 3]}
+    assert to_columns([]) == {}
+
+def test_fast_json_response_accepts_numpy():
+    pytest.importorskip("orjson")
+    body = FastJSONResponse({"x": np.float64(1.5), "y": np.arange(3)}).body
+    assert body.replace(b" ", b"") == b'{"x":1.5,"y":[0,1,2]}'
+
+def test_fast_json_response_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    content = {
+        "x": np.float64(1.5), "y": np.arange(3), "n": np.int64(7), "ok": np.bool_(True),
+        "nan": float("nan"), "inf": np.float32("inf"), np.int64(2): [np.float32("nan"), (1, "é")],
+    }
+    body = FastJSONResponse(content).body
+    assert body == '{"x":1.5,"y":[0,1,2],"n":7,"ok":true,"nan":null,"inf":null,"2":[null,[1,"é"]]}'.encode()
+
+    rows = client.get("/api/v1/part3/stats").json()
+    assert rows and all(isinstance(r["p_value"], float) for r in rows)
+
+def test_large_responses_are_gzipped():
+    resp = client.get("/api/v1/part3/frequencies", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in resp.headers["vary"].lower()
+    assert int(resp.headers["content-length"]) < len(resp.content) / 4
+
+    streamed = client.get("/api/v1/frequency", params={"format": "csv", "limit": 5000},
+                          headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    assert streamed.text.count("\n") == 5001
+
+def test_small_responses_are_not_compressed():
+    resp = client.get("/api/v1/health", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in resp.headers
+
+def test_brotli_preferred_when_available():
+    pytest.importorskip("brotli")
+    with client.stream("GET", "/api/v1/part3/frequencies", headers={"Accept-Encoding": "gzip, br"}) as resp:
+        assert resp.headers["content-encoding"] == "br"
+        resp.read()
+    # httpx has already decoded the body.
+    assert resp.json()
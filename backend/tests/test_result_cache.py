@@ -0,0 +1,65 @@
+from fastapi.testclient import TestClient
+
+from app.cache import ResultCache, normalize_params
+from app.main import app
+
+client = TestClient(app)
+
+def test_cache_stats_structure():
+    resp = client.get("/api/v1/health/cache")
+    assert resp.status_code == 200
+    assert {"size", "maxsize", "ttl_seconds", "hits", "misses", "evictions"} == set(resp.json().keys())
+
+def test_repeated_request_is_a_cache_hit():
+    url = "/api/v1/part3/stats?condition=carcinoma&treatment=phauximab&sample_type=WB"
+    first = client.get(url)
+    before = client.get("/api/v1/health/cache").json()
+    second = client.get(url)
+    after = client.get("/api/v1/health/cache").json()
+
+    assert second.json() == first.json()
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+def test_normalized_params_share_an_entry():
+    a = client.get("/api/v1/part3/frequencies?condition=melanoma&treatment=miraclib&sample_type=PBMC")
+    b = client.get("/api/v1/part3/frequencies?condition=%20MELANOMA&treatment=Miraclib&sample_type=pbmc")
+
+    assert a.headers["ETag"] == b.headers["ETag"]
+
+def test_normalize_params_folds_ascii_case_only():
+    assert normalize_params({"condition": " MELANOMA "}) == normalize_params({"condition": "melanoma"})
+    # NOCASE leaves non-ASCII letters alone, so these filters match different rows.
+    assert normalize_params({"condition": "É"}) != normalize_params({"condition": "é"})
+
+def test_if_none_match_returns_304():
+    url = "/api/v1/meta/filters"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert resp.content == b""
+
+def test_part4_echoes_request_filter_from_cache():
+    a = client.get("/api/v1/part4/summary?condition=melanoma").json()
+    b = client.get("/api/v1/part4/summary?condition=MELANOMA").json()
+
+    assert a["totals"] == b["totals"]
+    assert b["filter"]["condition"] == "MELANOMA"
+
+def test_result_cache_lru_and_ttl():
+    cache = ResultCache(maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+    expired = ResultCache(ttl_seconds=0)
+    expired.set("a", 1)
+    assert expired.get("a") == (False, None)
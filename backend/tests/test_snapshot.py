@@ -0,0 +1,223 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+import app.snapshot as snapshot_module
+from app.db import bump_data_version, get_connection, get_data_version
+from app.load_db import load_csv_to_db
+from app.snapshot import Snapshot, snapshot_path, write_snapshot
+
+client = TestClient(main.app)
+
+CSV_PATH = Path(__file__).resolve().parents[2] / "data" / "cell-count.csv"
+
+COHORT = {"condition": "Melanoma", "treatment": "MIRACLIB", "sample_type": "pbmc"}
+
+def fetch(monkeypatch, use_snapshot, method, url, **kwargs):
+    monkeypatch.setattr(main, "USE_SNAPSHOT", use_snapshot)
+    main.result_cache.clear()
+    return client.request(method, url, **kwargs).json()
+
+@pytest.mark.parametrize("method,url,kwargs", [
+    ("GET", "/api/v1/part3/frequencies", {"params": COHORT}),
+    ("GET", "/api/v1/part3/stats", {"params": COHORT}),
+    ("GET", "/api/v1/part3/stats", {"params": {**COHORT, "condition": "unknown"}}),
+    ("POST", "/api/v1/part3/stats/batch", {"json": {"cross_product": True}}),
+    ("GET", "/api/v1/part3/boxplot", {"params": {**COHORT, "bins": 5}}),
+])
+def test_snapshot_matches_sql(monkeypatch, method, url, kwargs):
+    via_sql = fetch(monkeypatch, False, method, url, **kwargs)
+    via_snapshot = fetch(monkeypatch, True, method, url, **kwargs)
+    assert via_snapshot == via_sql
+
+def test_loader_writes_memory_mapped_snapshot(tmp_path):
+    db_path = tmp_path / "app.db"
+    load_csv_to_db(str(CSV_PATH), str(db_path), bulk=True)
+
+    snap = Snapshot.load(snapshot_path(db_path))
+    assert isinstance(snap.arrays["counts"], np.memmap)
+
+    conn = get_connection(str(db_path))
+    assert snap.data_version == get_data_version(conn)
+    n_samples, n_counts = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM samples), (SELECT COUNT(*) FROM cell_counts)"
+    ).fetchone()
+    conn.close()
+    assert snap.n_samples == n_samples
+    assert int((snap.arrays["counts"] >= 0).sum()) == n_counts
+
+def test_snapshot_swap_never_removes_the_directory(tmp_path, monkeypatch):
+    db_path = tmp_path / "app.db"
+    load_csv_to_db(str(CSV_PATH), str(db_path), bulk=True, snapshot=False)
+    out = snapshot_path(db_path)
+    conn = get_connection(str(db_path))
+
+    # A snapshot written as a plain directory is moved behind the link.
+    write_snapshot(conn, out)
+    target = out.resolve()
+    out.unlink()
+    target.rename(out)
+    write_snapshot(conn, out)
+    assert out.is_symlink()
+    first = Snapshot.load(out)
+
+    real_replace = os.replace
+
+    def replace(src, dst):
+        assert Snapshot.load(out) is not None
+        real_replace(src, dst)
+
+    monkeypatch.setattr(snapshot_module.os, "replace", replace)
+    for _ in range(2):
+        bump_data_version(conn)
+        write_snapshot(conn, out)
+    conn.close()
+
+    assert Snapshot.load(out).data_version == first.data_version + 2
+    # The current directory and the one before it.
+    assert len([p for p in tmp_path.glob("app.snapshot.*") if p.is_dir()]) == 2
+
+def test_stale_snapshot_is_ignored(tmp_path, monkeypatch):
+    db_path = tmp_path / "app.db"
+    load_csv_to_db(str(CSV_PATH), str(db_path), bulk=True, snapshot=False)
+    assert not snapshot_path(db_path).exists()
+
+    conn = get_connection(str(db_path))
+    write_snapshot(conn, snapshot_path(db_path))
+    monkeypatch.setattr(main, "DB_PATH", str(db_path))
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    assert main.get_snapshot(conn).data_version == get_data_version(conn)
+
+    # A load run with snapshot=False leaves the old snapshot behind.
+    bump_data_version(conn)
+    assert main.get_snapshot(conn) is None
+    conn.close()
+
+def test_snapshot_written_after_commit_is_picked_up(tmp_path, monkeypatch):
+    db_path = tmp_path / "app.db"
+    load_csv_to_db(str(CSV_PATH), str(db_path), bulk=True)
+    monkeypatch.setattr(main, "DB_PATH", str(db_path))
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    monkeypatch.setattr(main, "SNAPSHOT_RETRY_INTERVAL", 3600)
+
+    # A loader has committed but not yet rewritten the snapshot.
+    conn = get_connection(str(db_path))
+    bump_data_version(conn)
+    conn.commit()
+    assert main.get_snapshot(conn) is None
+
+    write_snapshot(conn, snapshot_path(db_path))
+    assert main.get_snapshot(conn) is None  # not re-read before the retry interval
+    monkeypatch.setattr(main, "_snapshot_retry_at", 0.0)
+    assert main.get_snapshot(conn).data_version == get_data_version(conn)
+    conn.close()
+    main.get_pool().close()
+
+def test_wide_panel_snapshot_matches_sql(tmp_path, monkeypatch):
+    from app.synthetic import write_synthetic_csv
+
+    populations = [f"pop_{i:03d}" for i in range(60)]
+    [csv_path] = write_synthetic_csv(str(tmp_path / "wide.csv"), 600, populations=populations, seed=5)
+    db_path = tmp_path / "wide.db"
+    load_csv_to_db(str(csv_path), str(db_path), bulk=True)
+
+    monkeypatch.setattr(main, "DB_PATH", str(db_path))
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    cohort = {"condition": "melanoma", "treatment": "miraclib", "sample_type": "PBMC"}
+    try:
+        for url in ("/api/v1/part3/stats", "/api/v1/part3/boxplot"):
+            via_sql = fetch(monkeypatch, False, "GET", url, params=cohort)
+            via_snapshot = fetch(monkeypatch, True, "GET", url, params=cohort)
+            assert via_snapshot == via_sql
+        assert {r["population"] for r in via_snapshot} == set(populations)
+    finally:
+        main.get_pool().close()
+        main.result_cache.clear()
+
+@pytest.mark.parametrize("use_snapshot", [False, True])
+def test_population_measured_in_one_group_only(tmp_path, monkeypatch, use_snapshot):
+    import csv
+
+    from app.synthetic import write_synthetic_csv
+
+    populations = ["pop_a", "pop_b", "pop_c"]
+    [csv_path] = write_synthetic_csv(str(tmp_path / "one.csv"), 200, populations=populations, seed=7)
+    with open(csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        if row["response"] != "yes":
+            row["pop_b"] = ""
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    db_path = tmp_path / "one.db"
+    load_csv_to_db(str(csv_path), str(db_path), bulk=True)
+
+    monkeypatch.setattr(main, "DB_PATH", str(db_path))
+    monkeypatch.setattr(main, "_pool", None)
+    monkeypatch.setattr(main, "_snapshot", None)
+    monkeypatch.setattr(main, "_snapshot_version", None)
+    monkeypatch.setattr(main, "_snapshot_db_path", None)
+    monkeypatch.setattr(main, "USE_SNAPSHOT", use_snapshot)
+    main.result_cache.clear()
+    cohort = {"condition": "melanoma", "treatment": "miraclib", "sample_type": "PBMC"}
+    try:
+        for params in (cohort, {**cohort, "method": "permutation", "n_resamples": 200, "seed": 1}):
+            resp = client.get("/api/v1/part3/stats", params=params)
+            assert resp.status_code == 200
+            assert sorted(r["population"] for r in resp.json()) == ["pop_a", "pop_c"]
+
+        resp = client.post("/api/v1/part3/stats/batch", json={"cohorts": [cohort]})
+        assert resp.status_code == 200
+    finally:
+        main.get_pool().close()
+        main.result_cache.clear()
+
+def test_incremental_load_updates_snapshot_in_place(tmp_path):
+    import csv
+
+    with open(CSV_PATH, newline="") as f:
+        rows = list(csv.DictReader(f))
+    base_csv, delta_csv = tmp_path / "base.csv", tmp_path / "delta.csv"
+    with open(base_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows[:2000])
+    delta = [
+        dict(rows[0], b_cell="1"),                                       # changed count
+        dict(rows[1], nk_cell=""),                                       # removed count
+        rows[2],                                                         # unchanged
+        *rows[2000:2100],                                                # new samples
+        dict(rows[2100], sample="new_type", sample_type="Tumor"),        # new category
+    ]
+    with open(delta_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[*rows[0], "dc_cell"])
+        writer.writeheader()
+        writer.writerows(dict(r, dc_cell="5") for r in delta)           # new population
+
+    db_path = tmp_path / "app.db"
+    load_csv_to_db(str(base_csv), str(db_path), bulk=True)
+    load_csv_to_db(str(delta_csv), str(db_path), incremental=True)
+    updated = Snapshot.load(snapshot_path(db_path))
+
+    conn = get_connection(str(db_path))
+    rewritten = Snapshot.load(write_snapshot(conn, tmp_path / "full.snapshot"))
+    conn.close()
+    assert updated.meta == rewritten.meta
+    assert updated.meta["populations"][-1] == "dc_cell"
+    assert updated.arrays.keys() == rewritten.arrays.keys()
+    for name, arr in rewritten.arrays.items():
+        assert np.array_equal(updated.arrays[name], arr), name
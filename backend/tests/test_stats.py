@@ -0,0 +1,155 @@
+import numpy as np
+from scipy.stats import mannwhitneyu
+
+from app.stats import (
+    ResponseMatrix,
+    _bootstrap_medians,
+    bh_qvalues,
+    compare_responders,
+    pivot_percentages,
+    resample_chunk,
+    resample_plan,
+    summarize_resamples,
+)
+
+def reference_bh(pvals):
+    order = sorted(range(len(pvals)), key=lambda i: pvals[i])
+    m = len(pvals)
+    raw = [pvals[j] * m / (i + 1) for i, j in enumerate(order)]
+    q = [0.0] * m
+    prev = 1.0
+    for i in range(m - 1, -1, -1):
+        prev = min(prev, raw[i])
+        q[order[i]] = prev
+    return q
+
+def test_bh_matches_reference_loop():
+    rng = np.random.default_rng(0)
+    p = rng.uniform(size=200)
+    p[:20] = rng.uniform(0, 1e-3, size=20)
+
+    assert np.allclose(bh_qvalues(p), reference_bh(list(p)), rtol=0, atol=0)
+
+def test_bh_empty():
+    assert bh_qvalues(np.array([])).size == 0
+
+def test_compare_responders_matches_per_population_scipy():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 100, size=(40, 6))
+    is_yes = np.arange(40) % 3 == 0
+    values[is_yes, 2] += 15
+    # Missing measurements are omitted per population.
+    values[5, 4] = np.nan
+    matrix = ResponseMatrix([f"pop{i}" for i in range(6)], values, is_yes)
+
+    results = {r["population"]: r for r in compare_responders(matrix)}
+
+    for j in range(6):
+        yes = values[is_yes, j]
+        no = values[~is_yes, j]
+        yes, no = yes[~np.isnan(yes)], no[~np.isnan(no)]
+        stat, pval = mannwhitneyu(yes, no, alternative="two-sided")
+
+        r = results[f"pop{j}"]
+        assert r["n_yes"] == yes.size
+        assert r["n_no"] == no.size
+        assert r["u_statistic"] == round(float(stat), 3)
+        assert np.isclose(r["p_value"], pval)
+        assert r["median_yes"] == round(float(np.median(yes)), 3)
+
+def test_compare_responders_sorted_by_p_value():
+    rng = np.random.default_rng(2)
+    values = rng.uniform(0, 100, size=(30, 4))
+    is_yes = np.arange(30) < 15
+    results = compare_responders(ResponseMatrix(list("abcd"), values, is_yes))
+
+    pvals = [r["p_value"] for r in results]
+    assert pvals == sorted(pvals)
+
+def test_compare_responders_empty_group():
+    values = np.ones((4, 2))
+    assert compare_responders(ResponseMatrix(["a", "b"], values, np.ones(4, dtype=bool))) == []
+
+def test_pivot_percentages_orders_populations_by_id():
+    matrix = pivot_percentages(
+        [10, 10, 11, 11],
+        ["yes", "yes", "no", "no"],
+        [2, 1, 1, 2],
+        [60.0, 40.0, 30.0, 70.0],
+        population_names={1: "b_cell", 2: "nk_cell"},
+    )
+
+    assert matrix.populations == ["b_cell", "nk_cell"]
+    assert matrix.values.tolist() == [[40.0, 60.0], [30.0, 70.0]]
+    assert matrix.is_yes.tolist() == [True, False]
+
+def resampled(matrix, method, n_resamples, seed):
+    chunks = [resample_chunk(matrix, method, size, child) for size, child in resample_plan(n_resamples, seed)]
+    return summarize_resamples(matrix, method, chunks, n_resamples)
+
+def shifted_matrix():
+    rng = np.random.default_rng(3)
+    values = rng.normal(50, 10, size=(40, 3))
+    is_yes = np.arange(40) < 20
+    values[is_yes, 0] += 15
+    values[5, 2] = np.nan
+    return ResponseMatrix(["shifted", "null", "missing"], values, is_yes)
+
+def test_resample_plan_chunks():
+    plan = resample_plan(2500, seed=1)
+    assert [size for size, _ in plan] == [1000, 1000, 500]
+    assert len({tuple(s.generate_state(2)) for _, s in plan}) == 3
+
+def test_permutation_pvalues_track_asymptotic():
+    matrix = shifted_matrix()
+    asymptotic = {r["population"]: r["p_value"] for r in compare_responders(matrix)}
+    results = resampled(matrix, "permutation", 5000, seed=0)
+
+    assert [r["p_value"] for r in results] == sorted(r["p_value"] for r in results)
+    for r in results:
+        assert r["method"] == "permutation"
+        assert r["p_value"] >= 1 / 5001
+        assert abs(r["p_value"] - asymptotic[r["population"]]) < 0.03
+        assert r["significant_fdr_0_05"] == (r["q_value"] < 0.05)
+
+def test_resampling_is_reproducible_per_seed():
+    matrix = shifted_matrix()
+    assert resampled(matrix, "permutation", 2000, seed=7) == resampled(matrix, "permutation", 2000, seed=7)
+    assert resampled(matrix, "bootstrap", 2000, seed=7) == resampled(matrix, "bootstrap", 2000, seed=7)
+    assert resampled(matrix, "bootstrap", 2000, seed=7) != resampled(matrix, "bootstrap", 2000, seed=8)
+
+def test_bootstrap_ci_brackets_median_difference():
+    results = {r["population"]: r for r in resampled(shifted_matrix(), "bootstrap", 2000, seed=0)}
+
+    for r in results.values():
+        assert r["ci_low"] <= r["median_diff"] <= r["ci_high"]
+    assert results["shifted"]["ci_low"] > 0
+    assert results["null"]["ci_low"] < 0 < results["null"]["ci_high"]
+
+def test_bootstrap_medians_match_numpy():
+    for n in (1, 2, 9, 10):
+        values = np.random.default_rng(n).uniform(0, 100, n)
+        expected_idx = np.random.default_rng(0).integers(0, n, (200, n), dtype=np.int32)
+        expected = np.median(np.sort(values)[expected_idx], axis=1)
+        assert np.array_equal(_bootstrap_medians(values, 200, np.random.default_rng(0)), expected)
+
+def test_bh_leaves_nan_in_place():
+    p = np.array([0.04, np.nan, 0.01, 0.03])
+    q = bh_qvalues(p)
+
+    assert np.isnan(q[1])
+    assert np.allclose(q[[0, 2, 3]], reference_bh([0.04, 0.01, 0.03]))
+
+def test_compare_responders_skips_population_in_one_group():
+    rng = np.random.default_rng(3)
+    values = rng.uniform(0, 100, size=(20, 3))
+    is_yes = np.arange(20) < 10
+    # pop1 was only measured in responders.
+    values[~is_yes, 1] = np.nan
+    results = compare_responders(ResponseMatrix(["pop0", "pop1", "pop2"], values, is_yes))
+
+    assert [r["population"] for r in results if r["population"] == "pop1"] == []
+    assert len(results) == 2
+    assert all(np.isfinite(r["p_value"]) and np.isfinite(r["q_value"]) for r in results)
+    expected = bh_qvalues(np.array([r["p_value"] for r in results]))
+    assert [r["q_value"] for r in results] == list(expected)
@@ -0,0 +1,50 @@
+import csv
+
+from app.db import get_connection
+from app.load_db import METADATA_COLUMNS, POPULATION_COLUMNS, load_csv_to_db
+from app.synthetic import write_synthetic_csv
+
+def read_rows(paths):
+    rows = []
+    for path in paths:
+        with open(path, newline="") as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+def test_synthetic_csv_matches_schema(tmp_path):
+    [path] = write_synthetic_csv(str(tmp_path / "s.csv"), 1000, timepoints=(0, 7, 14, 28), seed=1)
+    with open(path, newline="") as f:
+        assert next(csv.reader(f)) == [*METADATA_COLUMNS, *POPULATION_COLUMNS]
+
+    rows = read_rows([path])
+    assert len(rows) == 1000
+    assert len({r["sample"] for r in rows}) == 1000
+    assert {int(r["time_from_treatment_start"]) for r in rows} == {0, 7, 14, 28}
+    assert {r["project"] for r in rows} == {"prj1", "prj2", "prj3"}
+    for r in rows:
+        assert (r["condition"] == "healthy") == (r["treatment"] == "none") == (r["response"] == "")
+        assert all(int(r[p]) > 0 for p in POPULATION_COLUMNS)
+
+def test_synthetic_csv_is_deterministic_and_shards(tmp_path):
+    [single] = write_synthetic_csv(str(tmp_path / "a.csv"), 500, seed=7)
+    shards = write_synthetic_csv(str(tmp_path / "shards"), 500, shards=3, seed=7)
+    assert len(shards) == 3
+
+    by_sample = {r["sample"]: r for r in read_rows(shards)}
+    subjects_per_shard = [{r["subject"] for r in read_rows([p])} for p in shards]
+    assert all(subjects_per_shard)
+    assert not set.intersection(*subjects_per_shard)
+    assert len(by_sample) == 500
+    [again] = write_synthetic_csv(str(tmp_path / "b.csv"), 500, seed=7)
+    assert read_rows([single]) == read_rows([again])
+
+def test_synthetic_csv_loads(tmp_path):
+    [path] = write_synthetic_csv(str(tmp_path / "s.csv.gz"), 300)
+    db_path = str(tmp_path / "s.db")
+    stats = load_csv_to_db(str(path), db_path, bulk=True, snapshot=False)
+    assert stats.rows == 300
+
+    conn = get_connection(db_path)
+    n_counts = conn.execute("SELECT COUNT(*) FROM cell_counts").fetchone()[0]
+    conn.close()
+    assert n_counts == 300 * len(POPULATION_COLUMNS)
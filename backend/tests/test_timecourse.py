@@ -0,0 +1,61 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+URL = "/api/v1/timecourse"
+
+def test_timecourse_structure():
+    resp = client.get(URL)
+    assert resp.status_code == 200
+
+    data = resp.json()
+    assert data["timepoints"] == sorted(data["timepoints"])
+    assert "subjects" not in data
+
+    expected_keys = {
+        "population", "response", "time", "n",
+        "median", "q1", "q3", "median_delta", "q1_delta", "q3_delta",
+    }
+    for row in data["series"]:
+        assert set(row) == expected_keys
+        assert row["response"] in ("yes", "no")
+        assert row["time"] in data["timepoints"]
+        assert row["q1"] <= row["median"] <= row["q3"]
+
+def test_timecourse_series_match_subject_rows():
+    data = client.get(URL, params={"include_subjects": True}).json()
+    subjects = data["subjects"]
+    assert sum(row["n"] for row in data["series"]) == len(subjects)
+
+    for row in data["series"]:
+        group = [
+            s for s in subjects
+            if (s["population"], s["response"], s["time"]) == (row["population"], row["response"], row["time"])
+        ]
+        assert len(group) == row["n"]
+        median = np.median([s["percentage"] for s in group])
+        assert abs(row["median"] - median) < 1e-3
+        if row["time"] == data["timepoints"][0]:
+            assert row["median_delta"] == row["q1_delta"] == row["q3_delta"] == 0.0
+
+def test_timecourse_delta_is_change_from_baseline():
+    subjects = client.get(URL, params={"include_subjects": True}).json()["subjects"]
+
+    by_subject = {}
+    for s in subjects:
+        by_subject.setdefault((s["project"], s["subject"], s["population"]), []).append(s)
+
+    for rows in by_subject.values():
+        rows.sort(key=lambda s: s["time"])
+        for s in rows:
+            assert abs(s["delta"] - (s["percentage"] - rows[0]["percentage"])) < 2e-3
+
+def test_timecourse_case_insensitive_and_empty():
+    lower = client.get(URL).json()
+    mixed = client.get(URL, params={"condition": "MELANOMA", "treatment": "Miraclib", "sample_type": "pbmc"}).json()
+    assert mixed == lower
+
+    empty = client.get(URL, params={"condition": "no-such-condition"}).json()
+    assert empty == {"timepoints": [], "series": []}
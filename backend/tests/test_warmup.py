@@ -0,0 +1,106 @@
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+import app.warmup as warmup
+from app.warmup import WarmupState, preload_files, run_warmup
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+CUBE_URL = "/api/v1/cube?group_by=treatment"
+
+
+def wait_ready(client, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = client.get("/api/v1/health/ready")
+        if resp.status_code == 200 or time.monotonic() > deadline:
+            return resp
+        time.sleep(0.02)
+
+
+def test_import_does_not_load_heavy_modules():
+    code = "import sys, app.main; print(sorted({'scipy', 'pyarrow', 'httpx'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_preload_files_reads_every_byte(tmp_path):
+    paths = []
+    for i, size in enumerate([0, 10, 3 * 1024 + 5]):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(b"x" * size)
+        paths.append(path)
+    assert preload_files(paths, chunk_size=1024) == 3 * 1024 + 15
+
+
+def test_state_is_not_ready_until_finished():
+    state = WarmupState()
+    assert not state.ready
+    state.start()
+    assert state.stats()["status"] == "running" and not state.ready
+    state.finish()
+    assert state.ready
+
+
+def test_warmup_primes_result_cache(monkeypatch):
+    monkeypatch.setattr(main, "WARMUP", True)
+    monkeypatch.setattr(main, "WARMUP_URLS", [CUBE_URL])
+    main.result_cache.clear()
+
+    with TestClient(main.app) as client:
+        resp = wait_ready(client)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["status"] == "done" and body["errors"] == []
+        assert body["steps"][CUBE_URL]["status"] == 200
+        assert body["steps"]["preload"]["bytes"] > 0
+
+        hits = main.result_cache.stats()["hits"]
+        assert client.get(CUBE_URL).status_code == 200
+        assert main.result_cache.stats()["hits"] == hits + 1
+    main.result_cache.clear()
+
+
+def test_warmup_records_failed_requests(monkeypatch):
+    monkeypatch.setattr(main, "WARMUP", True)
+    monkeypatch.setattr(main, "WARMUP_PRELOAD", False)
+    monkeypatch.setattr(main, "WARMUP_URLS", ["/api/v1/cube?group_by=nope"])
+
+    with TestClient(main.app) as client:
+        body = wait_ready(client).json()
+    assert body["ready"] and body["status"] == "degraded" and "preload" in body["steps"]
+    assert body["steps"]["preload"]["files"] == 0
+    assert body["errors"] == ["/api/v1/cube?group_by=nope: HTTP 422"]
+
+
+def test_warmup_finishes_when_steps_raise(monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(warmup, "preload_files", boom)
+    monkeypatch.setattr(warmup, "import_modules", boom)
+    monkeypatch.setattr(warmup, "_warm_urls", boom)
+
+    state = WarmupState()
+    asyncio.run(run_warmup(main.app, state, urls=[CUBE_URL]))
+    body = state.stats()
+    assert body["ready"] and body["status"] == "degraded"
+    assert body["errors"] == [
+        "preload: RuntimeError: boom",
+        "imports: RuntimeError: boom",
+        "requests: RuntimeError: boom",
+    ]
+
+
+def test_ready_when_warmup_disabled(monkeypatch):
+    monkeypatch.setattr(main, "WARMUP", False)
+    with TestClient(main.app) as client:
+        resp = client.get("/api/v1/health/ready")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "disabled"
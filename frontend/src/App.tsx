@@ -57,11 +57,20 @@ const DEFAULTS = {
   time0: 0,
 };
 
-type Part3Row = {
-  sample: string;
-  response: "yes" | "no";
+type Part3BoxRow = {
   population: string;
-  percentage: number;
+  response: "yes" | "no";
+  n: number;
+  min: number;
+  q1: number;
+  median: number;
+  q3: number;
+  max: number;
+  mean: number;
+  whisker_low: number;
+  whisker_high: number;
+  n_outliers: number;
+  outliers: number[];
 };
 
 type Part3StatRow = {
@@ -231,12 +240,12 @@ export default function App() {
   const [sampleType, setSampleType] = useState(DEFAULTS.sample_type);
   const [time0, setTime0] = useState<number>(DEFAULTS.time0);
 
-  const [p3Freq, setP3Freq] = useState<Part3Row[]>([]);
+  const [p3Box, setP3Box] = useState<Part3BoxRow[]>([]);
   const [p3Stats, setP3Stats] = useState<Part3StatRow[]>([]);
   const [p3Loading, setP3Loading] = useState(false);
   const [p3Error, setP3Error] = useState<string | null>(null);
 
-  const apiP3FreqUrl = `${API_BASE}/api/v1/part3/frequencies?condition=${condition}&treatment=${treatment}&sample_type=${sampleType}
+  const apiP3BoxUrl = `${API_BASE}/api/v1/part3/boxplot?condition=${condition}&treatment=${treatment}&sample_type=${sampleType}
 `;
   const apiP3StatsUrl = `${API_BASE}/api/v1/part3/stats?condition=${condition}&treatment=${treatment}&sample_type=${sampleType}
 `;
@@ -265,18 +274,18 @@ export default function App() {
       setP3Error(null);
       try {
         const [r1, r2] = await Promise.all([
-          fetch(apiP3FreqUrl),
+          fetch(apiP3BoxUrl),
           fetch(apiP3StatsUrl),
         ]);
 
-        if (!r1.ok) throw new Error(`Part3 frequencies error: ${r1.status}`);
+        if (!r1.ok) throw new Error(`Part3 boxplot error: ${r1.status}`);
         if (!r2.ok) throw new Error(`Part3 stats error: ${r2.status}`);
 
-        const d1 = (await r1.json()) as Part3Row[];
+        const d1 = (await r1.json()) as Part3BoxRow[];
         const d2 = (await r2.json()) as Part3StatRow[];
 
         if (!cancelled) {
-          setP3Freq(d1);
+          setP3Box(d1);
           setP3Stats(d2);
         }
       } catch (e: any) {
@@ -290,7 +299,7 @@ export default function App() {
     return () => {
       cancelled = true;
     };
-  }, [apiP3FreqUrl, apiP3StatsUrl]);
+  }, [apiP3BoxUrl, apiP3StatsUrl]);
 
   // Fetch Part 4 summary
   useEffect(() => {
@@ -320,9 +329,17 @@ export default function App() {
   }, [apiP4SummaryUrl]);
 
 
+  // Populations come from the data (panels are configurable at load time);
+  // the server returns summaries ordered by population.
+  const p3BoxByKey = useMemo(() => {
+    const m = new Map<string, Part3BoxRow>();
+    for (const b of p3Box) m.set(`${b.population}|${b.response}`, b);
+    return m;
+  }, [p3Box]);
+
   const populations = useMemo(
-    () => ["b_cell", "cd4_t_cell", "cd8_t_cell", "nk_cell", "monocyte"],
-    []
+    () => Array.from(new Set(p3Box.map((b) => b.population))),
+    [p3Box]
   );
 
   const statsByPop = useMemo(() => {
@@ -338,20 +355,29 @@ export default function App() {
   const nonResponderLine = "rgba(16, 185, 129, 1)";
 
   function boxplotData(pop: string): ChartData<"boxplot", any, string> {
-    const yes = p3Freq
-      .filter((r) => r.population === pop && r.response === "yes")
-      .map((r) => r.percentage);
-
-    const no = p3Freq
-      .filter((r) => r.population === pop && r.response === "no")
-      .map((r) => r.percentage);
+    // Summaries are computed server-side; whiskers are the Tukey fences.
+    const box = (response: "yes" | "no") => {
+      const r = p3BoxByKey.get(`${pop}|${response}`);
+      if (!r) return null;
+      return {
+        min: r.whisker_low,
+        q1: r.q1,
+        median: r.median,
+        q3: r.q3,
+        max: r.whisker_high,
+        mean: r.mean,
+        outliers: r.outliers,
+      };
+    };
+    const yes = box("yes");
+    const no = box("no");
 
     return {
       labels: ["Responder", "Non-responder"],
       datasets: [
         {
           label: pop,
-          // boxplot plugin expects arrays per category
+          // boxplot plugin accepts precomputed stats objects per category
           data: [yes, no],
 
           // Most important visual fix: per-box fill and border